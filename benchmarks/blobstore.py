@@ -0,0 +1,220 @@
+# In-process stand-in for an Azure container, with the ContainerClient and
+# BlobClient calls AzureStorageClient makes. Blobs live as files under a
+# directory so multi-GB packages don't sit in memory, and every call can be
+# given latency or made to fail.
+
+import random
+import shutil
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import quote, unquote
+
+import requests
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+
+READ_CHUNK = 4 * 1024 * 1024
+BASE_URL = "https://bench.blob.core.windows.net/m365-updates"
+
+
+class DiskContainer:
+    url = BASE_URL
+    
+    def __init__(self, root, latency=0.0, failure_rate=0.0, seed=0):
+        self.root = Path(root)
+        self.blobs = self.root / "blobs"
+        self.blocks = self.root / "blocks"
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.metadata = {}
+        self.calls = 0
+        self._created = False
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+    
+    def _call(self, can_fail=False):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            failed = can_fail and self._rng.random() < self.failure_rate
+        if failed:
+            raise ConnectionError("injected storage failure")
+    
+    def path(self, name):
+        return self.blobs / name
+    
+    def exists(self, **kwargs):
+        self._call()
+        return self._created
+    
+    def create_container(self, **kwargs):
+        self._call()
+        if self._created:
+            raise ResourceExistsError("container exists")
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.blocks.mkdir(parents=True, exist_ok=True)
+        self._created = True
+    
+    def get_blob_client(self, name):
+        return DiskBlobClient(self, name)
+    
+    def list_blobs(self, name_starts_with=None, include=None, **kwargs):
+        self._call()
+        found = []
+        for path in sorted(self.blobs.rglob("*")):
+            name = path.relative_to(self.blobs).as_posix()
+            if path.is_file() and name.startswith(name_starts_with or ""):
+                found.append(SimpleNamespace(
+                    name=name, size=path.stat().st_size,
+                    metadata=self.metadata.get(name), etag=None,
+                ))
+        return found
+    
+    def delete_blobs(self, *names, raise_on_any_failure=True, **kwargs):
+        self._call()
+        responses = []
+        for name in names:
+            try:
+                self.path(name).unlink()
+                self.metadata.pop(name, None)
+                responses.append(SimpleNamespace(status_code=202))
+            except FileNotFoundError:
+                responses.append(SimpleNamespace(status_code=404))
+        return responses
+    
+    def disk_usage(self):
+        return sum(path.stat().st_size for path in self.root.rglob("*") if path.is_file())
+
+
+class DiskDownload:
+    def __init__(self, path, offset, length):
+        self.path = path
+        self.offset = offset
+        self.length = length
+    
+    def chunks(self):
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            remaining = self.length
+            while remaining is None or remaining > 0:
+                chunk = f.read(READ_CHUNK if remaining is None else min(READ_CHUNK, remaining))
+                if not chunk:
+                    return
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+    
+    def readall(self):
+        return b"".join(self.chunks())
+
+
+class DiskBlobClient:
+    def __init__(self, container, name):
+        self.container = container
+        self.name = name
+        self.url = f"{BASE_URL}/{quote(name)}"
+    
+    @property
+    def _path(self):
+        return self.container.path(self.name)
+    
+    @property
+    def _block_dir(self):
+        return self.container.blocks / quote(self.name, safe="")
+    
+    def _write(self, data):
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._path.with_name(f"{self._path.name}.upload")
+        with open(tmp, "wb") as f:
+            if hasattr(data, "read"):
+                shutil.copyfileobj(data, f)
+            else:
+                f.write(data.encode() if isinstance(data, str) else bytes(data))
+        tmp.replace(self._path)
+    
+    def upload_blob(self, data, overwrite=True, content_settings=None, metadata=None, **kwargs):
+        self.container._call(can_fail=True)
+        if not overwrite and self._path.exists():
+            raise ResourceExistsError(f"{self.name} exists")
+        self._write(data)
+        self.container.metadata[self.name] = metadata or {}
+    
+    def stage_block(self, block_id, data, **kwargs):
+        self.container._call(can_fail=True)
+        self._block_dir.mkdir(parents=True, exist_ok=True)
+        (self._block_dir / quote(block_id, safe="")).write_bytes(bytes(data))
+    
+    def stage_block_from_url(self, block_id, source_url, source_offset=0, source_length=None,
+                             **kwargs):
+        self.container._call(can_fail=True)
+        end = "" if source_length is None else source_offset + source_length - 1
+        response = requests.get(source_url, headers={"Range": f"bytes={source_offset}-{end}"})
+        response.raise_for_status()
+        self._block_dir.mkdir(parents=True, exist_ok=True)
+        (self._block_dir / quote(block_id, safe="")).write_bytes(response.content)
+    
+    def get_block_list(self, block_list_type="committed", **kwargs):
+        self.container._call()
+        if not self._block_dir.exists():
+            return [], []
+        return [], [
+            SimpleNamespace(id=unquote(path.name), size=path.stat().st_size)
+            for path in self._block_dir.iterdir()
+        ]
+    
+    def commit_block_list(self, block_list, content_settings=None, metadata=None, **kwargs):
+        self.container._call(can_fail=True)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self._path.with_name(f"{self._path.name}.commit")
+        with open(tmp, "wb") as f:
+            for block_id in block_list:
+                with open(self._block_dir / quote(block_id, safe=""), "rb") as block:
+                    shutil.copyfileobj(block, f, READ_CHUNK)
+        tmp.replace(self._path)
+        shutil.rmtree(self._block_dir, ignore_errors=True)
+        self.container.metadata[self.name] = metadata or {}
+    
+    def set_blob_metadata(self, metadata=None, **kwargs):
+        self.container._call()
+        self.container.metadata[self.name] = metadata or {}
+    
+    def download_blob(self, offset=0, length=None, **kwargs):
+        self.container._call()
+        if not self._path.exists():
+            raise ResourceNotFoundError(f"{self.name} not found")
+        return DiskDownload(self._path, offset, length)
+    
+    def get_blob_properties(self, **kwargs):
+        self.container._call()
+        if not self._path.exists():
+            raise ResourceNotFoundError(f"{self.name} not found")
+        return SimpleNamespace(
+            size=self._path.stat().st_size,
+            metadata=self.container.metadata.get(self.name, {}),
+            copy=SimpleNamespace(status="success"),
+        )
+    
+    def exists(self, **kwargs):
+        self.container._call()
+        return self._path.exists()
+    
+    def delete_blob(self, **kwargs):
+        self.container._call()
+        try:
+            self._path.unlink()
+        except FileNotFoundError:
+            raise ResourceNotFoundError(f"{self.name} not found")
+        self.container.metadata.pop(self.name, None)
+    
+    def start_copy_from_url(self, source_url, **kwargs):
+        self.container._call(can_fail=True)
+        source = self.container.path(unquote(source_url[len(BASE_URL) + 1:]))
+        if not source.exists():
+            raise ResourceNotFoundError(f"{source_url} not found")
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, self._path)
+        source_name = source.relative_to(self.container.blobs).as_posix()
+        self.container.metadata[self.name] = dict(self.container.metadata.get(source_name, {}))
+        return {"copy_status": "success"}
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# Stand-in for the Microsoft CDN: MAU manifests, fwlink redirects and
+# range-capable package downloads, with injectable latency, bandwidth limits
+# and dropped connections. Packages are generated on the fly, so multi-GB
+# payloads cost no disk and little memory.
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.config import APPS
+
+BLOCK = 1024 * 1024
+SEND_CHUNK = 64 * 1024
+LAST_MODIFIED = "Mon, 06 Jan 2025 09:00:00 GMT"
+
+
+@dataclass
+class Package:
+    app_id: str
+    version: str
+    size: int
+    sha256: str = None
+    
+    @property
+    def filename(self):
+        return f"{self.app_id}_{self.version}.pkg"
+    
+    @property
+    def etag(self):
+        return f'"{self.version}-{self.size}"'
+
+
+@lru_cache(maxsize=64)
+def pattern(name):
+    # Each package repeats its own 1 MiB block, so different apps never hash the same
+    return hashlib.shake_256(name.encode()).digest(BLOCK)
+
+
+def read_payload(block, start, end):
+    position = start
+    while position <= end:
+        offset = position % BLOCK
+        chunk = block[offset:offset + min(BLOCK - offset, end + 1 - position)]
+        yield chunk
+        position += len(chunk)
+
+
+def payload_sha256(name, size):
+    sha_hash = hashlib.sha256()
+    for chunk in read_payload(pattern(name), 0, size - 1):
+        sha_hash.update(chunk)
+    return sha_hash.hexdigest()
+
+
+def build_catalog(sizes):
+    catalog = {}
+    for index, (app_key, size) in enumerate(sizes.items()):
+        app = APPS[app_key]
+        package = Package(app.app_id, f"16.{90 + index}.25010{index:03d}", size)
+        package.sha256 = payload_sha256(package.filename, size)
+        catalog[app.app_id] = package
+    return catalog
+
+
+class CDNServer(ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def __init__(self, address, catalog, latency=0.0, bandwidth=0, failure_rate=0.0,
+                 fwlink_only=(), seed=0):
+        super().__init__(address, CDNHandler)
+        self.catalog = catalog
+        self.files = {package.filename: package for package in catalog.values()}
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.fwlink_only = set(fwlink_only)
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.requests = 0
+    
+    def cut_point(self, length):
+        # Where to drop this response, or None to send it whole
+        with self._rng_lock:
+            self.requests += 1
+            if length > 1 and self._rng.random() < self.failure_rate:
+                return self._rng.randrange(1, length)
+        return None
+
+
+class CDNHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_HEAD(self):
+        self._dispatch(head=True)
+    
+    def do_GET(self):
+        self._dispatch(head=False)
+    
+    def _dispatch(self, head):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        
+        path = self.path.split("?", 1)[0]
+        manifest = re.fullmatch(r"/(\w+)/(?:[0-9A-Fa-f]{4})?(\w+)\.xml", path)
+        fwlink = re.fullmatch(r"/fwlink/(\w+)", path)
+        if manifest:
+            self._manifest(manifest.group(2), head)
+        elif fwlink and fwlink.group(1) in self.server.catalog:
+            self.send_response(302)
+            self.send_header("Location", f"/pkg/{self.server.catalog[fwlink.group(1)].filename}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif path.startswith("/pkg/") and path[5:] in self.server.files:
+            self._package(self.server.files[path[5:]], head)
+        else:
+            self._empty(404)
+    
+    def _empty(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+    
+    def _manifest(self, app_id, head):
+        package = self.server.catalog.get(app_id)
+        if not package or app_id in self.server.fwlink_only:
+            self._empty(404)
+            return
+        if self.headers.get("If-None-Match") == package.etag:
+            self.send_response(304)
+            self.send_header("ETag", package.etag)
+            self.end_headers()
+            return
+        
+        body = (
+            '<?xml version="1.0"?>\n<update>\n'
+            f"  <Version>{package.version}</Version>\n"
+            f"  <FullUpdaterLocation>http://{self.headers['Host']}/pkg/{package.filename}"
+            "</FullUpdaterLocation>\n"
+            f"  <FullUpdaterSHA256>{package.sha256}</FullUpdaterSHA256>\n"
+            f"  <FullUpdaterSize>{package.size}</FullUpdaterSize>\n"
+            "</update>\n"
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", package.etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+    
+    def _package(self, package, head):
+        start, end = 0, package.size - 1
+        status = 200
+        requested = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if requested and (not if_range or if_range == package.etag):
+            start = int(requested.group(1))
+            end = min(int(requested.group(2) or end), end)
+            if start > end:
+                self._empty(416)
+                return
+            status = 206
+        
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", package.etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{package.size}")
+        self.end_headers()
+        if head:
+            return
+        
+        cut = self.server.cut_point(length)
+        sent = 0
+        began = time.perf_counter()
+        try:
+            for block in read_payload(pattern(package.filename), start, end):
+                for offset in range(0, len(block), SEND_CHUNK):
+                    chunk = block[offset:offset + SEND_CHUNK]
+                    if cut is not None and sent + len(chunk) >= cut:
+                        self.wfile.write(chunk[:cut - sent])
+                        self.close_connection = True
+                        return
+                    self.wfile.write(chunk)
+                    sent += len(chunk)
+                    self._throttle(sent, began)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+    
+    def _throttle(self, sent, began):
+        if self.server.bandwidth:
+            ahead = sent / self.server.bandwidth - (time.perf_counter() - began)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+def parse_sizes(spec, default_mb, apps):
+    sizes = {key: int(default_mb * BLOCK) for key in apps}
+    for item in filter(None, (spec or "").split(",")):
+        key, _, mb = item.partition("=")
+        sizes[key.strip()] = int(float(mb) * BLOCK)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local CDN for benchmarks")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--apps", default=",".join(APPS))
+    parser.add_argument("--size-mb", type=float, default=32)
+    parser.add_argument("--sizes", help="Per-app overrides, e.g. word=4096,excel=8")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument(
+        "--bandwidth-mb", type=float, default=0, help="MB/s per connection (0 = unlimited)"
+    )
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--fwlink-only", default="", help="Apps served without a manifest")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    apps = [key.strip() for key in args.apps.split(",") if key.strip()]
+    catalog = build_catalog(parse_sizes(args.sizes, args.size_mb, apps))
+    server = CDNServer(
+        ("127.0.0.1", args.port),
+        catalog,
+        latency=args.latency_ms / 1000,
+        bandwidth=args.bandwidth_mb * BLOCK,
+        failure_rate=args.failure_rate,
+        fwlink_only=[APPS[key].app_id for key in args.fwlink_only.split(",") if key],
+        seed=args.seed,
+    )
+    
+    # The runner waits for this line before pointing the clients here
+    print(json.dumps({
+        "port": server.server_address[1],
+        "packages": {app_id: package.size for app_id, package in catalog.items()},
+    }), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
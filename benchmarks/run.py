@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# Drives check_for_updates and promote_channels end to end against the local
+# CDN and an on-disk container, then reports wall time, peak RSS and bytes on
+# disk for each phase. With --baseline it fails when a run is slower or
+# heavier than a saved report by more than the tolerance.
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import replace
+from pathlib import Path
+
+from benchmarks.blobstore import DiskContainer
+from src import config
+from src.azure_storage import AzureStorageClient
+from src.config import APPS, CDN_URLS, Settings
+from src.manifest import ManifestManager
+from src.mau_client import MAUClient
+from src.telemetry import Telemetry
+
+DISK_SAMPLE_INTERVAL = 0.2
+# Metric compared with the baseline, and the smallest change that counts, so
+# millisecond phases don't flag noise as a regression
+COMPARED = {
+    "seconds": 0.25,
+    "peak_rss_bytes": 16 * 1024 * 1024,
+    "peak_disk_bytes": 1024 * 1024,
+}
+
+
+def start_cdn(args):
+    command = [
+        sys.executable, "-m", "benchmarks.cdn",
+        "--apps", ",".join(args.apps),
+        "--size-mb", str(args.size_mb),
+        "--latency-ms", str(args.latency_ms),
+        "--bandwidth-mb", str(args.bandwidth_mb),
+        "--failure-rate", str(args.failure_rate),
+        "--fwlink-only", ",".join(args.fwlink_only),
+        "--seed", str(args.seed),
+    ]
+    if args.sizes:
+        command += ["--sizes", args.sizes]
+    # A separate process, so serving bytes doesn't compete for the client's GIL
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, text=True,
+        cwd=Path(__file__).resolve().parent.parent,
+    )
+    ready = process.stdout.readline()
+    if not ready:
+        process.wait()
+        raise RuntimeError(f"Local CDN failed to start ({process.returncode})")
+    return process, json.loads(ready)["port"]
+
+
+@contextmanager
+def local_catalog(base_url, apps):
+    # Point the channel URLs and fwlinks at the local CDN for the duration
+    saved_urls, saved_apps = dict(CDN_URLS), dict(APPS)
+    try:
+        for channel in CDN_URLS:
+            CDN_URLS[channel] = f"{base_url}/{channel}/"
+        APPS.clear()
+        APPS.update({
+            key: replace(saved_apps[key], fwlink=f"{base_url}/fwlink/{saved_apps[key].app_id}")
+            for key in apps
+        })
+        yield
+    finally:
+        CDN_URLS.clear()
+        CDN_URLS.update(saved_urls)
+        APPS.clear()
+        APPS.update(saved_apps)
+
+
+@contextmanager
+def bench_environment(workdir, args):
+    values = {
+        "AZURE_STORAGE_CONNECTION_STRING": args.azurite or "UseDevelopmentStorage=true",
+        "CACHE_DIR": str(workdir / "cache"),
+        "LAG_DAYS": "0",
+        "STAGING_MODE": args.staging_mode,
+        "STORAGE_LAYOUT": args.storage_layout,
+        "UPDATE_CHANNEL": args.channels[0],
+        "UPDATE_CHANNELS": ",".join(args.channels),
+        "UPDATE_LOCALES": ",".join(args.locales),
+    }
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+class DiskSampler(threading.Thread):
+    def __init__(self, root):
+        super().__init__(daemon=True)
+        self.root = Path(root)
+        self.peak = 0
+        self._stop = threading.Event()
+    
+    def usage(self):
+        total = 0
+        for path in self.root.rglob("*"):
+            try:
+                if path.is_file():
+                    total += path.stat().st_size
+            except OSError:
+                pass
+        return total
+    
+    def run(self):
+        while not self._stop.wait(DISK_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, self.usage())
+    
+    def stop(self):
+        self._stop.set()
+        self.join()
+        self.peak = max(self.peak, self.usage())
+        return self.peak
+
+
+def peak_rss():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def run_phase(name, workdir, action):
+    telemetry = Telemetry()
+    sampler = DiskSampler(workdir)
+    sampler.start()
+    began = time.perf_counter()
+    try:
+        changed = action(telemetry)
+    finally:
+        seconds = time.perf_counter() - began
+        peak_disk = sampler.stop()
+    
+    report = telemetry.report()
+    return {
+        "seconds": round(seconds, 3),
+        "changed": len(changed),
+        "peak_rss_bytes": peak_rss(),
+        "peak_disk_bytes": peak_disk,
+        "errors": report["errors"],
+        "phases": report["phases"],
+    }
+
+
+def run_benchmark(args, workdir):
+    from check_updates import check_for_updates
+    from promote import promote_channels
+    
+    process, port = start_cdn(args)
+    try:
+        with local_catalog(f"http://127.0.0.1:{port}", args.apps), bench_environment(workdir, args):
+            settings = Settings()
+            container = None
+            if not args.azurite:
+                container = DiskContainer(
+                    workdir / "storage", latency=args.storage_latency_ms / 1000,
+                    failure_rate=args.storage_failure_rate, seed=args.seed,
+                )
+            manifest_path = workdir / "manifest.json"
+            
+            def check(telemetry):
+                mgr = ManifestManager(manifest_path, telemetry)
+                mau = MAUClient(settings, telemetry)
+                storage = AzureStorageClient(settings, container=container, telemetry=telemetry)
+                with telemetry.watch_errors():
+                    updated = check_for_updates(
+                        settings, mgr, mau, storage, jobs=args.jobs, pipeline=args.pipeline
+                    )
+                mgr.save()
+                return updated
+            
+            def promote(telemetry):
+                mgr = ManifestManager(manifest_path, telemetry)
+                storage = AzureStorageClient(settings, container=container, telemetry=telemetry)
+                with telemetry.watch_errors():
+                    promoted = promote_channels(settings, mgr, storage)
+                mgr.save()
+                return promoted
+            
+            # The second check finds nothing new, which is most scheduled runs
+            results = {
+                "check": run_phase("check", workdir, check),
+                "recheck": run_phase("recheck", workdir, check),
+                "promote": run_phase("promote", workdir, promote),
+            }
+    finally:
+        process.terminate()
+        process.wait()
+    
+    return {
+        "scenario": {
+            key: value for key, value in vars(args).items()
+            if key not in ("baseline", "output", "keep", "workdir", "tolerance")
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for phase, result in report["results"].items():
+        before = baseline.get("results", {}).get(phase, {})
+        for metric, noise in COMPARED.items():
+            if not before.get(metric):
+                continue
+            limit = max(before[metric] * (1 + tolerance), before[metric] + noise)
+            if result[metric] > limit:
+                regressions.append(
+                    f"{phase} {metric}: {result[metric]} vs baseline {before[metric]}"
+                )
+    return regressions
+
+
+def _list(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    parser.add_argument("--apps", type=_list, default=["word", "excel", "powerpoint", "outlook"])
+    parser.add_argument("--size-mb", type=float, default=32, help="Package size for every app")
+    parser.add_argument("--sizes", help="Per-app sizes in MB, e.g. word=4096,excel=8")
+    parser.add_argument("--channels", type=_list, default=["current"])
+    parser.add_argument("--locales", type=_list, default=[config.DEFAULT_LOCALE])
+    parser.add_argument("--fwlink-only", type=_list, default=[], help="Apps with no MAU manifest")
+    parser.add_argument("--latency-ms", type=float, default=0, help="CDN latency per request")
+    parser.add_argument("--bandwidth-mb", type=float, default=0, help="CDN MB/s per connection")
+    parser.add_argument("--failure-rate", type=float, default=0, help="CDN responses dropped part way")
+    parser.add_argument("--storage-latency-ms", type=float, default=0)
+    parser.add_argument("--storage-failure-rate", type=float, default=0)
+    parser.add_argument("--staging-mode", choices=config.STAGING_MODES, default="download")
+    parser.add_argument("--storage-layout", choices=config.STORAGE_LAYOUTS, default="tiered")
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--pipeline", action="store_true")
+    parser.add_argument("--azurite", metavar="CONNECTION_STRING", help="Use Azurite instead of the on-disk fake")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Keep run files here instead of a temp directory")
+    parser.add_argument("--keep", action="store_true", help="Leave the temp directory behind")
+    parser.add_argument("--output", help="Write the report here as well as to stdout")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="m365-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    try:
+        report = run_benchmark(args, workdir)
+    finally:
+        if not args.workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    
+    print(json.dumps(report, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    
+    if args.baseline:
+        regressions = compare(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
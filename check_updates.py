@@ -1,15 +1,29 @@
 #!/usr/bin/env python3
 
 import argparse
+import asyncio
 import logging
+import signal
 import sys
-import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from pathlib import Path
 
-from src.azure_storage import AzureStorageClient
-from src.config import APPS, Settings
-from src.manifest import ManifestManager
-from src.mau_client import MAUClient
+from src.config import (
+    APPS,
+    DEFAULT_LOCALE,
+    STAGING_MODES,
+    AppConfig,
+    Settings,
+    locale_blob_name,
+)
+from src.manifest import DeltaState, ManifestManager, delta_blob_name
+from src.mau_client import MAUClient, UpdateInfo
+from src.metrics import record_run
+from src.pipeline import StagingQueue
+from src.telemetry import Telemetry, for_app
+from src.watch import PollSchedule, Watcher
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,110 +32,880 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def check_for_updates(settings, manifest_mgr, mau, storage, dry_run=False):
-    updated = []
+class TransferLimits:
+    def __init__(self, cdn=1, azure=1):
+        self.cdn = threading.BoundedSemaphore(cdn)
+        self.azure = threading.BoundedSemaphore(azure)
+        self.manifest = threading.Lock()
+    
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.cdn_concurrency, settings.azure_concurrency)
+
+
+class AsyncTransferLimits(TransferLimits):
+    def __init__(self, cdn=1, azure=1):
+        super().__init__(cdn, azure)
+        # The manifest lock stays a threading.Lock: it is never held across an await
+        self.cdn = asyncio.BoundedSemaphore(cdn)
+        self.azure = asyncio.BoundedSemaphore(azure)
+
+
+@dataclass
+class StageJob:
+    app_key: str
+    app_cfg: AppConfig
+    info: UpdateInfo
+    path: Path = None
+
+
+def download_name(app_key, app_cfg):
+    # Other channels reuse the app keys, so their temp files need their own names
+    return f"{app_cfg.channel}-{app_key}" if app_cfg.channel else app_key
+
+
+def resolve_app(app_key, app_cfg, manifest_mgr, mau, limits):
+    logger.info(f"Checking {app_cfg.name}")
+    with limits.cdn:
+        info = mau.get_update_info(app_cfg)
+    if not info:
+        logger.warning(f"Could not get update info for {app_cfg.name}")
+        return None
+    return reuse_known_hash(app_key, app_cfg, info, manifest_mgr, limits)
+
+
+def reuse_known_hash(app_key, app_cfg, info, manifest_mgr, limits):
+    # Reuse the hash from a previous run when the server says nothing changed,
+    # rather than downloading the whole package to work it out again
+    if not info.sha256:
+        with limits.manifest:
+            known = manifest_mgr.find_unchanged_package(
+                app_key, info.download_url, info.etag, info.last_modified,
+                info.file_size, info.fingerprint,
+            )
+        if known:
+            logger.info(f"{app_cfg.name} unchanged since last check")
+            info.sha256 = known.sha256
+    
+    return info
+
+
+def is_new_package(app_key, app_cfg, info, manifest_mgr, limits):
+    with limits.manifest:
+        available = manifest_mgr.is_update_available(app_key, info.version, info.sha256)
+    if not available:
+        logger.info(f"{app_cfg.name} is up to date")
+    return available
+
+
+def record_stage(app_key, app_cfg, info, manifest_mgr, limits, delta=None):
+    with limits.manifest:
+        manifest_mgr.stage_update(
+            app_key=app_key,
+            app_id=app_cfg.app_id,
+            name=app_cfg.name,
+            blob_name=app_cfg.blob_name,
+            version=info.version,
+            sha256=info.sha256,
+            download_url=info.download_url,
+            file_size=info.file_size,
+            min_os=info.min_os,
+            etag=info.etag,
+            last_modified=info.last_modified,
+            fingerprint=info.fingerprint,
+            delta=delta,
+        )
+    logger.info(f"Staged {app_cfg.name} {info.version}")
+
+
+def plan_delta(app_key, info, manifest_mgr, limits):
+    # Clients already on the live build only need the delta from it
+    with limits.manifest:
+        state = manifest_mgr.get_app_state(app_key)
+    base = state.live.version if state and state.live else None
+    
+    # Don't leave an old delta next to a package it no longer patches
+    stale = None
+    if state and state.staged and state.staged.delta:
+        stale = state.staged.delta.blob_name
+    return base, info.delta_from(base), stale
+
+
+def stage_delta(app_key, app_cfg, info, manifest_mgr, mau, storage, limits):
+    base, delta, stale = plan_delta(app_key, info, manifest_mgr, limits)
+    if not delta:
+        if stale:
+            with limits.azure:
+                storage.delete_blob("staged", storage.tier_blob_name(stale))
+        return None
     
-    for app_key, app_cfg in APPS.items():
-        logger.info(f"Checking {app_cfg.name}")
+    blob_name = delta_blob_name(app_cfg.blob_name)
+    tmp_path = mau.download_path(f"{download_name(app_key, app_cfg)}-delta")
+    try:
+        with limits.cdn:
+            downloaded = mau.download_package(
+                delta.download_url, tmp_path, delta.sha256, delta.file_size
+            )
+        if not downloaded:
+            logger.warning(f"Delta download failed for {app_cfg.name}, staging full package only")
+            return None
+        sha256 = delta.sha256 or mau.compute_file_hash(tmp_path)
+        
+        with limits.azure:
+            uploaded = storage.upload_package(str(tmp_path), "staged", blob_name, sha256=sha256)
+        if not uploaded:
+            logger.warning(f"Delta upload failed for {app_cfg.name}, staging full package only")
+            return None
+    finally:
+        mau.discard_download(tmp_path)
+    
+    logger.info(f"Staged {app_cfg.name} delta from {base}")
+    return DeltaState(
+        from_version=base,
+        sha256=sha256,
+        download_url=delta.download_url,
+        blob_name=blob_name,
+        file_size=delta.file_size,
+    )
+
+
+def download_app(app_key, app_cfg, info, manifest_mgr, mau, limits, dry_run=False):
+    tmp_path = mau.download_path(download_name(app_key, app_cfg))
+    
+    keep = False
+    downloaded = False
+    try:
+        # Get hash if not in manifest
+        if not info.sha256:
+            logger.info("Downloading to compute hash")
+            with limits.cdn:
+                downloaded = mau.download_package(info.download_url, tmp_path, size=info.file_size)
+            if not downloaded:
+                logger.error(f"Download failed for {app_cfg.name}")
+                return None
+            info.sha256 = mau.compute_file_hash(tmp_path)
+        
+        # Check if we already have this version
+        if not is_new_package(app_key, app_cfg, info, manifest_mgr, limits):
+            return None
+        
+        if dry_run:
+            logger.info(f"[DRY RUN] Would stage {app_cfg.name} {info.version}")
+            return StageJob(app_key, app_cfg, info)
+        
+        # Download if needed
+        if not downloaded:
+            with limits.cdn:
+                downloaded = mau.download_package(
+                    info.download_url, tmp_path, info.sha256, info.file_size
+                )
+            if not downloaded:
+                logger.error(f"Download failed for {app_cfg.name}")
+                return None
         
+        keep = True
+        return StageJob(app_key, app_cfg, info, tmp_path)
+    
+    finally:
+        if not keep:
+            mau.discard_download(tmp_path)
+
+
+def upload_app(job, manifest_mgr, mau, storage, limits):
+    app_cfg = job.app_cfg
+    
+    # Upload to Azure
+    with limits.azure:
+        uploaded = storage.upload_package(
+            str(job.path), "staged", app_cfg.blob_name, sha256=job.info.sha256
+        )
+    if not uploaded:
+        logger.error(f"Upload failed for {app_cfg.name}")
+        return False
+    
+    delta = stage_delta(job.app_key, app_cfg, job.info, manifest_mgr, mau, storage, limits)
+    record_stage(job.app_key, app_cfg, job.info, manifest_mgr, limits, delta)
+    return True
+
+
+def stream_app(app_key, app_cfg, info, manifest_mgr, mau, storage, limits, dry_run=False):
+    if not info.sha256 and dry_run:
+        logger.info("Streaming to compute hash")
+        with limits.cdn:
+            info.sha256 = mau.compute_url_hash(info.download_url)
+    
+    if info.sha256:
+        if not is_new_package(app_key, app_cfg, info, manifest_mgr, limits):
+            return False
+        if dry_run:
+            logger.info(f"[DRY RUN] Would stage {app_cfg.name} {info.version}")
+            return True
+    
+    # A verified local copy beats pulling the same bytes from the CDN again
+    cached = mau.cached_package(info.sha256) if info.sha256 else None
+    if cached:
+        job = StageJob(app_key, app_cfg, info, cached)
+        return upload_app(job, manifest_mgr, mau, storage, limits)
+    
+    with limits.cdn, limits.azure:
+        staged = storage.stage_stream(
+            mau.iter_package(info.download_url), "staged", app_cfg.blob_name, info.sha256
+        )
+    if not staged:
+        logger.error(f"Streamed upload failed for {app_cfg.name}")
+        return False
+    
+    # Without a published hash the streamed bytes are all we have to compare
+    if not info.sha256:
+        info.sha256 = staged.sha256
+        if not is_new_package(app_key, app_cfg, info, manifest_mgr, limits):
+            return False
+    
+    with limits.azure:
+        committed = storage.commit_staged(staged, info.sha256)
+    if not committed:
+        logger.error(f"Upload failed for {app_cfg.name}")
+        return False
+    
+    delta = stage_delta(app_key, app_cfg, info, manifest_mgr, mau, storage, limits)
+    record_stage(app_key, app_cfg, info, manifest_mgr, limits, delta)
+    return True
+
+
+def server_copy_app(app_key, app_cfg, info, manifest_mgr, mau, storage, limits,
+                    dry_run=False):
+    # Azure can only be checked against a hash and size we already know
+    if not info.sha256 or not info.file_size:
+        logger.info(f"No published hash or size for {app_cfg.name}, streaming instead")
+        return stream_app(app_key, app_cfg, info, manifest_mgr, mau, storage, limits, dry_run)
+    
+    if not is_new_package(app_key, app_cfg, info, manifest_mgr, limits):
+        return False
+    
+    if dry_run:
+        logger.info(f"[DRY RUN] Would stage {app_cfg.name} {info.version}")
+        return True
+    
+    def read_source(offset, length):
+        return mau.fetch_range(info.download_url, offset, length)
+    
+    # Azure pulls from the CDN and the samples are read back from it, so the
+    # copy holds both slots, taken cdn then azure like every other path
+    with limits.cdn, limits.azure:
+        copied = storage.stage_from_url(
+            info.download_url, "staged", app_cfg.blob_name,
+            info.sha256, info.file_size, read_source,
+        )
+    if not copied:
+        logger.error(f"Server-side copy failed for {app_cfg.name}")
+        return False
+    
+    delta = stage_delta(app_key, app_cfg, info, manifest_mgr, mau, storage, limits)
+    record_stage(app_key, app_cfg, info, manifest_mgr, limits, delta)
+    return True
+
+
+def stage_app(app_key, app_cfg, manifest_mgr, mau, storage, limits, dry_run=False,
+              staging_mode="download"):
+    with for_app(app_key):
         try:
-            info = mau.get_update_info(app_cfg)
+            info = resolve_app(app_key, app_cfg, manifest_mgr, mau, limits)
             if not info:
-                logger.warning(f"Could not get update info for {app_cfg.name}")
-                continue
-            
-            with tempfile.NamedTemporaryFile(suffix=".pkg", delete=False) as tmp:
-                tmp_path = Path(tmp.name)
-            
+                return False
+            return stage_info(
+                app_key, app_cfg, info, manifest_mgr, mau, storage, limits, dry_run, staging_mode
+            )
+        
+        except Exception as e:
+            logger.error(f"Error processing {app_cfg.name}: {e}")
+            return False
+
+
+def stage_info(app_key, app_cfg, info, manifest_mgr, mau, storage, limits, dry_run=False,
+               staging_mode="download"):
+    if staging_mode == "stream":
+        return stream_app(
+            app_key, app_cfg, info, manifest_mgr, mau, storage, limits, dry_run
+        )
+    if staging_mode == "server-copy":
+        return server_copy_app(
+            app_key, app_cfg, info, manifest_mgr, mau, storage, limits, dry_run
+        )
+    
+    job = download_app(app_key, app_cfg, info, manifest_mgr, mau, limits, dry_run)
+    if not job:
+        return False
+    if not job.path:
+        return True
+    
+    try:
+        return upload_app(job, manifest_mgr, mau, storage, limits)
+    finally:
+        job.path.unlink(missing_ok=True)
+
+
+def fan_out_app(app_key, app_cfg, info, manifest_mgr, mau, storage, limits, dry_run=False):
+    # Returns None when Azure holds no copy yet and the package must be fetched
+    if not info.sha256 or dry_run:
+        return None
+    if not is_new_package(app_key, app_cfg, info, manifest_mgr, limits):
+        return False
+    
+    with limits.azure:
+        placed = storage.stage_identical("staged", app_cfg.blob_name, info.sha256, info.file_size)
+    if not placed:
+        return None
+    
+    delta = stage_delta(app_key, app_cfg, info, manifest_mgr, mau, storage, limits)
+    record_stage(app_key, app_cfg, info, manifest_mgr, limits, delta)
+    return True
+
+
+def matrix_entries(settings):
+    # Primary-channel, default-locale entries keep the plain app keys and blobs
+    entries = []
+    for channel in settings.channels:
+        for locale in settings.locales:
+            for app_key, app_cfg in APPS.items():
+                if locale != DEFAULT_LOCALE:
+                    app_key = f"{app_key}-{locale}"
+                    app_cfg = replace(
+                        app_cfg,
+                        blob_name=locale_blob_name(app_cfg.blob_name, locale),
+                        locale=locale,
+                    )
+                if channel != settings.channel:
+                    app_cfg = replace(app_cfg, channel=channel)
+                entries.append((channel, app_key, app_cfg))
+    return entries
+
+
+def _run_matrix(settings, manifest_mgr, mau, storage, limits, dry_run, jobs):
+    # Channels and locales mostly resolve to the same builds, so entries are
+    # grouped by package: the first fetches and uploads it, the rest are
+    # placed from the copy already in Azure
+    entries = matrix_entries(settings)
+    mode = settings.staging_mode
+    
+    def resolve(entry):
+        channel, app_key, app_cfg = entry
+        with for_app(settings.app_label(channel, app_key)):
             try:
-                # Get hash if not in manifest
-                if not info.sha256:
-                    logger.info("Downloading to compute hash")
-                    if not mau.download_package(info.download_url, tmp_path):
-                        logger.error(f"Download failed for {app_cfg.name}")
-                        continue
-                    info.sha256 = mau.compute_file_hash(tmp_path)
-                
-                # Check if we already have this version
-                if not manifest_mgr.is_update_available(app_key, info.version, info.sha256):
-                    logger.info(f"{app_cfg.name} is up to date")
-                    continue
-                
-                if dry_run:
-                    logger.info(f"[DRY RUN] Would stage {app_cfg.name} {info.version}")
-                    updated.append(app_key)
-                    continue
-                
-                # Download if needed
-                if not tmp_path.exists() or tmp_path.stat().st_size == 0:
-                    if not mau.download_package(info.download_url, tmp_path, info.sha256):
-                        logger.error(f"Download failed for {app_cfg.name}")
-                        continue
-                
-                # Upload to Azure
-                if not storage.upload_package(str(tmp_path), "staged", app_cfg.blob_name):
-                    logger.error(f"Upload failed for {app_cfg.name}")
-                    continue
-                
-                # Update manifest
-                manifest_mgr.stage_update(
-                    app_key=app_key,
-                    app_id=app_cfg.app_id,
-                    name=app_cfg.name,
-                    blob_name=app_cfg.blob_name,
-                    version=info.version,
-                    sha256=info.sha256,
-                    download_url=info.download_url,
-                    file_size=info.file_size,
-                    min_os=info.min_os,
+                return resolve_app(
+                    app_key, app_cfg, manifest_mgr.for_channel(channel), mau, limits
                 )
+            except Exception as e:
+                logger.error(f"Error processing {app_cfg.name} ({channel}): {e}")
+                return None
+    
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="resolve") as pool:
+        infos = list(pool.map(resolve, entries))
+    
+    groups = {}
+    for entry, info in zip(entries, infos):
+        if info:
+            groups.setdefault(info.sha256 or info.download_url, []).append((entry, info))
+    logger.info(f"{len(entries)} checks resolved to {len(groups)} distinct packages")
+    
+    results = {}
+    
+    def stage_group(members):
+        known_sha = None
+        for (channel, app_key, app_cfg), info in members:
+            # The same URL serves the same bytes within one run
+            info.sha256 = info.sha256 or known_sha
+            channel_mgr = manifest_mgr.for_channel(channel)
+            channel_storage = storage.for_channel(channel) if storage else None
+            with for_app(settings.app_label(channel, app_key)):
+                try:
+                    staged = fan_out_app(
+                        app_key, app_cfg, info, channel_mgr, mau, channel_storage, limits, dry_run
+                    )
+                    if staged is None:
+                        staged = stage_info(
+                            app_key, app_cfg, info, channel_mgr, mau, channel_storage, limits,
+                            dry_run, mode,
+                        )
+                    results[(channel, app_key)] = staged
+                except Exception as e:
+                    logger.error(f"Error processing {app_cfg.name} ({channel}): {e}")
+            known_sha = known_sha or info.sha256
+    
+    with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="stage") as pool:
+        for future in [pool.submit(stage_group, members) for members in groups.values()]:
+            future.result()
+    
+    return [
+        settings.app_label(channel, app_key)
+        for channel, app_key, _ in entries
+        if results.get((channel, app_key))
+    ]
+
+
+def _run_pipeline(settings, manifest_mgr, mau, storage, limits, dry_run, jobs):
+    # Downloads feed a bounded queue that upload workers drain, so the next
+    # package is already coming down while the previous one goes up
+    queue = StagingQueue(settings.pipeline_depth, settings.pipeline_max_bytes)
+    results = dict.fromkeys(APPS, False)
+    
+    def produce(app_key, app_cfg):
+        with for_app(app_key):
+            try:
+                info = resolve_app(app_key, app_cfg, manifest_mgr, mau, limits)
+                if not info:
+                    return
+                
+                queue.reserve(info.file_size)
+                job = None
+                try:
+                    job = download_app(app_key, app_cfg, info, manifest_mgr, mau, limits, dry_run)
+                finally:
+                    if not job or not job.path:
+                        queue.release(info.file_size)
                 
-                updated.append(app_key)
-                logger.info(f"Staged {app_cfg.name} {info.version}")
+                if job and not job.path:
+                    results[app_key] = True
+                elif job:
+                    queue.put(job)
             
-            finally:
-                tmp_path.unlink(missing_ok=True)
+            except Exception as e:
+                logger.error(f"Error processing {app_cfg.name}: {e}")
+    
+    def consume():
+        while (job := queue.get()) is not None:
+            with for_app(job.app_key):
+                try:
+                    results[job.app_key] = upload_app(job, manifest_mgr, mau, storage, limits)
+                except Exception as e:
+                    logger.error(f"Error processing {job.app_cfg.name}: {e}")
+                finally:
+                    job.path.unlink(missing_ok=True)
+                    queue.release(job.info.file_size)
+    
+    uploaders = [
+        threading.Thread(target=consume, name=f"upload-{i}", daemon=True)
+        for i in range(settings.azure_concurrency)
+    ]
+    for thread in uploaders:
+        thread.start()
+    
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, jobs), thread_name_prefix="download") as pool:
+            for future in [pool.submit(produce, k, cfg) for k, cfg in APPS.items()]:
+                future.result()
+    finally:
+        queue.close()
+        for thread in uploaders:
+            thread.join()
+    
+    return results
+
+
+def check_for_updates(settings, manifest_mgr, mau, storage, dry_run=False, jobs=1,
+                      pipeline=False):
+    limits = TransferLimits.from_settings(settings)
+    mode = settings.staging_mode
+    
+    if len(settings.channels) > 1 or settings.locales != [DEFAULT_LOCALE]:
+        if pipeline:
+            logger.info("--pipeline is not used when checking several channels or locales")
+        return _run_matrix(settings, manifest_mgr, mau, storage, limits, dry_run, jobs)
+    
+    # Streaming already overlaps download and upload without temp files
+    if pipeline and mode == "download":
+        results = _run_pipeline(settings, manifest_mgr, mau, storage, limits, dry_run, jobs)
+    elif jobs <= 1:
+        results = {
+            app_key: stage_app(
+                app_key, app_cfg, manifest_mgr, mau, storage, limits, dry_run, mode
+            )
+            for app_key, app_cfg in APPS.items()
+        }
+    else:
+        with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="stage") as pool:
+            futures = {
+                app_key: pool.submit(
+                    stage_app, app_key, app_cfg, manifest_mgr, mau, storage, limits,
+                    dry_run, mode,
+                )
+                for app_key, app_cfg in APPS.items()
+            }
+            results = {app_key: future.result() for app_key, future in futures.items()}
+    
+    # Report in APPS order whatever order the workers finished in
+    return [app_key for app_key in APPS if results[app_key]]
+
+
+async def stage_delta_async(app_key, app_cfg, info, manifest_mgr, mau, storage, limits):
+    base, delta, stale = plan_delta(app_key, info, manifest_mgr, limits)
+    if not delta:
+        if stale:
+            async with limits.azure:
+                await storage.delete_blob("staged", storage.tier_blob_name(stale))
+        return None
+    
+    blob_name = delta_blob_name(app_cfg.blob_name)
+    tmp_path = mau.download_path(f"{download_name(app_key, app_cfg)}-delta")
+    try:
+        async with limits.cdn:
+            downloaded = await mau.download_package(
+                delta.download_url, tmp_path, delta.sha256, delta.file_size
+            )
+        if not downloaded:
+            logger.warning(f"Delta download failed for {app_cfg.name}, staging full package only")
+            return None
+        sha256 = delta.sha256 or await asyncio.to_thread(mau.compute_file_hash, tmp_path)
         
-        except Exception as e:
-            logger.error(f"Error processing {app_cfg.name}: {e}")
-            continue
+        async with limits.azure:
+            uploaded = await storage.upload_package(
+                str(tmp_path), "staged", blob_name, sha256=sha256
+            )
+        if not uploaded:
+            logger.warning(f"Delta upload failed for {app_cfg.name}, staging full package only")
+            return None
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    
+    logger.info(f"Staged {app_cfg.name} delta from {base}")
+    return DeltaState(
+        from_version=base,
+        sha256=sha256,
+        download_url=delta.download_url,
+        blob_name=blob_name,
+        file_size=delta.file_size,
+    )
+
+
+async def resolve_app_async(app_key, app_cfg, manifest_mgr, mau, limits):
+    logger.info(f"Checking {app_cfg.name}")
+    async with limits.cdn:
+        info = await mau.get_update_info(app_cfg)
+    if not info:
+        logger.warning(f"Could not get update info for {app_cfg.name}")
+        return None
+    return reuse_known_hash(app_key, app_cfg, info, manifest_mgr, limits)
+
+
+async def stage_info_async(app_key, app_cfg, info, manifest_mgr, mau, storage, limits,
+                           dry_run=False):
+    tmp_path = mau.download_path(download_name(app_key, app_cfg))
+    try:
+        downloaded = False
+        if not info.sha256:
+            logger.info("Downloading to compute hash")
+            async with limits.cdn:
+                downloaded = await mau.download_package(
+                    info.download_url, tmp_path, size=info.file_size
+                )
+            if not downloaded:
+                logger.error(f"Download failed for {app_cfg.name}")
+                return False
+            info.sha256 = await asyncio.to_thread(mau.compute_file_hash, tmp_path)
+        
+        if not is_new_package(app_key, app_cfg, info, manifest_mgr, limits):
+            return False
+        
+        if dry_run:
+            logger.info(f"[DRY RUN] Would stage {app_cfg.name} {info.version}")
+            return True
+        
+        if not downloaded:
+            async with limits.cdn:
+                downloaded = await mau.download_package(
+                    info.download_url, tmp_path, info.sha256, info.file_size
+                )
+            if not downloaded:
+                logger.error(f"Download failed for {app_cfg.name}")
+                return False
+        
+        async with limits.azure:
+            uploaded = await storage.upload_package(
+                str(tmp_path), "staged", app_cfg.blob_name, sha256=info.sha256
+            )
+        if not uploaded:
+            logger.error(f"Upload failed for {app_cfg.name}")
+            return False
+        
+        delta = await stage_delta_async(
+            app_key, app_cfg, info, manifest_mgr, mau, storage, limits
+        )
+        record_stage(app_key, app_cfg, info, manifest_mgr, limits, delta)
+        return True
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
+async def fan_out_app_async(app_key, app_cfg, info, manifest_mgr, mau, storage, limits,
+                            dry_run=False):
+    if not info.sha256 or dry_run:
+        return None
+    if not is_new_package(app_key, app_cfg, info, manifest_mgr, limits):
+        return False
+    
+    async with limits.azure:
+        placed = await storage.stage_identical(
+            "staged", app_cfg.blob_name, info.sha256, info.file_size
+        )
+    if not placed:
+        return None
+    
+    delta = await stage_delta_async(app_key, app_cfg, info, manifest_mgr, mau, storage, limits)
+    record_stage(app_key, app_cfg, info, manifest_mgr, limits, delta)
+    return True
+
+
+async def check_for_updates_async(settings, manifest_mgr, mau, storage, dry_run=False):
+    # Every check runs at once on the loop; the CDN and Azure semaphores are
+    # the only bound on how many transfers are in flight
+    limits = AsyncTransferLimits.from_settings(settings)
+    if settings.staging_mode != "download":
+        logger.info(f"Async staging downloads packages; ignoring {settings.staging_mode} mode")
+    entries = matrix_entries(settings)
+    
+    async def resolve(channel, app_key, app_cfg):
+        with for_app(settings.app_label(channel, app_key)):
+            try:
+                return await resolve_app_async(
+                    app_key, app_cfg, manifest_mgr.for_channel(channel), mau, limits
+                )
+            except Exception as e:
+                logger.error(f"Error processing {app_cfg.name} ({channel}): {e}")
+                return None
+    
+    infos = await asyncio.gather(*(resolve(*entry) for entry in entries))
     
-    return updated
+    # Grouped by package as in the threaded matrix run
+    groups = {}
+    for entry, info in zip(entries, infos):
+        if info:
+            groups.setdefault(info.sha256 or info.download_url, []).append((entry, info))
+    
+    results = {}
+    
+    async def stage_group(members):
+        known_sha = None
+        for (channel, app_key, app_cfg), info in members:
+            info.sha256 = info.sha256 or known_sha
+            channel_mgr = manifest_mgr.for_channel(channel)
+            channel_storage = storage.for_channel(channel) if storage else None
+            with for_app(settings.app_label(channel, app_key)):
+                try:
+                    staged = await fan_out_app_async(
+                        app_key, app_cfg, info, channel_mgr, mau, channel_storage, limits, dry_run
+                    )
+                    if staged is None:
+                        staged = await stage_info_async(
+                            app_key, app_cfg, info, channel_mgr, mau, channel_storage, limits,
+                            dry_run,
+                        )
+                    results[(channel, app_key)] = staged
+                except Exception as e:
+                    logger.error(f"Error processing {app_cfg.name} ({channel}): {e}")
+            known_sha = known_sha or info.sha256
+    
+    await asyncio.gather(*(stage_group(members) for members in groups.values()))
+    return [
+        settings.app_label(channel, app_key)
+        for channel, app_key, _ in entries
+        if results.get((channel, app_key))
+    ]
+
+
+def finish_check(settings, manifest_mgr, telemetry, updated, args):
+    if updated:
+        logger.info(f"Staged: {', '.join(updated)}")
+    else:
+        logger.info("No updates available")
+    
+    # Steps recovered from an interrupted run's journal are saved even when
+    # this run found nothing new
+    if (updated or manifest_mgr.recovered) and not args.dry_run:
+        manifest_mgr.save()
+    
+    if args.report:
+        telemetry.write_report(
+            args.report, command="check", dry_run=args.dry_run, updated=updated
+        )
+    
+    metrics_file = args.metrics_file or settings.metrics_textfile
+    if metrics_file and not args.dry_run:
+        record_run(metrics_file, "check", settings, manifest_mgr, telemetry, updated)
+
+
+def watch(settings, manifest_mgr, telemetry, args, stop=None):
+    # One process keeps the HTTP session, manifest cache and storage client
+    # warm between checks, and promotes from the same loop as each lag expires
+    from promote import promote_channels
+    
+    mau = MAUClient(settings, telemetry)
+    storage = None if args.dry_run else open_storage(settings, telemetry)
+    metrics_file = args.metrics_file or settings.metrics_textfile
+    
+    def check():
+        telemetry.reset()
+        if storage:
+            storage.refresh()
+        try:
+            with telemetry.watch_errors():
+                updated = check_for_updates(
+                    settings, manifest_mgr, mau, storage, args.dry_run, args.jobs, args.pipeline
+                )
+            finish_check(settings, manifest_mgr, telemetry, updated, args)
+        finally:
+            mau.end_run()
+        return bool(updated)
+    
+    def promote():
+        telemetry.reset()
+        storage.refresh()
+        with telemetry.watch_errors():
+            promoted = promote_channels(settings, manifest_mgr, storage)
+        if promoted:
+            logger.info(f"Promoted: {', '.join(promoted)}")
+            manifest_mgr.save()
+        if metrics_file:
+            record_run(metrics_file, "promote", settings, manifest_mgr, telemetry, promoted)
+    
+    def deadlines():
+        # Dry runs never promote, so they have no deadlines to keep
+        if args.dry_run:
+            return {}
+        due = {}
+        for channel in settings.channels:
+            channel_mgr = manifest_mgr.for_channel(channel)
+            for app_key in channel_mgr.manifest.apps:
+                when = channel_mgr.promotion_due(app_key, settings.lag_days)
+                if when:
+                    due[settings.app_label(channel, app_key)] = when
+        return due
+    
+    watcher = Watcher(PollSchedule.from_settings(settings), check, promote, deadlines, stop)
+    # The check or promotion in progress finishes before the loop exits
+    handlers = {
+        signum: signal.signal(signum, lambda *_: watcher.stop.set())
+        for signum in (signal.SIGINT, signal.SIGTERM)
+    }
+    try:
+        logger.info("Watching for updates; stop with Ctrl+C or SIGTERM")
+        watcher.run()
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+    logger.info("Stopped watching")
+    return 0
+
+
+def open_storage(settings, telemetry=None):
+    # Imported on first use: the Azure SDK is most of this script's start-up
+    # time, and dry runs never write to storage
+    from src.azure_storage import AzureStorageClient
+    
+    return AzureStorageClient(settings, telemetry=telemetry)
+
+
+async def _check_async(settings, manifest_mgr, dry_run, telemetry=None):
+    from src.async_mau_client import AsyncMAUClient
+    
+    async with AsyncMAUClient(settings, telemetry=telemetry) as mau:
+        if dry_run:
+            return await check_for_updates_async(settings, manifest_mgr, mau, None, dry_run)
+        
+        from src.async_azure_storage import AsyncAzureStorageClient
+        
+        async with AsyncAzureStorageClient(settings, telemetry=telemetry) as storage:
+            return await check_for_updates_async(settings, manifest_mgr, mau, storage, dry_run)
 
 
 def main():
     parser = argparse.ArgumentParser(description="Check for M365 updates")
     parser.add_argument("--dry-run", action="store_true")
     parser.add_argument("--manifest", default="manifest.json")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1,
+        help="Number of apps to check and stage concurrently",
+    )
+    parser.add_argument(
+        "--pipeline", action="store_true",
+        help="Overlap downloads with uploads through a bounded queue",
+    )
+    parser.add_argument(
+        "--staging-mode", choices=STAGING_MODES,
+        help="How packages reach Azure (default: STAGING_MODE or download)",
+    )
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true",
+        help="Check and stage every app on one asyncio event loop (needs the async extra)",
+    )
+    parser.add_argument(
+        "--report", metavar="PATH",
+        help="Write per-app timings, bytes and retries as JSON",
+    )
+    parser.add_argument(
+        "--profile", metavar="PATH",
+        help="Write cProfile stats for the run (and its hot paths to --report)",
+    )
+    parser.add_argument(
+        "--metrics-file", metavar="PATH",
+        help="Prometheus textfile to update (default: METRICS_TEXTFILE)",
+    )
+    parser.add_argument(
+        "--watch", action="store_true",
+        help="Keep running: poll on an adaptive schedule and promote as lags expire",
+    )
     parser.add_argument("-v", "--verbose", action="store_true")
     args = parser.parse_args()
     
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
     
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.watch and args.use_async:
+        parser.error("--watch runs the threaded client; drop --async")
+    
     try:
         settings = Settings()
     except ValueError as e:
         logger.error(f"Config error: {e}")
         return 1
     
-    manifest_mgr = ManifestManager(args.manifest)
+    if args.staging_mode:
+        settings.staging_mode = args.staging_mode
+    
+    telemetry = Telemetry()
+    manifest_mgr = ManifestManager(args.manifest, telemetry)
     manifest_mgr.manifest.channel = settings.channel
     manifest_mgr.manifest.lag_days = settings.lag_days
     
-    mau = MAUClient(settings)
-    storage = AzureStorageClient(settings)
+    logger.info(
+        f"Checking for updates (channels: {', '.join(settings.channels)}; "
+        f"locales: {', '.join(settings.locales)})"
+    )
     
-    logger.info(f"Checking for updates (channel: {settings.channel})")
+    if args.watch:
+        with telemetry.profile(args.profile):
+            return watch(settings, manifest_mgr, telemetry, args)
     
-    updated = check_for_updates(settings, manifest_mgr, mau, storage, args.dry_run)
+    with telemetry.watch_errors(), telemetry.profile(args.profile):
+        if args.use_async:
+            try:
+                updated = asyncio.run(
+                    _check_async(settings, manifest_mgr, args.dry_run, telemetry)
+                )
+            except ImportError as e:
+                logger.error(f"--async needs the async extra (pip install '.[async]'): {e}")
+                return 1
+        else:
+            mau = MAUClient(settings, telemetry)
+            storage = None if args.dry_run else open_storage(settings, telemetry)
+            try:
+                updated = check_for_updates(
+                    settings, manifest_mgr, mau, storage, args.dry_run, args.jobs, args.pipeline
+                )
+            finally:
+                mau.end_run()
     
-    if updated:
-        logger.info(f"Staged: {', '.join(updated)}")
-        if not args.dry_run:
-            manifest_mgr.save()
-    else:
-        logger.info("No updates available")
+    finish_check(settings, manifest_mgr, telemetry, updated, args)
     
     print(f"::set-output name=updated_count::{len(updated)}")
     print(f"::set-output name=updated_apps::{','.join(updated)}")
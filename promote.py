@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 
 import argparse
+import asyncio
 import logging
 import sys
+from datetime import datetime, timezone
 
-from src.azure_storage import AzureStorageClient
-from src.config import Settings
-from src.manifest import ManifestManager
+from src.config import CDN_URLS, Settings
+from src.manifest import ManifestManager, delta_blob_name
+from src.metrics import record_run
+from src.telemetry import Telemetry, for_app
 
 logging.basicConfig(
     level=logging.INFO,
@@ -17,6 +20,27 @@ logger = logging.getLogger(__name__)
 
 def promote_updates(settings, manifest_mgr, storage, dry_run=False, 
                      force=False, app_filter=None):
+    promoted, batch = _plan_batch(settings, manifest_mgr, dry_run, force, app_filter)
+    if not batch:
+        return promoted
+    
+    filenames, optional = _batch_blobs(batch)
+    results = storage.promote_packages(filenames, optional)
+    return promoted + _apply_results(manifest_mgr, batch, results)
+
+
+async def promote_updates_async(settings, manifest_mgr, storage, dry_run=False,
+                                force=False, app_filter=None):
+    promoted, batch = _plan_batch(settings, manifest_mgr, dry_run, force, app_filter)
+    if not batch:
+        return promoted
+    
+    filenames, optional = _batch_blobs(batch)
+    results = await storage.promote_packages(filenames, optional)
+    return promoted + _apply_results(manifest_mgr, batch, results)
+
+
+def _plan_batch(settings, manifest_mgr, dry_run, force, app_filter):
     promoted = []
     
     # Determine which apps are ready
@@ -32,10 +56,11 @@ def promote_updates(settings, manifest_mgr, storage, dry_run=False,
     
     if not ready:
         logger.info("No updates ready for promotion")
-        return []
+        return [], []
     
     logger.info(f"Ready: {', '.join(ready)}")
     
+    batch = []
     for key in ready:
         state = manifest_mgr.get_app_state(key)
         
@@ -50,13 +75,41 @@ def promote_updates(settings, manifest_mgr, storage, dry_run=False,
             promoted.append(key)
             continue
         
-        if not storage.promote_package(state.blob_name):
-            logger.error(f"Storage promotion failed for {state.name}")
-            continue
-        
-        if not manifest_mgr.promote_update(key):
-            logger.error(f"Manifest update failed for {state.name}")
-            continue
+        batch.append((key, state))
+    
+    return promoted, batch
+
+
+def _batch_blobs(batch):
+    # The delta follows its package between tiers; with no staged delta the
+    # live one is still archived so previous/ keeps matching the manifest
+    filenames = []
+    optional = set()
+    for key, state in batch:
+        filenames.append(state.blob_name)
+        if state.staged.delta or (state.live and state.live.delta):
+            delta_name = delta_blob_name(state.blob_name)
+            filenames.append(delta_name)
+            if not state.staged.delta:
+                optional.add(delta_name)
+    return filenames, optional
+
+
+def _apply_results(manifest_mgr, batch, results):
+    promoted = []
+    for key, state in batch:
+        with for_app(manifest_mgr.app_label(key)):
+            if not results.get(state.blob_name):
+                logger.error(f"Storage promotion failed for {state.name}")
+                continue
+            
+            if state.staged.delta and not results.get(delta_blob_name(state.blob_name)):
+                logger.warning(f"Delta promotion failed for {state.name}")
+                state.staged.delta = None
+            
+            if not manifest_mgr.promote_update(key):
+                logger.error(f"Manifest update failed for {state.name}")
+                continue
         
         promoted.append(key)
         logger.info(f"Promoted {state.name}")
@@ -89,21 +142,143 @@ def rollback_update(manifest_mgr, storage, app_key, dry_run=False):
         logger.error(f"Storage rollback failed for {state.name}")
         return False
     
+    delta_name = delta_blob_name(state.blob_name)
+    if state.previous.delta:
+        if not storage.rollback_package(delta_name):
+            logger.warning(f"Delta rollback failed for {state.name}")
+            state.previous.delta = None
+    elif state.live and state.live.delta:
+        # A delta up to the build being rolled back is no use once it leaves live
+        storage.delete_blob("live", storage.tier_blob_name(delta_name))
+    
     # Swap versions in manifest
     state.live, state.previous = state.previous, state.live
     manifest_mgr.set_app_state(app_key, state)
+    storage.remove_unreferenced_objects()
     
     logger.info(f"Rolled back {state.name}")
     return True
 
 
+def promote_channels(settings, manifest_mgr, storage, dry_run=False, force=False,
+                     app_filter=None):
+    # Each channel promotes its own staged tier on the same lag
+    promoted = []
+    for channel in settings.channels:
+        keys = promote_updates(
+            settings, manifest_mgr.for_channel(channel),
+            storage.for_channel(channel) if storage else None,
+            dry_run, force, app_filter,
+        )
+        promoted += [settings.app_label(channel, key) for key in keys]
+    
+    # Only once every channel has moved on, since they share objects/
+    if promoted and storage:
+        storage.remove_unreferenced_objects()
+    return promoted
+
+
+async def _promote_async(settings, manifest_mgr, args, telemetry=None):
+    if args.dry_run:
+        return await _promote_channels_async(settings, manifest_mgr, None, args)
+    
+    from src.async_azure_storage import AsyncAzureStorageClient
+    
+    async with AsyncAzureStorageClient(settings, telemetry=telemetry) as storage:
+        return await _promote_channels_async(settings, manifest_mgr, storage, args)
+
+
+async def _promote_channels_async(settings, manifest_mgr, storage, args):
+    promoted = []
+    for channel in settings.channels:
+        keys = await promote_updates_async(
+            settings, manifest_mgr.for_channel(channel),
+            storage.for_channel(channel) if storage else None,
+            args.dry_run, args.force, args.apps,
+        )
+        promoted += [settings.app_label(channel, key) for key in keys]
+    
+    if promoted and storage:
+        await storage.remove_unreferenced_objects()
+    return promoted
+
+
+def print_status(settings, manifest_mgr):
+    # Answered from the manifest alone, without touching Azure
+    now = datetime.now(timezone.utc)
+    for channel in settings.channels:
+        channel_mgr = manifest_mgr.for_channel(channel)
+        for app_key, state in channel_mgr.manifest.apps.items():
+            parts = [f"live {state.live.version if state.live else '-'}"]
+            if state.staged:
+                due = channel_mgr.promotion_due(app_key, settings.lag_days)
+                if not due:
+                    when = "unknown"
+                elif due <= now:
+                    when = "now"
+                else:
+                    when = due.strftime("%Y-%m-%d %H:%M UTC")
+                parts.append(f"staged {state.staged.version} (promotes {when})")
+            if state.previous:
+                parts.append(f"previous {state.previous.version}")
+            print(f"{settings.app_label(channel, app_key)}: {', '.join(parts)}")
+
+
+def _report(settings, manifest_mgr, promoted, args):
+    if promoted:
+        logger.info(f"Promoted: {', '.join(promoted)}")
+    else:
+        logger.info("No updates promoted")
+    
+    if (promoted or manifest_mgr.recovered) and not args.dry_run:
+        manifest_mgr.save()
+    
+    if args.report:
+        manifest_mgr.telemetry.write_report(
+            args.report, command="promote", dry_run=args.dry_run, promoted=promoted
+        )
+    
+    metrics_file = args.metrics_file or settings.metrics_textfile
+    if metrics_file and not args.dry_run:
+        record_run(metrics_file, "promote", settings, manifest_mgr, manifest_mgr.telemetry, promoted)
+    
+    print(f"::set-output name=promoted_count::{len(promoted)}")
+    print(f"::set-output name=promoted_apps::{','.join(promoted)}")
+    
+    return 0
+
+
 def main():
     parser = argparse.ArgumentParser(description="Promote M365 updates to live")
     parser.add_argument("--dry-run", action="store_true")
     parser.add_argument("--force", action="store_true")
     parser.add_argument("--apps", nargs="*")
     parser.add_argument("--rollback", metavar="APP")
+    parser.add_argument(
+        "--channel", choices=list(CDN_URLS),
+        help="Channel to roll back (default: UPDATE_CHANNEL)",
+    )
     parser.add_argument("--manifest", default="manifest.json")
+    parser.add_argument(
+        "--status", action="store_true",
+        help="Show each app's live, staged and previous versions and exit",
+    )
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true",
+        help="Promote on an asyncio event loop (needs the async extra)",
+    )
+    parser.add_argument(
+        "--report", metavar="PATH",
+        help="Write phase timings and retries as JSON",
+    )
+    parser.add_argument(
+        "--profile", metavar="PATH",
+        help="Write cProfile stats for the run (and its hot paths to --report)",
+    )
+    parser.add_argument(
+        "--metrics-file", metavar="PATH",
+        help="Prometheus textfile to update (default: METRICS_TEXTFILE)",
+    )
     parser.add_argument("-v", "--verbose", action="store_true")
     args = parser.parse_args()
     
@@ -116,35 +291,50 @@ def main():
         logger.error(f"Config error: {e}")
         return 1
     
-    manifest_mgr = ManifestManager(args.manifest)
-    storage = AzureStorageClient(settings)
+    telemetry = Telemetry()
+    manifest_mgr = ManifestManager(args.manifest, telemetry)
+    
+    if args.status:
+        print_status(settings, manifest_mgr)
+        return 0
+    
+    if args.use_async and not args.rollback:
+        try:
+            with telemetry.watch_errors(), telemetry.profile(args.profile):
+                promoted = asyncio.run(_promote_async(settings, manifest_mgr, args, telemetry))
+        except ImportError as e:
+            logger.error(f"--async needs the async extra (pip install '.[async]'): {e}")
+            return 1
+        return _report(settings, manifest_mgr, promoted, args)
+    
+    storage = None
+    if not args.dry_run:
+        # Imported here so dry runs and --status never load the Azure SDK
+        from src.azure_storage import AzureStorageClient
+        
+        storage = AzureStorageClient(settings, telemetry=telemetry)
     
     if args.rollback:
-        success = rollback_update(manifest_mgr, storage, args.rollback, args.dry_run)
+        channel = args.channel or settings.channel
+        success = rollback_update(
+            manifest_mgr.for_channel(channel),
+            storage.for_channel(channel) if storage else None,
+            args.rollback, args.dry_run,
+        )
         if success and not args.dry_run:
             manifest_mgr.save()
         return 0 if success else 1
     
-    promoted = promote_updates(
-        settings, 
-        manifest_mgr, 
-        storage,
-        args.dry_run,
-        args.force,
-        args.apps
-    )
-    
-    if promoted:
-        logger.info(f"Promoted: {', '.join(promoted)}")
-        if not args.dry_run:
-            manifest_mgr.save()
-    else:
-        logger.info("No updates promoted")
-    
-    print(f"::set-output name=promoted_count::{len(promoted)}")
-    print(f"::set-output name=promoted_apps::{','.join(promoted)}")
-    
-    return 0
+    with telemetry.watch_errors(), telemetry.profile(args.profile):
+        promoted = promote_channels(
+            settings, 
+            manifest_mgr, 
+            storage,
+            args.dry_run,
+            args.force,
+            args.apps
+        )
+    return _report(settings, manifest_mgr, promoted, args)
 
 
 if __name__ == "__main__":
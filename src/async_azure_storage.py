@@ -0,0 +1,392 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.storage.blob.aio import BlobServiceClient
+
+from src.azure_storage import (
+    BATCH_SIZE,
+    CHANNELS_FOLDER,
+    COPY_POLL_INTERVAL,
+    COPY_POLL_MAX_INTERVAL,
+    COPY_TIMEOUT,
+    OBJECTS_FOLDER,
+    StorageLayout,
+)
+from src.blob_inventory import TIERS, BlobInventory
+
+logger = logging.getLogger(__name__)
+
+
+# Async counterpart of AzureStorageClient for the calls check_updates and
+# promote make. Layout, naming and planning come from StorageLayout so both
+# clients write the same blobs.
+class AsyncAzureStorageClient(StorageLayout):
+    def __init__(self, settings, container=None, telemetry=None):
+        super().__init__(settings, telemetry)
+        self.blob_service = None
+        if container is None:
+            self.blob_service = BlobServiceClient.from_connection_string(
+                settings.azure_storage_connection_string
+            )
+            container = self.blob_service.get_container_client(settings.azure_container_name)
+        self.container = container
+        self.inventory = BlobInventory(container, TIERS + (OBJECTS_FOLDER, CHANNELS_FOLDER))
+        # Shared with channel views, so the container is only prepared once
+        self._ready = {}
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+    
+    async def close(self):
+        if self.blob_service:
+            await self.blob_service.close()
+    
+    async def _ensure_ready(self):
+        # Container creation and the inventory listing happen once, on first use
+        if "task" not in self._ready:
+            self._ready["task"] = asyncio.ensure_future(self._prepare())
+        await self._ready["task"]
+    
+    async def _prepare(self):
+        await self._ensure_container_exists()
+        try:
+            try:
+                listing = await self._list_blobs()
+            except ResourceNotFoundError as e:
+                if not self._container_missing(e):
+                    raise
+                await self._ensure_container_exists()
+                listing = await self._list_blobs()
+            self.inventory.populate(listing)
+        except Exception as e:
+            logger.warning(f"Blob listing failed, checking blobs individually: {e}")
+            self.inventory.disable()
+    
+    async def _ensure_container_exists(self):
+        if self._container_known(self.container):
+            return
+        if not await self.container.exists():
+            try:
+                await self.container.create_container(public_access="blob")
+                logger.info(f"Created container: {self.settings.azure_container_name}")
+            except ResourceExistsError:
+                pass
+        self._remember_container(self.container)
+    
+    async def _list_blobs(self):
+        return [blob async for blob in self.container.list_blobs(include=["metadata"])]
+    
+    async def blob_exists(self, folder, filename):
+        await self._ensure_ready()
+        blob_path = self._blob_path(folder, filename)
+        if self.inventory.tracks(blob_path):
+            return self.inventory.exists(blob_path)
+        
+        try:
+            return await self.container.get_blob_client(blob_path).exists()
+        except Exception:
+            return False
+    
+    async def _reuse_identical(self, folder, filename, sha256, size=None):
+        if not sha256:
+            return False
+        blob_path = self._blob_path(folder, filename)
+        
+        if not self.inventory.tracks(blob_path):
+            return await self._holds(blob_path, sha256, size)
+        
+        matches = self.inventory.find(sha256, size)
+        if any(record.name == blob_path for record in matches):
+            logger.info(f"{blob_path} already holds {sha256}, skipping upload")
+            return True
+        if not matches:
+            return False
+        
+        logger.info(f"Copying identical {matches[0].name} to {blob_path} instead of uploading")
+        return await self._copy(matches[0].name, blob_path)
+    
+    async def _holds(self, blob_path, sha256, size=None):
+        try:
+            properties = await self.container.get_blob_client(blob_path).get_blob_properties()
+        except ResourceNotFoundError:
+            return False
+        except Exception as e:
+            logger.debug(f"Could not read properties of {blob_path}: {e}")
+            return False
+        
+        metadata = properties.metadata or {}
+        if metadata.get("sha256") != sha256.lower():
+            return False
+        return not size or properties.size == size
+    
+    async def _publish(self, folder, filename, sha256, size):
+        if not self.content_addressed:
+            return True
+        
+        pointer_path, pointer = self._pointer(folder, filename, sha256, size)
+        try:
+            await self.container.get_blob_client(pointer_path).upload_blob(
+                pointer, overwrite=True, content_settings=self._pointer_settings(),
+                # Tagged like a package, so the listing knows what it points at
+                metadata={"sha256": sha256.lower()},
+            )
+        except Exception as e:
+            logger.error(f"Could not write pointer {pointer_path}: {e}")
+            return False
+        
+        self.inventory.record(pointer_path, sha256=sha256.lower())
+        return True
+    
+    async def stage_identical(self, folder, filename, sha256, size=None):
+        await self._ensure_ready()
+        target_folder, target_name = self._package_location(folder, filename, sha256)
+        if not await self._reuse_identical(target_folder, target_name, sha256, size):
+            return False
+        return await self._publish(folder, filename, sha256, size)
+    
+    async def upload_package(self, local_path, folder, filename, overwrite=True, sha256=None):
+        await self._ensure_ready()
+        try:
+            size = os.path.getsize(local_path)
+            sha256 = sha256 or await asyncio.to_thread(self._hash_file, local_path)
+            
+            target_folder, target_name = self._package_location(folder, filename, sha256)
+            blob_path = self._blob_path(target_folder, target_name)
+            
+            if not await self._reuse_identical(target_folder, target_name, sha256, size):
+                if not overwrite and await self.blob_exists(target_folder, target_name):
+                    logger.error(f"{blob_path} already exists")
+                    return False
+                with self.telemetry.span("upload"):
+                    await self._upload_blocks(
+                        local_path, blob_path, sha256, size,
+                        self._content_settings(filename, immutable=target_folder == OBJECTS_FOLDER),
+                    )
+                self.inventory.record(blob_path, size, sha256)
+                logger.info(f"Uploaded {local_path} to {blob_path}")
+            
+            return await self._publish(folder, filename, sha256, size)
+        except FileNotFoundError:
+            logger.error(f"Local file not found: {local_path}")
+            return False
+        except Exception as e:
+            logger.error(f"Upload failed for {local_path}: {e}")
+            return False
+    
+    async def _upload_blocks(self, local_path, blob_path, sha256, size, content_settings):
+        blob_client = self.container.get_blob_client(blob_path)
+        blocks = self._block_plan(sha256, size)
+        
+        try:
+            _, uncommitted = await blob_client.get_block_list("uncommitted")
+            uploaded = {block.id: block.size for block in uncommitted or []}
+        except Exception:
+            uploaded = {}
+        missing = [block for block in blocks if uploaded.get(block[0]) != block[2]]
+        self.telemetry.add_bytes("upload", sum(length for _, _, length in missing))
+        
+        slots = asyncio.Semaphore(self.settings.upload_concurrency)
+        
+        async def put_block(block):
+            block_id, offset, length = block
+            async with slots:
+                data = await asyncio.to_thread(_read_range, local_path, offset, length)
+                await blob_client.stage_block(block_id, data, validate_content=True)
+        
+        # return_exceptions lets every block finish so a retry has less to send
+        failures = [
+            result for result in await asyncio.gather(
+                *(put_block(block) for block in missing), return_exceptions=True
+            )
+            if isinstance(result, Exception)
+        ]
+        if failures:
+            raise failures[0]
+        
+        await blob_client.commit_block_list(
+            [block_id for block_id, _, _ in blocks],
+            content_settings=content_settings,
+            metadata=self._metadata(sha256, size),
+        )
+    
+    async def start_copy(self, source_folder, source_filename, dest_folder, dest_filename=None):
+        return await self._start_copy(
+            self._blob_path(source_folder, source_filename),
+            self._blob_path(dest_folder, dest_filename or source_filename),
+        )
+    
+    async def _start_copy(self, source_path, dest_path):
+        try:
+            source_client = self.container.get_blob_client(source_path)
+            dest_client = self.container.get_blob_client(dest_path)
+            copy = await dest_client.start_copy_from_url(source_client.url) or {}
+            self.inventory.copy(source_path, dest_path)
+            return copy.get("copy_status") or "pending"
+        except ResourceNotFoundError:
+            logger.error(f"Source blob not found: {source_path}")
+            return None
+        except Exception as e:
+            logger.error(f"Copy failed: {e}")
+            return None
+    
+    async def wait_for_copies(self, blob_paths):
+        results = {}
+        pending = set(blob_paths)
+        delay = COPY_POLL_INTERVAL
+        deadline = time.monotonic() + COPY_TIMEOUT
+        while pending:
+            paths = sorted(pending)
+            statuses = await asyncio.gather(*(self._copy_status(path) for path in paths))
+            for blob_path, status in zip(paths, statuses):
+                if status == "pending":
+                    continue
+                pending.discard(blob_path)
+                results[blob_path] = status == "success"
+                if not results[blob_path]:
+                    logger.error(f"Copy to {blob_path} ended with status {status}")
+            
+            if not pending:
+                break
+            if time.monotonic() >= deadline:
+                for blob_path in pending:
+                    logger.error(f"Copy to {blob_path} did not finish in {COPY_TIMEOUT}s")
+                    results[blob_path] = False
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, COPY_POLL_MAX_INTERVAL)
+        return results
+    
+    async def _copy_status(self, blob_path):
+        try:
+            properties = await self.container.get_blob_client(blob_path).get_blob_properties()
+        except Exception as e:
+            logger.error(f"Could not read copy status of {blob_path}: {e}")
+            return "failed"
+        copy = getattr(properties, "copy", None)
+        return getattr(copy, "status", None) or "success"
+    
+    async def copy_blob(self, source_folder, source_filename, dest_folder, dest_filename=None):
+        return await self._copy(
+            self._blob_path(source_folder, source_filename),
+            self._blob_path(dest_folder, dest_filename or source_filename),
+        )
+    
+    async def _copy(self, source_path, dest_path):
+        status = await self._start_copy(source_path, dest_path)
+        if status is None:
+            return False
+        if status != "success":
+            return (await self.wait_for_copies([dest_path]))[dest_path]
+        return True
+    
+    async def copy_blobs(self, source_folder, dest_folder, filenames):
+        statuses = await asyncio.gather(
+            *(self.start_copy(source_folder, filename, dest_folder) for filename in filenames)
+        )
+        
+        results = {}
+        pending = {}
+        for filename, status in zip(filenames, statuses):
+            if status == "pending":
+                pending[self._blob_path(dest_folder, filename)] = filename
+            else:
+                results[filename] = status == "success"
+        
+        for blob_path, copied in (await self.wait_for_copies(pending)).items():
+            results[pending[blob_path]] = copied
+        return results
+    
+    async def delete_blob(self, folder, filename):
+        return await self.delete_blobs([self._blob_path(folder, filename)])
+    
+    async def delete_blobs(self, blob_paths):
+        await self._ensure_ready()
+        blob_paths = [
+            path for path in blob_paths
+            if not self.inventory.tracks(path) or self.inventory.exists(path)
+        ]
+        
+        deleted = True
+        for start in range(0, len(blob_paths), BATCH_SIZE):
+            batch = blob_paths[start:start + BATCH_SIZE]
+            try:
+                responses = await self.container.delete_blobs(*batch, raise_on_any_failure=False)
+                responses = [response async for response in responses]
+            except Exception as e:
+                logger.error(f"Batch delete failed: {e}")
+                deleted = False
+                continue
+            
+            for blob_path, response in zip(batch, responses):
+                if response.status_code in (202, 404):
+                    self.inventory.remove(blob_path)
+                else:
+                    logger.error(f"Delete failed for {blob_path}: {response.status_code}")
+                    deleted = False
+        return deleted
+    
+    async def promote_package(self, filename, required=True):
+        optional = () if required else (filename,)
+        return (await self.promote_packages([filename], optional))[filename]
+    
+    async def promote_packages(self, filenames, optional=()):
+        with self.telemetry.span("promote"):
+            return await self._promote_packages(filenames, optional)
+    
+    async def _promote_packages(self, filenames, optional):
+        await self._ensure_ready()
+        if self.content_addressed:
+            names = {filename: self.tier_blob_name(filename) for filename in filenames}
+            results = await self._promote_blobs(
+                list(names.values()), {names[filename] for filename in optional}
+            )
+            return {filename: results[names[filename]] for filename in filenames}
+        return await self._promote_blobs(filenames, optional)
+    
+    async def remove_unreferenced_objects(self):
+        await self._ensure_ready()
+        if not self.content_addressed or not self.inventory.tracks(f"{OBJECTS_FOLDER}/"):
+            return True
+        
+        objects, referenced, unread = self._object_references(self.inventory.records())
+        for name in unread:
+            try:
+                download = await self.container.get_blob_client(name).download_blob()
+                pointer = json.loads(await download.readall())
+                referenced.add(pointer["sha256"].lower())
+            except Exception as e:
+                logger.warning(f"Could not read pointer {name}, keeping every object: {e}")
+                return False
+        
+        stale = self._unreferenced(objects, referenced)
+        return await self.delete_blobs(stale) if stale else True
+    
+    async def _promote_blobs(self, filenames, optional=()):
+        logger.info(f"Promoting {', '.join(filenames)}")
+        results = dict.fromkeys(filenames, False)
+        
+        staged = {f for f in filenames if await self.blob_exists("staged", f)}
+        changing = [f for f in filenames if f in staged or f in optional]
+        live = [f for f in changing if await self.blob_exists("live", f)]
+        archived = await self.copy_blobs("live", "previous", live)
+        
+        ready, retired = self._plan_promotion(filenames, optional, archived, staged, results)
+        
+        promoted = await self.copy_blobs("staged", "live", ready)
+        sources = self._promotion_sources(retired, promoted, results)
+        if sources:
+            await self.delete_blobs(sources)
+        return results
+
+
+def _read_range(path, offset, length):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
@@ -0,0 +1,276 @@
+import asyncio
+import hashlib
+import logging
+import os
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import aiohttp
+
+from src import xar
+from src.downloader import Probe
+from src.mau_client import (
+    CHUNK_SIZE,
+    DOWNLOAD_TIMEOUT,
+    REQUEST_TIMEOUT,
+    STREAM_CHUNK_SIZE,
+    MAUClient,
+)
+
+logger = logging.getLogger(__name__)
+
+NETWORK_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+
+def _timeout(read_timeout):
+    # Bound connect and each read, not the whole transfer, so big packages can finish
+    return aiohttp.ClientTimeout(total=None, sock_connect=REQUEST_TIMEOUT, sock_read=read_timeout)
+
+
+# Async counterpart of MAUClient. Parsing, caches and paths are inherited;
+# every method that touches the network is a coroutine on a pooled aiohttp session.
+class AsyncMAUClient(MAUClient):
+    def __init__(self, settings, http=None, telemetry=None):
+        super().__init__(settings, telemetry)
+        self.http = http
+        self._owns_http = http is None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+    
+    async def close(self):
+        self.end_run()
+        if self.http and self._owns_http:
+            await self.http.close()
+    
+    def _session(self):
+        if self.http is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.settings.cdn_concurrency * self.settings.download_segments,
+                ttl_dns_cache=300,
+            )
+            self.http = aiohttp.ClientSession(
+                connector=connector,
+                headers={"User-Agent": "M365UpdateManager/1.0"},
+            )
+        return self.http
+    
+    async def get_update_info(self, app):
+        with self.telemetry.span("manifest"):
+            return await self._fetch_update_info(app)
+    
+    async def _fetch_update_info(self, app):
+        manifest_url = self._manifest_url(app)
+        logger.info(f"Checking {app.name}")
+        
+        cached = self._cached_manifest(manifest_url)
+        if cached and cached.is_fresh(self.cache.ttl):
+            logger.debug(f"Using cached manifest for {app.name}")
+            return self._cached_info(cached)
+        
+        try:
+            headers = cached.conditional_headers() if cached else {}
+            async with self._session().get(
+                manifest_url, headers=headers, timeout=_timeout(REQUEST_TIMEOUT)
+            ) as response:
+                if response.status == 304 and cached:
+                    logger.debug(f"Manifest for {app.name} not modified")
+                    self.cache.refresh(cached)
+                    info = self._cached_info(cached)
+                    if info:
+                        return info
+                else:
+                    response.raise_for_status()
+                    info = self._parse_manifest(await response.read(), app.app_id)
+                    if info:
+                        self._remember_manifest(manifest_url, info, response.headers)
+                        return info
+        except (*NETWORK_ERRORS, ET.ParseError) as e:
+            logger.debug(f"Manifest fetch failed: {e}")
+        
+        return await self._get_from_fwlink(app)
+    
+    async def _get_from_fwlink(self, app):
+        if not self._fwlink_serves(app):
+            return None
+        try:
+            async with self._session().head(
+                app.fwlink, allow_redirects=True, timeout=_timeout(REQUEST_TIMEOUT)
+            ) as response:
+                response.raise_for_status()
+                url = str(response.url)
+                headers = response.headers
+            
+            inspection = await self.inspect_package(url, app.bundle_id)
+            return self._fwlink_info(app, url, headers, inspection)
+        except NETWORK_ERRORS as e:
+            logger.error(f"FWLink failed for {app.name}: {e}")
+            return None
+    
+    async def inspect_package(self, url, bundle_id):
+        try:
+            header = xar.parse_header(await self.fetch_range(url, 0, xar.HEADER_SIZE))
+            toc = await self.fetch_range(url, header.header_size, header.toc_length_compressed)
+            files = xar.parse_toc(toc)
+            
+            members = xar.metadata_files(files)
+            data = await asyncio.gather(*(
+                self.fetch_range(url, header.heap_offset + member.offset, member.length)
+                for member in members
+            ))
+            documents = [xar.decode_member(member, raw) for member, raw in zip(members, data)]
+            
+            digest, checksums = xar.fingerprint(files)
+            return xar.PackageInspection(xar.find_version(documents, bundle_id), digest, checksums)
+        except (*NETWORK_ERRORS, xar.XarError, OSError, ValueError) as e:
+            logger.debug(f"Package inspection failed for {url}: {e}")
+            return xar.PackageInspection()
+    
+    async def fetch_range(self, url, start, length):
+        headers = {"Range": f"bytes={start}-{start + length - 1}"}
+        async with self._session().get(
+            url, headers=headers, timeout=_timeout(REQUEST_TIMEOUT)
+        ) as response:
+            response.raise_for_status()
+            data = bytearray()
+            skip = start if response.status == 200 else 0
+            
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                if skip:
+                    dropped = min(skip, len(chunk))
+                    chunk = chunk[dropped:]
+                    skip -= dropped
+                data.extend(chunk)
+                if len(data) >= length:
+                    break
+            return bytes(data[:length])
+    
+    async def iter_package(self, url, chunk_size=STREAM_CHUNK_SIZE):
+        logger.info(f"Streaming {url}")
+        async with self._session().get(url, timeout=_timeout(DOWNLOAD_TIMEOUT)) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield chunk
+    
+    async def compute_url_hash(self, url):
+        sha_hash = hashlib.sha256()
+        async for chunk in self.iter_package(url):
+            sha_hash.update(chunk)
+        return sha_hash.hexdigest()
+    
+    async def probe(self, url, size_hint=None):
+        try:
+            async with self._session().head(
+                url, allow_redirects=True, timeout=_timeout(REQUEST_TIMEOUT)
+            ) as response:
+                response.raise_for_status()
+                length = response.headers.get("Content-Length")
+                return Probe(
+                    size=int(length) if length else size_hint,
+                    etag=response.headers.get("ETag"),
+                    ranged=response.headers.get("Accept-Ranges", "").lower() == "bytes",
+                )
+        except NETWORK_ERRORS as e:
+            logger.debug(f"HEAD failed for {url}, using single stream: {e}")
+            return Probe(size=size_hint)
+    
+    async def download_package(self, url, dest, expected_sha=None, size=None):
+        key = (url, expected_sha.lower() if expected_sha else None)
+        flight, leader = self._board(key, asyncio.Event())
+        if not leader:
+            await flight.done.wait()
+            return await asyncio.to_thread(self._join, flight, url, dest) or (
+                await self.download_package(url, dest, expected_sha, size)
+            )
+        
+        sha256 = None
+        try:
+            with self.telemetry.span("download"):
+                sha256 = await self._fetch(url, Path(dest), expected_sha, size)
+        finally:
+            self._land(key, flight, url, dest, sha256)
+        return sha256 is not None
+    
+    async def _fetch(self, url, dest, expected_sha, size):
+        try:
+            probe = await self.probe(url, size)
+            known_sha = await asyncio.to_thread(self._link_cached, url, dest, expected_sha, probe)
+            if known_sha:
+                return known_sha
+            
+            logger.info(f"Downloading {url}")
+            segments = self._segments(probe)
+            if segments:
+                await self._download_segments(url, dest, probe, segments)
+            else:
+                await self._download_stream(url, dest)
+            
+            computed = await asyncio.to_thread(self.compute_file_hash, dest)
+            return await asyncio.to_thread(
+                self._accept_download, url, dest, computed, expected_sha, probe
+            )
+        except (*NETWORK_ERRORS, OSError) as e:
+            logger.error(f"Download failed: {e}")
+            return None
+    
+    def _segments(self, probe):
+        count = self.settings.download_segments
+        minimum = self.settings.download_segment_min_bytes
+        if not probe.ranged or not probe.size or probe.size < minimum * 2 or count == 1:
+            return None
+        
+        count = min(count, probe.size // minimum)
+        step = -(-probe.size // count)
+        return [(start, min(start + step, probe.size) - 1) for start in range(0, probe.size, step)]
+    
+    async def _download_segments(self, url, dest, probe, segments):
+        dest.unlink(missing_ok=True)
+        with open(dest, "wb") as f:
+            f.truncate(probe.size)
+        
+        fd = os.open(dest, os.O_WRONLY)
+        try:
+            await asyncio.gather(*(
+                self._fetch_segment(url, fd, probe.etag, start, end) for start, end in segments
+            ))
+        finally:
+            os.close(fd)
+    
+    async def _fetch_segment(self, url, fd, etag, start, end):
+        position = start
+        attempt = 0
+        while True:
+            headers = {"Range": f"bytes={position}-{end}"}
+            if etag:
+                headers["If-Range"] = etag
+            try:
+                async with self._session().get(
+                    url, headers=headers, timeout=_timeout(DOWNLOAD_TIMEOUT)
+                ) as response:
+                    response.raise_for_status()
+                    if response.status != 206:
+                        raise OSError(f"{url} changed during download ({response.status})")
+                    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                        chunk = chunk[:end + 1 - position]
+                        os.pwrite(fd, chunk, position)
+                        position += len(chunk)
+                if position > end:
+                    return
+                raise aiohttp.ClientPayloadError(f"Connection closed at byte {position} of {end}")
+            except NETWORK_ERRORS as e:
+                attempt += 1
+                if attempt > self.settings.download_retries:
+                    raise
+                self.telemetry.retry("download")
+                delay = 2 ** attempt
+                logger.warning(f"Segment {start}-{end} failed ({e}), retrying from byte {position} in {delay}s")
+                await asyncio.sleep(delay)
+    
+    async def _download_stream(self, url, dest):
+        dest.unlink(missing_ok=True)
+        with open(dest, "wb") as f:
+            async for chunk in self.iter_package(url):
+                f.write(chunk)
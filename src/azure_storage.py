@@ -1,50 +1,377 @@
+import copy
+import hashlib
+import json
 import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
 
 from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
 from azure.storage.blob import BlobServiceClient, ContentSettings
 
+from src.blob_inventory import TIERS, BlobInventory
+from src.telemetry import Telemetry
+
 logger = logging.getLogger(__name__)
 
 CHUNK_SIZE = 8192
+STREAM_BLOCK_SIZE = 8 * 1024 * 1024
+COPY_BLOCK_SIZE = 100 * 1024 * 1024
+COPY_CONCURRENCY = 4
+SAMPLE_SIZE = 1024 * 1024
+COPY_POLL_INTERVAL = 0.5
+COPY_POLL_MAX_INTERVAL = 8
+COPY_TIMEOUT = 600
+BATCH_SIZE = 256
+OBJECTS_FOLDER = "objects"
+CHANNELS_FOLDER = "channels"
+CONTAINER_MARKERS = "containers"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+POINTER_CACHE_CONTROL = "no-cache"
+BLOCK_TAG_LENGTH = 24
+
+
+@dataclass
+class StagedBlob:
+    blob_path: str
+    filename: str
+    block_ids: list
+    sha256: str
+    size: int
+    folder: str = None
+    stored: bool = False
 
 
-class AzureStorageClient:
-    def __init__(self, settings):
+# Naming, layout and block planning shared by the sync and async clients;
+# nothing here talks to Azure.
+class StorageLayout:
+    def __init__(self, settings, telemetry=None):
         self.settings = settings
-        self.blob_service = BlobServiceClient.from_connection_string(
-            settings.azure_storage_connection_string
+        self.telemetry = telemetry or Telemetry()
+        self.prefix = ""
+    
+    def for_channel(self, channel):
+        # Extra channels get their own tiers under channels/<name>/; the primary
+        # keeps the root ones and objects/ is shared by all
+        if channel == self.settings.channel:
+            return self
+        view = copy.copy(self)
+        view.prefix = f"{CHANNELS_FOLDER}/{channel}/"
+        return view
+    
+    def _container_marker(self, container):
+        # Keyed on the container URL, so another account or container is probed afresh
+        if not self.settings.cache_dir:
+            return None
+        url = getattr(container, "url", None) or self.settings.azure_container_name
+        digest = hashlib.sha256(url.encode()).hexdigest()[:32]
+        return Path(self.settings.cache_dir) / CONTAINER_MARKERS / digest
+    
+    def _container_known(self, container):
+        marker = self._container_marker(container)
+        return bool(marker and marker.exists())
+    
+    def _remember_container(self, container):
+        marker = self._container_marker(container)
+        if not marker:
+            return
+        try:
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            marker.touch()
+        except OSError as e:
+            logger.debug(f"Could not record container check: {e}")
+    
+    def _forget_container(self, container):
+        marker = self._container_marker(container)
+        if marker:
+            marker.unlink(missing_ok=True)
+    
+    def _container_missing(self, error):
+        # A marker can outlive its container, e.g. one deleted by hand; the
+        # first call that finds it gone drops the marker so it is checked again
+        if not isinstance(error, ResourceNotFoundError):
+            return False
+        if getattr(error, "error_code", None) != "ContainerNotFound":
+            return False
+        logger.warning(f"Container {self.settings.azure_container_name} has gone, checking it again")
+        self._forget_container(self.container)
+        return True
+    
+    def _blob_path(self, folder, filename):
+        if folder == OBJECTS_FOLDER:
+            return f"{folder}/{filename}"
+        return f"{self.prefix}{folder}/{filename}"
+    
+    def _content_settings(self, filename, immutable=False):
+        return ContentSettings(
+            content_type="application/octet-stream",
+            content_disposition=f"attachment; filename={filename}",
+            cache_control=IMMUTABLE_CACHE_CONTROL if immutable else None,
         )
-        self.container = self.blob_service.get_container_client(
-            settings.azure_container_name
+    
+    @property
+    def content_addressed(self):
+        return self.settings.storage_layout == "objects"
+    
+    def tier_blob_name(self, filename):
+        # Under the objects layout a tier entry is a pointer, not the package
+        if not self.content_addressed:
+            return filename
+        return f"{os.path.splitext(filename)[0]}.json"
+    
+    def _package_location(self, folder, filename, sha256=None):
+        if self.content_addressed and sha256:
+            return OBJECTS_FOLDER, f"{sha256.lower()}.pkg"
+        return folder, filename
+    
+    def _metadata(self, sha256, size):
+        metadata = {"size": str(size)}
+        if sha256:
+            metadata["sha256"] = sha256.lower()
+        return metadata
+    
+    def _pointer(self, folder, filename, sha256, size):
+        object_path = self._blob_path(*self._package_location(folder, filename, sha256))
+        pointer = {
+            "filename": filename,
+            "sha256": sha256.lower(),
+            "size": size,
+            "object": object_path,
+            "url": self.container.get_blob_client(object_path).url,
+        }
+        pointer_path = self._blob_path(folder, self.tier_blob_name(filename))
+        return pointer_path, json.dumps(pointer, indent=2).encode()
+    
+    def _object_references(self, records):
+        # Splits a listing into the objects, the hashes tier blobs are tagged
+        # with, and untagged pointers that have to be read to find theirs
+        objects, referenced, unread = {}, set(), []
+        for record in records:
+            if record.name.startswith(f"{OBJECTS_FOLDER}/"):
+                name = record.name[len(OBJECTS_FOLDER) + 1:]
+                if name.endswith(".pkg"):
+                    objects[name[:-len(".pkg")].lower()] = record.name
+            elif record.sha256:
+                referenced.add(record.sha256.lower())
+            elif ".json" in record.name:
+                unread.append(record.name)
+        return objects, referenced, unread
+    
+    def _unreferenced(self, objects, referenced):
+        stale = [path for sha256, path in objects.items() if sha256 not in referenced]
+        if stale:
+            logger.info(f"Removing {len(stale)} objects no pointer refers to")
+        return stale
+    
+    def _pointer_settings(self):
+        return ContentSettings(
+            content_type="application/json",
+            cache_control=POINTER_CACHE_CONTROL,
         )
-        self._ensure_container_exists()
+    
+    def _plan_promotion(self, filenames, optional, archived, staged, results):
+        ready = []
+        retired = []
+        for filename in filenames:
+            if filename in archived and not archived[filename]:
+                logger.error(f"Could not archive live {filename}")
+            elif filename in staged:
+                ready.append(filename)
+            elif filename in optional:
+                results[filename] = True
+                if filename in archived:
+                    retired.append(self._blob_path("live", filename))
+            else:
+                logger.error(f"No staged package for {filename}")
+        return ready, retired
+    
+    def _promotion_sources(self, retired, promoted, results):
+        sources = list(retired)
+        for filename, copied in promoted.items():
+            results[filename] = copied
+            if copied:
+                sources.append(self._blob_path("staged", filename))
+                logger.info(f"Promoted {filename}")
+        return sources
+    
+    def _hash_file(self, path):
+        sha_hash = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(STREAM_BLOCK_SIZE), b""):
+                sha_hash.update(chunk)
+        return sha_hash.hexdigest()
+    
+    def _block_id(self, tag, block_size, index):
+        # Azure rejects a block list whose IDs differ in length, and a blob can
+        # hold uncommitted blocks from any upload path, so every path uses this
+        return f"{tag[:BLOCK_TAG_LENGTH]:0>{BLOCK_TAG_LENGTH}}-{block_size:010d}-{index:06d}"
+    
+    def _block_plan(self, sha256, size):
+        # IDs depend on the content and block size, so blocks left uncommitted by
+        # an interrupted run of the same upload can be recognised and kept
+        block_size = self.settings.upload_block_size
+        return [
+            (self._block_id(sha256, block_size, index), offset, min(block_size, size - offset))
+            for index, offset in enumerate(range(0, size, block_size))
+        ] or [(self._block_id(sha256, block_size, 0), 0, 0)]
+
+
+class AzureStorageClient(StorageLayout):
+    def __init__(self, settings, container=None, telemetry=None):
+        super().__init__(settings, telemetry)
+        self.blob_service = None
+        if container is None:
+            self.blob_service = BlobServiceClient.from_connection_string(
+                settings.azure_storage_connection_string
+            )
+            container = self.blob_service.get_container_client(settings.azure_container_name)
+        self._container = container
+        self._inventory = None
+        # Shared with channel views, so the container is only checked once
+        self._ready = {}
+    
+    @property
+    def container(self):
+        # Nothing reaches Azure until a call actually needs the container
+        if "container" not in self._ready:
+            self._ensure_container_exists()
+            self._ready["container"] = True
+        return self._container
+    
+    @container.setter
+    def container(self, container):
+        self._container = container
+    
+    @property
+    def inventory(self):
+        if self._inventory is None:
+            self._inventory = BlobInventory(
+                self.container, TIERS + (OBJECTS_FOLDER, CHANNELS_FOLDER),
+                recover=self._recover_container,
+            )
+        return self._inventory
+    
+    def refresh(self):
+        # Drops the cached listing, so a client kept across runs sees blobs
+        # changed by anyone else in between
+        self._inventory = None
+    
+    def for_channel(self, channel):
+        # Every channel view answers from the same listing
+        inventory = self.inventory
+        view = super().for_channel(channel)
+        view._inventory = inventory
+        return view
     
     def _ensure_container_exists(self):
-        try:
-            self.container.create_container(public_access="blob")
-            logger.info(f"Created container: {self.settings.azure_container_name}")
-        except ResourceExistsError:
-            pass
+        # A marker under CACHE_DIR records that an earlier run found the
+        # container, so most starts skip the probe; otherwise it is a read,
+        # and only a missing container gets a create
+        if self._container_known(self._container):
+            return
+        if not self._container.exists():
+            try:
+                self._container.create_container(public_access="blob")
+                logger.info(f"Created container: {self.settings.azure_container_name}")
+            except ResourceExistsError:
+                pass
+        self._remember_container(self._container)
     
-    def _blob_path(self, folder, filename):
-        return f"{folder}/{filename}"
+    def _recover_container(self, error):
+        if not self._container_missing(error):
+            return False
+        self._ensure_container_exists()
+        return True
     
-    def upload_package(self, local_path, folder, filename, overwrite=True):
+    def _reuse_identical(self, folder, filename, sha256, size=None):
+        # Azure may already hold these bytes: left over from a run whose manifest
+        # save failed, or an unchanged package republished under a new version
+        if not sha256:
+            return False
         blob_path = self._blob_path(folder, filename)
+        
+        if not self.inventory.tracks(blob_path):
+            # Without a listing, one properties request still covers the destination
+            return self._holds(blob_path, sha256, size)
+        
+        matches = self.inventory.find(sha256, size)
+        if any(record.name == blob_path for record in matches):
+            logger.info(f"{blob_path} already holds {sha256}, skipping upload")
+            return True
+        if not matches:
+            return False
+        
+        logger.info(f"Copying identical {matches[0].name} to {blob_path} instead of uploading")
+        return self._copy(matches[0].name, blob_path)
+    
+    def _holds(self, blob_path, sha256, size=None):
         try:
-            blob_client = self.container.get_blob_client(blob_path)
-            content_settings = ContentSettings(
-                content_type="application/octet-stream",
-                content_disposition=f"attachment; filename={filename}",
-            )
-            with open(local_path, "rb") as data:
-                blob_client.upload_blob(
-                    data, 
-                    overwrite=overwrite, 
-                    content_settings=content_settings
-                )
-            logger.info(f"Uploaded {local_path} to {blob_path}")
+            properties = self.container.get_blob_client(blob_path).get_blob_properties()
+        except ResourceNotFoundError:
+            return False
+        except Exception as e:
+            logger.debug(f"Could not read properties of {blob_path}: {e}")
+            return False
+        
+        metadata = properties.metadata or {}
+        if metadata.get("sha256") != sha256.lower():
+            return False
+        if size and properties.size != size:
+            return False
+        logger.info(f"{blob_path} already holds {sha256}, skipping upload")
+        return True
+    
+    def _publish(self, folder, filename, sha256, size):
+        if not self.content_addressed:
             return True
+        
+        pointer_path, pointer = self._pointer(folder, filename, sha256, size)
+        try:
+            self.container.get_blob_client(pointer_path).upload_blob(
+                pointer, overwrite=True, content_settings=self._pointer_settings(),
+                # Tagged like a package, so the listing knows what it points at
+                metadata={"sha256": sha256.lower()},
+            )
+        except Exception as e:
+            logger.error(f"Could not write pointer {pointer_path}: {e}")
+            return False
+        
+        self.inventory.record(pointer_path, sha256=sha256.lower())
+        logger.info(f"Pointed {pointer_path} at {sha256}")
+        return True
+    
+    def stage_identical(self, folder, filename, sha256, size=None):
+        # Places bytes Azure already holds, such as another channel's copy of
+        # the same build, without sending them again
+        target_folder, target_name = self._package_location(folder, filename, sha256)
+        if not self._reuse_identical(target_folder, target_name, sha256, size):
+            return False
+        return self._publish(folder, filename, sha256, size)
+    
+    def upload_package(self, local_path, folder, filename, overwrite=True, sha256=None):
+        try:
+            size = os.path.getsize(local_path)
+            sha256 = sha256 or self._hash_file(local_path)
+            
+            target_folder, target_name = self._package_location(folder, filename, sha256)
+            blob_path = self._blob_path(target_folder, target_name)
+            
+            if not self._reuse_identical(target_folder, target_name, sha256, size):
+                if not overwrite and self.blob_exists(target_folder, target_name):
+                    logger.error(f"{blob_path} already exists")
+                    return False
+                with self.telemetry.span("upload"):
+                    self._upload_blocks(
+                        local_path, blob_path, sha256, size,
+                        self._content_settings(filename, immutable=target_folder == OBJECTS_FOLDER),
+                    )
+                self.inventory.record(blob_path, size, sha256)
+                logger.info(f"Uploaded {local_path} to {blob_path}")
+            
+            return self._publish(folder, filename, sha256, size)
         except FileNotFoundError:
             logger.error(f"Local file not found: {local_path}")
             return False
@@ -52,39 +379,401 @@ class AzureStorageClient:
             logger.error(f"Upload failed for {local_path}: {e}")
             return False
     
-    def copy_blob(self, source_folder, source_filename, dest_folder, dest_filename=None):
-        dest_filename = dest_filename or source_filename
-        source_path = self._blob_path(source_folder, source_filename)
-        dest_path = self._blob_path(dest_folder, dest_filename)
+    def _upload_blocks(self, local_path, blob_path, sha256, size, content_settings):
+        blob_client = self.container.get_blob_client(blob_path)
+        blocks = self._block_plan(sha256, size)
+        uploaded = self._uncommitted_blocks(blob_client)
+        missing = [block for block in blocks if uploaded.get(block[0]) != block[2]]
+        self.telemetry.add_bytes("upload", sum(length for _, _, length in missing))
+        if len(missing) < len(blocks):
+            logger.info(
+                f"Resuming {blob_path}: {len(blocks) - len(missing)} of "
+                f"{len(blocks)} blocks already uploaded"
+            )
+        
+        def put_block(block):
+            block_id, offset, length = block
+            with open(local_path, "rb") as f:
+                f.seek(offset)
+                data = f.read(length)
+            # validate_content sends a per-request MD5 the service checks on receipt
+            blob_client.stage_block(block_id, data, validate_content=True)
+        
+        # Let every block finish even if one fails, so a retry has less to send
+        with ThreadPoolExecutor(max_workers=self.settings.upload_concurrency) as pool:
+            futures = [pool.submit(put_block, block) for block in missing]
+            for future in futures:
+                future.result()
         
+        blob_client.commit_block_list(
+            [block_id for block_id, _, _ in blocks],
+            content_settings=content_settings,
+            metadata=self._metadata(sha256, size),
+        )
+        logger.info(f"Uploaded {len(missing)} blocks to {blob_path}")
+    
+    def _uncommitted_blocks(self, blob_client):
+        try:
+            _, uncommitted = blob_client.get_block_list("uncommitted")
+        except ResourceNotFoundError:
+            return {}
+        except Exception as e:
+            logger.debug(f"Could not list uncommitted blocks: {e}")
+            return {}
+        return {block.id: block.size for block in uncommitted or []}
+    
+    def stage_stream(self, chunks, folder, filename, expected_sha=None):
+        # Blocks stay uncommitted (and invisible) until commit_staged, so a
+        # bad download never replaces the existing blob
+        target_folder, target_name = self._package_location(folder, filename, expected_sha)
+        blob_path = self._blob_path(target_folder, target_name)
+        if self._reuse_identical(target_folder, target_name, expected_sha):
+            # The chunks are never iterated, so the CDN request is never made
+            size = self.inventory.size(blob_path)
+            return StagedBlob(blob_path, filename, [], expected_sha.lower(), size, folder, True)
+        
+        try:
+            blob_client = self.container.get_blob_client(blob_path)
+            tag = expected_sha or "stream"
+            sha_hash = hashlib.sha256()
+            block_ids = []
+            buffer = bytearray()
+            size = 0
+            
+            # Reading the CDN and writing blocks interleave, so they share one span
+            with self.telemetry.span("stream"):
+                for chunk in chunks:
+                    sha_hash.update(chunk)
+                    size += len(chunk)
+                    buffer.extend(chunk)
+                    while len(buffer) >= STREAM_BLOCK_SIZE:
+                        self._stage_block(
+                            blob_client, block_ids, tag, bytes(buffer[:STREAM_BLOCK_SIZE])
+                        )
+                        del buffer[:STREAM_BLOCK_SIZE]
+                
+                if buffer:
+                    self._stage_block(blob_client, block_ids, tag, bytes(buffer))
+            self.telemetry.add_bytes("stream", size)
+            
+            computed = sha_hash.hexdigest()
+            logger.info(f"Staged {len(block_ids)} blocks for {blob_path}, SHA256: {computed}")
+            return StagedBlob(blob_path, filename, block_ids, computed, size, folder)
+        except Exception as e:
+            logger.error(f"Streamed upload failed for {blob_path}: {e}")
+            return None
+    
+    def _stage_block(self, blob_client, block_ids, tag, data):
+        block_id = self._block_id(tag, STREAM_BLOCK_SIZE, len(block_ids))
+        blob_client.stage_block(block_id, data)
+        block_ids.append(block_id)
+    
+    def commit_staged(self, staged, expected_sha):
+        if not expected_sha or staged.sha256.lower() != expected_sha.lower():
+            logger.error(
+                f"Hash mismatch for {staged.blob_path}: expected {expected_sha}, "
+                f"got {staged.sha256}; leaving blocks uncommitted"
+            )
+            return False
+        
+        if staged.stored:
+            return self._publish(staged.folder, staged.filename, staged.sha256, staged.size)
+        
+        object_folder, object_name = self._package_location(
+            staged.folder, staged.filename, staged.sha256
+        )
+        immutable = staged.blob_path == self._blob_path(object_folder, object_name)
+        try:
+            blob_client = self.container.get_blob_client(staged.blob_path)
+            blob_client.commit_block_list(
+                staged.block_ids,
+                content_settings=self._content_settings(staged.filename, immutable),
+                metadata=self._metadata(staged.sha256, staged.size),
+            )
+            self.inventory.record(staged.blob_path, staged.size, staged.sha256)
+            logger.info(f"Committed {staged.blob_path} ({staged.size} bytes)")
+        except Exception as e:
+            logger.error(f"Commit failed for {staged.blob_path}: {e}")
+            return False
+        
+        if self.content_addressed and not immutable:
+            # The hash wasn't known up front, so the blocks landed under the
+            # tier name; move them to their object once
+            moved = (
+                self._reuse_identical(object_folder, object_name, staged.sha256, staged.size)
+                or self._copy(staged.blob_path, self._blob_path(object_folder, object_name))
+            )
+            if not moved:
+                return False
+            self._delete(staged.blob_path)
+        
+        return self._publish(staged.folder, staged.filename, staged.sha256, staged.size)
+    
+    def stage_from_url(self, source_url, folder, filename, expected_sha, size,
+                       read_source=None):
+        # Azure pulls each block from the CDN itself; nothing passes through
+        # this machine except the verification read
+        tier_folder, tier_name = folder, filename
+        folder, filename = self._package_location(folder, filename, expected_sha)
+        blob_path = self._blob_path(folder, filename)
+        if self._reuse_identical(folder, filename, expected_sha, size):
+            return self._publish(tier_folder, tier_name, expected_sha, size)
+        
+        # The blocks land beside the destination and only move over it once
+        # verified, so a bad copy never replaces what is already staged
+        copy_name = f"{filename}.copying"
+        copy_path = self._blob_path(folder, copy_name)
+        try:
+            copied = self._copy_from_url(
+                source_url, folder, copy_name, tier_name, expected_sha, size, read_source
+            )
+            if not copied or not self._copy(copy_path, blob_path):
+                return False
+        finally:
+            self._delete(copy_path)
+        return self._publish(tier_folder, tier_name, expected_sha, size)
+    
+    def _copy_from_url(self, source_url, folder, filename, tier_name, expected_sha, size,
+                       read_source):
+        blob_path = self._blob_path(folder, filename)
+        try:
+            blob_client = self.container.get_blob_client(blob_path)
+            ranges = [
+                (
+                    self._block_id(expected_sha or "copy", COPY_BLOCK_SIZE, index),
+                    offset, min(COPY_BLOCK_SIZE, size - offset),
+                )
+                for index, offset in enumerate(range(0, size, COPY_BLOCK_SIZE))
+            ]
+            
+            def put_block(block):
+                block_id, offset, length = block
+                blob_client.stage_block_from_url(
+                    block_id, source_url, source_offset=offset, source_length=length
+                )
+            
+            with self.telemetry.span("server-copy"), ThreadPoolExecutor(
+                max_workers=COPY_CONCURRENCY
+            ) as pool:
+                list(pool.map(put_block, ranges))
+            self.telemetry.add_bytes("server-copy", size)
+            
+            blob_client.commit_block_list(
+                [block_id for block_id, _, _ in ranges],
+                content_settings=self._content_settings(
+                    tier_name, immutable=folder == OBJECTS_FOLDER
+                ),
+            )
+            self.inventory.record(blob_path, size)
+            logger.info(f"Copied {source_url} to {blob_path} server-side")
+        except Exception as e:
+            logger.error(f"Server-side copy failed for {blob_path}: {e}")
+            return False
+        
+        if self.settings.server_copy_verify == "sample" and read_source:
+            verified = self.verify_blob_samples(folder, filename, size, read_source)
+        else:
+            verified = self.verify_blob_hash(folder, filename, expected_sha)
+        if not verified:
+            return False
+        
+        # Tag only once verified, since later runs trust the tag without
+        # re-reading; the move into place carries it along
+        try:
+            blob_client.set_blob_metadata(self._metadata(expected_sha, size))
+            self.inventory.record(blob_path, size, expected_sha)
+        except Exception as e:
+            logger.warning(f"Could not tag {blob_path} with its hash: {e}")
+        return True
+    
+    def verify_blob_hash(self, folder, filename, expected_sha):
+        blob_path = self._blob_path(folder, filename)
+        try:
+            blob_client = self.container.get_blob_client(blob_path)
+            sha_hash = hashlib.sha256()
+            for chunk in blob_client.download_blob().chunks():
+                sha_hash.update(chunk)
+        except Exception as e:
+            logger.error(f"Verification read failed for {blob_path}: {e}")
+            return False
+        
+        computed = sha_hash.hexdigest()
+        if computed.lower() != expected_sha.lower():
+            logger.error(f"Hash mismatch for {blob_path}: expected {expected_sha}, got {computed}")
+            return False
+        return True
+    
+    def verify_blob_samples(self, folder, filename, size, read_source):
+        blob_path = self._blob_path(folder, filename)
+        samples = self.settings.server_copy_samples
+        length = min(SAMPLE_SIZE, size)
+        
+        # Always check both ends, plus repeatable pseudo-random offsets between
+        rng = random.Random(f"{blob_path}:{size}")
+        offsets = {0, size - length}
+        while len(offsets) < min(samples, size - length + 1):
+            offsets.add(rng.randrange(0, size - length + 1))
+        
+        try:
+            blob_client = self.container.get_blob_client(blob_path)
+            if blob_client.get_blob_properties().size != size:
+                logger.error(f"Size mismatch for {blob_path}")
+                return False
+            
+            for offset in sorted(offsets):
+                copied = blob_client.download_blob(offset=offset, length=length).readall()
+                if copied != read_source(offset, length):
+                    logger.error(f"Sample at offset {offset} differs for {blob_path}")
+                    return False
+        except Exception as e:
+            logger.error(f"Sampled verification failed for {blob_path}: {e}")
+            return False
+        
+        logger.info(f"Verified {len(offsets)} samples of {blob_path}")
+        return True
+    
+    def start_copy(self, source_folder, source_filename, dest_folder, dest_filename=None):
+        return self._start_copy(
+            self._blob_path(source_folder, source_filename),
+            self._blob_path(dest_folder, dest_filename or source_filename),
+        )
+    
+    def _start_copy(self, source_path, dest_path):
         try:
             source_client = self.container.get_blob_client(source_path)
             dest_client = self.container.get_blob_client(dest_path)
-            dest_client.start_copy_from_url(source_client.url)
-            logger.info(f"Copied {source_path} to {dest_path}")
-            return True
+            copy = dest_client.start_copy_from_url(source_client.url) or {}
+            self.inventory.copy(source_path, dest_path)
+            logger.info(f"Started copy of {source_path} to {dest_path}")
+            return copy.get("copy_status") or "pending"
         except ResourceNotFoundError:
             logger.error(f"Source blob not found: {source_path}")
-            return False
+            return None
         except Exception as e:
             logger.error(f"Copy failed: {e}")
+            return None
+    
+    def wait_for_copies(self, blob_paths):
+        # Poll the whole batch on one backoff schedule rather than one copy at a time
+        results = {}
+        pending = set(blob_paths)
+        delay = COPY_POLL_INTERVAL
+        deadline = time.monotonic() + COPY_TIMEOUT
+        while pending:
+            for blob_path in sorted(pending):
+                status = self._copy_status(blob_path)
+                if status == "pending":
+                    continue
+                pending.discard(blob_path)
+                results[blob_path] = status == "success"
+                if not results[blob_path]:
+                    logger.error(f"Copy to {blob_path} ended with status {status}")
+            
+            if not pending:
+                break
+            if time.monotonic() >= deadline:
+                for blob_path in pending:
+                    logger.error(f"Copy to {blob_path} did not finish in {COPY_TIMEOUT}s")
+                    results[blob_path] = False
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, COPY_POLL_MAX_INTERVAL)
+        return results
+    
+    def _copy_status(self, blob_path):
+        try:
+            properties = self.container.get_blob_client(blob_path).get_blob_properties()
+        except Exception as e:
+            logger.error(f"Could not read copy status of {blob_path}: {e}")
+            return "failed"
+        copy = getattr(properties, "copy", None)
+        return getattr(copy, "status", None) or "success"
+    
+    def copy_blob(self, source_folder, source_filename, dest_folder, dest_filename=None):
+        return self._copy(
+            self._blob_path(source_folder, source_filename),
+            self._blob_path(dest_folder, dest_filename or source_filename),
+        )
+    
+    def _copy(self, source_path, dest_path):
+        status = self._start_copy(source_path, dest_path)
+        if status is None:
+            return False
+        if status != "success" and not self.wait_for_copies([dest_path])[dest_path]:
             return False
+        
+        logger.info(f"Copied {source_path} to {dest_path}")
+        return True
+    
+    def copy_blobs(self, source_folder, dest_folder, filenames):
+        results = {}
+        with ThreadPoolExecutor(max_workers=COPY_CONCURRENCY) as pool:
+            statuses = dict(zip(filenames, pool.map(
+                lambda filename: self.start_copy(source_folder, filename, dest_folder),
+                filenames,
+            )))
+        
+        pending = {}
+        for filename, status in statuses.items():
+            if status == "pending":
+                pending[self._blob_path(dest_folder, filename)] = filename
+            else:
+                results[filename] = status == "success"
+        
+        for blob_path, copied in self.wait_for_copies(pending).items():
+            results[pending[blob_path]] = copied
+        return results
     
     def delete_blob(self, folder, filename):
-        blob_path = self._blob_path(folder, filename)
+        return self._delete(self._blob_path(folder, filename))
+    
+    def _delete(self, blob_path):
+        if self.inventory.tracks(blob_path) and not self.inventory.exists(blob_path):
+            return True
+        
         try:
             blob_client = self.container.get_blob_client(blob_path)
             blob_client.delete_blob()
+            self.inventory.remove(blob_path)
             logger.info(f"Deleted {blob_path}")
             return True
         except ResourceNotFoundError:
+            self.inventory.remove(blob_path)
             return True
         except Exception as e:
             logger.error(f"Delete failed for {blob_path}: {e}")
             return False
     
+    def delete_blobs(self, blob_paths):
+        blob_paths = [
+            path for path in blob_paths
+            if not self.inventory.tracks(path) or self.inventory.exists(path)
+        ]
+        
+        deleted = True
+        for start in range(0, len(blob_paths), BATCH_SIZE):
+            batch = blob_paths[start:start + BATCH_SIZE]
+            try:
+                responses = self.container.delete_blobs(*batch, raise_on_any_failure=False)
+            except Exception as e:
+                logger.error(f"Batch delete failed: {e}")
+                deleted = False
+                continue
+            
+            for blob_path, response in zip(batch, responses):
+                if response.status_code in (202, 404):
+                    self.inventory.remove(blob_path)
+                    logger.info(f"Deleted {blob_path}")
+                else:
+                    logger.error(f"Delete failed for {blob_path}: {response.status_code}")
+                    deleted = False
+        return deleted
+    
     def blob_exists(self, folder, filename):
         blob_path = self._blob_path(folder, filename)
+        if self.inventory.tracks(blob_path):
+            return self.inventory.exists(blob_path)
+        
         try:
             blob_client = self.container.get_blob_client(blob_path)
             return blob_client.exists()
@@ -96,31 +785,66 @@ class AzureStorageClient:
         blob_client = self.container.get_blob_client(blob_path)
         return blob_client.url
     
-    def promote_package(self, filename):
-        logger.info(f"Promoting {filename}")
+    def promote_package(self, filename, required=True):
+        optional = () if required else (filename,)
+        return self.promote_packages([filename], optional)[filename]
+    
+    def promote_packages(self, filenames, optional=()):
+        with self.telemetry.span("promote"):
+            return self._promote_packages(filenames, optional)
+    
+    def _promote_packages(self, filenames, optional):
+        if self.content_addressed:
+            # Tiers only hold pointers, so promotion copies a few hundred bytes
+            # per app whatever the package size
+            names = {filename: self.tier_blob_name(filename) for filename in filenames}
+            results = self._promote_blobs(
+                list(names.values()), {names[filename] for filename in optional}
+            )
+            return {filename: results[names[filename]] for filename in filenames}
+        return self._promote_blobs(filenames, optional)
+    
+    def _promote_blobs(self, filenames, optional=()):
+        logger.info(f"Promoting {', '.join(filenames)}")
+        results = dict.fromkeys(filenames, False)
         
-        # Archive current live version
-        if self.blob_exists("live", filename):
-            if self.blob_exists("previous", filename):
-                self.delete_blob("previous", filename)
-            if not self.copy_blob("live", filename, "previous", filename):
-                return False
-            self.delete_blob("live", filename)
+        # Archive live first, and only for names that will change: a required
+        # app with nothing staged keeps the previous/ copy its manifest records
+        staged = {f for f in filenames if self.blob_exists("staged", f)}
+        changing = [f for f in filenames if f in staged or f in optional]
+        live = [f for f in changing if self.blob_exists("live", f)]
+        archived = self.copy_blobs("live", "previous", live)
         
-        # Check staged exists
-        if not self.blob_exists("staged", filename):
-            logger.error(f"No staged package for {filename}")
-            return False
+        ready, retired = self._plan_promotion(filenames, optional, archived, staged, results)
         
-        # Promote staged to live
-        if not self.copy_blob("staged", filename, "live", filename):
-            return False
+        promoted = self.copy_blobs("staged", "live", ready)
+        sources = self._promotion_sources(retired, promoted, results)
         
-        self.delete_blob("staged", filename)
-        logger.info(f"Promoted {filename}")
-        return True
+        # Sources go only once every copy in the batch has landed
+        if sources:
+            self.delete_blobs(sources)
+        return results
+    
+    def remove_unreferenced_objects(self):
+        # Objects are shared by every channel, so one only goes once no pointer
+        # in any tier of any channel still names it
+        if not self.content_addressed or not self.inventory.tracks(f"{OBJECTS_FOLDER}/"):
+            return True
+        
+        objects, referenced, unread = self._object_references(self.inventory.records())
+        for name in unread:
+            try:
+                pointer = json.loads(self.container.get_blob_client(name).download_blob().readall())
+                referenced.add(pointer["sha256"].lower())
+            except Exception as e:
+                logger.warning(f"Could not read pointer {name}, keeping every object: {e}")
+                return False
+        
+        stale = self._unreferenced(objects, referenced)
+        return self.delete_blobs(stale) if stale else True
     
     def rollback_package(self, filename):
+        filename = self.tier_blob_name(filename)
         logger.info(f"Rolling back {filename}")
         
         if not self.blob_exists("previous", filename):
@@ -0,0 +1,132 @@
+import logging
+import threading
+from dataclasses import dataclass, replace
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("staged", "live", "previous")
+
+
+@dataclass
+class BlobRecord:
+    name: str
+    size: int = None
+    sha256: str = None
+    etag: str = None
+
+
+# One listing of the tier prefixes answers every exists/size/hash question for
+# the run. Operations update the snapshot as they complete, so it stays
+# accurate without going back to the service.
+class BlobInventory:
+    def __init__(self, container, prefixes=TIERS, recover=None):
+        self.container = container
+        self.recover = recover
+        self.prefixes = tuple(f"{prefix}/" for prefix in prefixes)
+        self._lock = threading.Lock()
+        self._blobs = None
+        self._failed = False
+    
+    def tracks(self, blob_path):
+        return blob_path.startswith(self.prefixes) and self._ensure_loaded()
+    
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._blobs is None and not self._failed:
+                try:
+                    self._blobs = self._list()
+                except Exception as e:
+                    # Callers fall back to asking the service blob by blob
+                    logger.warning(f"Blob listing failed, checking blobs individually: {e}")
+                    self._failed = True
+            return self._blobs is not None
+    
+    def _list(self):
+        try:
+            return self._snapshot(self.container.list_blobs(include=["metadata"]))
+        except Exception as e:
+            # recover gets one chance to put things right, e.g. recreate the container
+            if not (self.recover and self.recover(e)):
+                raise
+        return self._snapshot(self.container.list_blobs(include=["metadata"]))
+    
+    def populate(self, listing):
+        # For callers that list the container themselves, such as the async client
+        blobs = self._snapshot(listing)
+        with self._lock:
+            self._blobs = blobs
+    
+    def disable(self):
+        with self._lock:
+            self._blobs = None
+            self._failed = True
+    
+    @property
+    def loaded(self):
+        with self._lock:
+            return self._blobs is not None or self._failed
+    
+    def _snapshot(self, listing):
+        blobs = {}
+        for blob in listing:
+            if not blob.name.startswith(self.prefixes):
+                continue
+            metadata = blob.metadata or {}
+            blobs[blob.name] = BlobRecord(
+                name=blob.name,
+                size=blob.size,
+                sha256=metadata.get("sha256"),
+                etag=blob.etag,
+            )
+        logger.info(f"Inventoried {len(blobs)} blobs")
+        return blobs
+    
+    def get(self, blob_path):
+        with self._lock:
+            return (self._blobs or {}).get(blob_path)
+    
+    def exists(self, blob_path):
+        return self.get(blob_path) is not None
+    
+    def size(self, blob_path):
+        record = self.get(blob_path)
+        return record.size if record else None
+    
+    def sha256(self, blob_path):
+        record = self.get(blob_path)
+        return record.sha256 if record else None
+    
+    def records(self):
+        with self._lock:
+            return list((self._blobs or {}).values())
+    
+    def find(self, sha256, size=None):
+        with self._lock:
+            records = list((self._blobs or {}).values())
+        return [
+            record for record in records
+            if record.sha256 and record.sha256.lower() == sha256.lower()
+            and (not size or not record.size or record.size == size)
+        ]
+    
+    def record(self, blob_path, size=None, sha256=None):
+        with self._lock:
+            if self._blobs is not None:
+                self._blobs[blob_path] = BlobRecord(blob_path, size, sha256)
+    
+    def copy(self, source_path, dest_path):
+        with self._lock:
+            if self._blobs is None:
+                return
+            source = self._blobs.get(source_path) or BlobRecord(source_path)
+            self._blobs[dest_path] = replace(source, name=dest_path, etag=None)
+    
+    def remove(self, blob_path):
+        with self._lock:
+            if self._blobs is not None:
+                self._blobs.pop(blob_path, None)
+    
+    def invalidate(self):
+        with self._lock:
+            self._blobs = None
+            self._failed = False
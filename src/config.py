@@ -1,6 +1,9 @@
 import os
+import re
 from dataclasses import dataclass
 
+DEFAULT_LOCALE = "0409"
+
 
 @dataclass
 class AppConfig:
@@ -9,7 +12,17 @@ class AppConfig:
     fwlink: str
     bundle_id: str
     blob_name: str
+    locale: str = DEFAULT_LOCALE
+    channel: str = None
+
 
+STAGING_MODES = ("download", "stream", "server-copy")
+VERIFY_MODES = ("full", "sample")
+STORAGE_LAYOUTS = ("tiered", "objects")
+
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+# UTC hours in which Microsoft usually publishes Office for Mac builds
+RELEASE_WINDOWS = "tue-thu 15-23"
 
 CDN_URLS = {
     "current": "https://res.public.onecdn.static.microsoft/mro1cdnstorage/C1297A47-86C4-4C1F-97FA-950631F94777/MacAutoupdate/",
@@ -105,6 +118,43 @@ APPS = {
 }
 
 
+def locale_blob_name(blob_name, locale):
+    stem, ext = os.path.splitext(blob_name)
+    return f"{stem}-{locale}{ext}"
+
+
+def parse_release_windows(spec):
+    # "tue-thu 15-23,fri 9-12" -> [(weekdays, start hour, end hour)], in UTC
+    windows = []
+    for item in filter(None, (part.strip().lower() for part in spec.split(","))):
+        match = re.fullmatch(r"([a-z]{3})(?:-([a-z]{3}))?\s+(\d{1,2})-(\d{1,2})", item)
+        if not match or not {match.group(1), match.group(2) or match.group(1)} <= set(WEEKDAYS):
+            raise ValueError(f"Invalid release window in WATCH_RELEASE_WINDOWS: {item}")
+        first = WEEKDAYS.index(match.group(1))
+        last = WEEKDAYS.index(match.group(2) or match.group(1))
+        start, end = int(match.group(3)), int(match.group(4))
+        if not 0 <= start < end <= 24:
+            raise ValueError(f"Invalid hours in WATCH_RELEASE_WINDOWS: {item}")
+        # Day ranges may wrap past Sunday
+        days = frozenset(day % 7 for day in range(first, last + (7 if last < first else 0) + 1))
+        windows.append((days, start, end))
+    return windows
+
+
+def _int_env(name, default, minimum=0):
+    try:
+        value = int(os.environ.get(name, default))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid {name}: {e}")
+    if value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+    return value
+
+
+def _list_env(name):
+    return [item.strip() for item in os.environ.get(name, "").split(",") if item.strip()]
+
+
 class Settings:
     def __init__(self):
         conn_str = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
@@ -120,13 +170,95 @@ class Settings:
             raise ValueError(f"UPDATE_CHANNEL must be one of: {valid}")
         self.channel = channel
         
+        # Further channels and locales checked in the same run; UPDATE_CHANNEL
+        # stays the primary and keeps the root tiers
+        self.channels = [channel]
+        for extra in _list_env("UPDATE_CHANNELS"):
+            if extra not in CDN_URLS:
+                valid = ", ".join(CDN_URLS.keys())
+                raise ValueError(f"UPDATE_CHANNELS entries must be one of: {valid}")
+            if extra not in self.channels:
+                self.channels.append(extra)
+        
+        self.locales = _list_env("UPDATE_LOCALES") or [DEFAULT_LOCALE]
+        for locale in self.locales:
+            if not re.fullmatch(r"[0-9A-Fa-f]{4}", locale):
+                raise ValueError(f"Invalid locale in UPDATE_LOCALES: {locale}")
+        
         try:
             self.lag_days = int(os.environ.get("LAG_DAYS", "14"))
             if self.lag_days < 0:
                 raise ValueError("LAG_DAYS cannot be negative")
         except (ValueError, TypeError) as e:
             raise ValueError(f"Invalid LAG_DAYS: {e}")
+        
+        # Separate limits so a wide CDN fan-out can't swamp the storage account
+        self.cdn_concurrency = _int_env("CDN_CONCURRENCY", "4", minimum=1)
+        self.azure_concurrency = _int_env("AZURE_CONCURRENCY", "2", minimum=1)
+        
+        staging_mode = os.environ.get("STAGING_MODE", "download")
+        if staging_mode not in STAGING_MODES:
+            valid = ", ".join(STAGING_MODES)
+            raise ValueError(f"STAGING_MODE must be one of: {valid}")
+        self.staging_mode = staging_mode
+        
+        # How server-side copies are checked against the CDN-published hash
+        verify_mode = os.environ.get("SERVER_COPY_VERIFY", "full")
+        if verify_mode not in VERIFY_MODES:
+            valid = ", ".join(VERIFY_MODES)
+            raise ValueError(f"SERVER_COPY_VERIFY must be one of: {valid}")
+        self.server_copy_verify = verify_mode
+        self.server_copy_samples = _int_env("SERVER_COPY_SAMPLES", "8", minimum=1)
+        
+        # objects stores each package once by hash; tiers then hold small pointers
+        layout = os.environ.get("STORAGE_LAYOUT", "tiered")
+        if layout not in STORAGE_LAYOUTS:
+            valid = ", ".join(STORAGE_LAYOUTS)
+            raise ValueError(f"STORAGE_LAYOUT must be one of: {valid}")
+        self.storage_layout = layout
+        
+        # Empty CACHE_DIR turns the on-disk caches off
+        self.cache_dir = os.environ.get("CACHE_DIR", ".cache")
+        self.manifest_cache_ttl = _int_env("MANIFEST_CACHE_TTL", "0")
+        self.manifest_cache_max_bytes = _int_env("MANIFEST_CACHE_MAX_KB", "1024") * 1024
+        
+        # Content-addressed package cache under CACHE_DIR/packages; 0 disables it
+        self.package_cache_max_bytes = _int_env("PACKAGE_CACHE_MAX_MB", "0") * 1024 * 1024
+        
+        # Large packages are fetched as parallel byte ranges and resumed after a drop
+        self.download_segments = _int_env("DOWNLOAD_SEGMENTS", "4", minimum=1)
+        self.download_segment_min_bytes = _int_env("DOWNLOAD_SEGMENT_MIN_MB", "32", minimum=1) * 1024 * 1024
+        self.download_retries = _int_env("DOWNLOAD_RETRIES", "3")
+        
+        # Uploads go up as parallel blocks that a later run can resume
+        self.upload_block_size = _int_env("UPLOAD_BLOCK_SIZE_MB", "8", minimum=1) * 1024 * 1024
+        self.upload_concurrency = _int_env("UPLOAD_CONCURRENCY", "4", minimum=1)
+        
+        # Packages allowed on disk at once when downloads and uploads overlap
+        self.pipeline_depth = _int_env("PIPELINE_DEPTH", "2", minimum=1)
+        self.pipeline_max_bytes = _int_env("PIPELINE_MAX_MB", "0") * 1024 * 1024
+        
+        # Prometheus textfile for node_exporter; empty turns metrics off
+        self.metrics_textfile = os.environ.get("METRICS_TEXTFILE", "")
+        
+        # check_updates.py --watch polls every WATCH_MIN_INTERVAL minutes in a
+        # release window and backs off towards WATCH_MAX_INTERVAL outside one
+        self.watch_min_interval = _int_env("WATCH_MIN_INTERVAL", "5", minimum=1) * 60
+        self.watch_max_interval = _int_env("WATCH_MAX_INTERVAL", "240", minimum=1) * 60
+        if self.watch_max_interval < self.watch_min_interval:
+            raise ValueError("WATCH_MAX_INTERVAL cannot be below WATCH_MIN_INTERVAL")
+        self.release_windows = parse_release_windows(
+            os.environ.get("WATCH_RELEASE_WINDOWS", RELEASE_WINDOWS)
+        )
     
     @property
     def cdn_base_url(self):
         return CDN_URLS[self.channel]
+    
+    def app_label(self, channel, app_key):
+        # Apps on the primary channel keep their bare keys
+        return app_key if channel == self.channel else f"{channel}/{app_key}"
+    
+    def parse_label(self, label):
+        channel, _, app_key = label.rpartition("/")
+        return channel or self.channel, app_key
@@ -0,0 +1,229 @@
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+import requests
+
+from src.telemetry import Telemetry
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+PROGRESS_INTERVAL = 16 * 1024 * 1024
+REQUEST_TIMEOUT = 30
+DOWNLOAD_TIMEOUT = 600
+
+
+def progress_path(dest):
+    dest = Path(dest)
+    return dest.with_name(f"{dest.name}.part.json")
+
+
+@dataclass
+class Probe:
+    size: int = None
+    etag: str = None
+    ranged: bool = False
+
+
+# An IOError, so callers that handle a failed transfer handle these too
+class SegmentError(IOError):
+    pass
+
+
+class SourceChangedError(SegmentError):
+    pass
+
+
+class SegmentedDownloader:
+    def __init__(self, session, segments=4, min_segment_size=32 * 1024 * 1024, retries=3,
+                 telemetry=None):
+        self.session = session
+        self.segments = max(1, segments)
+        self.min_segment_size = min_segment_size
+        self.retries = retries
+        self.telemetry = telemetry or Telemetry()
+    
+    def download(self, url, dest, size_hint=None, probe=None):
+        dest = Path(dest)
+        probe = probe or self.probe(url, size_hint)
+        size, etag = probe.size, probe.etag
+        
+        if not probe.ranged or not size or size < self.min_segment_size * 2 or self.segments == 1:
+            logger.debug(f"Single-stream download for {url}")
+            return self._download_stream(url, dest)
+        
+        progress = self._load_progress(dest, url, size, etag)
+        if progress:
+            done = sum(seg[2] - seg[0] for seg in progress["segments"])
+            logger.info(f"Resuming {url} at {done}/{size} bytes")
+        else:
+            progress = self._start(dest, url, size, etag)
+        
+        lock = threading.Lock()
+        pending = [seg for seg in progress["segments"] if seg[2] <= seg[1]]
+        with ThreadPoolExecutor(max_workers=len(pending) or 1, thread_name_prefix="segment") as pool:
+            # Segments run in the caller's context so retries are charged to its app
+            futures = [
+                pool.submit(
+                    contextvars.copy_context().run,
+                    self._fetch_segment, url, dest, etag, seg, progress, lock,
+                )
+                for seg in pending
+            ]
+            for future in futures:
+                future.result()
+        
+        with self.telemetry.span("hash"):
+            computed = self._hash_file(dest)
+        progress_path(dest).unlink(missing_ok=True)
+        return computed
+    
+    def probe(self, url, size_hint=None):
+        try:
+            response = self.session.head(url, allow_redirects=True, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.debug(f"HEAD failed for {url}, using single stream: {e}")
+            return Probe(size=size_hint)
+        
+        length = response.headers.get("Content-Length")
+        return Probe(
+            size=int(length) if length else size_hint,
+            etag=response.headers.get("ETag"),
+            ranged=response.headers.get("Accept-Ranges", "").lower() == "bytes",
+        )
+    
+    def _start(self, dest, url, size, etag):
+        count = min(self.segments, max(1, size // self.min_segment_size))
+        step = -(-size // count)
+        segments = [
+            [start, min(start + step, size) - 1, start]
+            for start in range(0, size, step)
+        ]
+        
+        # Never truncate in place: dest may be hard-linked into the package cache
+        dest.unlink(missing_ok=True)
+        with open(dest, "wb") as f:
+            # Reserve the space up front so a full disk fails now, not at 90%
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(f.fileno(), 0, size)
+            else:
+                f.truncate(size)
+        
+        progress = {"url": url, "size": size, "etag": etag, "segments": segments}
+        self._save_progress(dest, progress)
+        logger.info(f"Downloading {url} in {len(segments)} segments")
+        return progress
+    
+    def _load_progress(self, dest, url, size, etag):
+        path = progress_path(dest)
+        try:
+            with open(path) as f:
+                progress = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        
+        unchanged = (
+            progress.get("url") == url
+            and progress.get("size") == size
+            and progress.get("etag") == etag
+            and dest.exists()
+            and dest.stat().st_size == size
+        )
+        if not unchanged:
+            logger.info(f"Discarding stale partial download of {url}")
+            path.unlink(missing_ok=True)
+            return None
+        return progress
+    
+    def _save_progress(self, dest, progress):
+        path = progress_path(dest)
+        tmp = path.with_name(f"{path.name}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(progress, f)
+        os.replace(tmp, path)
+    
+    def _fetch_segment(self, url, dest, etag, segment, progress, lock):
+        attempt = 0
+        while True:
+            try:
+                self._fetch_range(url, dest, etag, segment, progress, lock)
+                return
+            except SourceChangedError:
+                progress_path(dest).unlink(missing_ok=True)
+                raise
+            except (requests.RequestException, SegmentError, OSError) as e:
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                self.telemetry.retry("download")
+                delay = 2 ** attempt
+                logger.warning(
+                    f"Segment {segment[0]}-{segment[1]} failed ({e}), "
+                    f"retrying from byte {segment[2]} in {delay}s"
+                )
+                time.sleep(delay)
+    
+    def _fetch_range(self, url, dest, etag, segment, progress, lock):
+        start, end, position = segment
+        if position > end:
+            return
+        
+        headers = {"Range": f"bytes={position}-{end}"}
+        if etag:
+            # If the file changed under us the server sends 200, not stale bytes
+            headers["If-Range"] = etag
+        
+        with self.session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise SourceChangedError(f"{url} changed during download ({response.status_code})")
+            
+            unsaved = 0
+            with open(dest, "r+b") as f:
+                f.seek(position)
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    chunk = chunk[:end + 1 - segment[2]]
+                    f.write(chunk)
+                    segment[2] += len(chunk)
+                    unsaved += len(chunk)
+                    if unsaved >= PROGRESS_INTERVAL:
+                        f.flush()
+                        with lock:
+                            self._save_progress(dest, progress)
+                        unsaved = 0
+                    if segment[2] > end:
+                        break
+        
+        with lock:
+            self._save_progress(dest, progress)
+        
+        if segment[2] <= end:
+            raise SegmentError(f"Connection closed at byte {segment[2]} of {end}")
+    
+    def _download_stream(self, url, dest):
+        sha_hash = hashlib.sha256()
+        with self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            dest.unlink(missing_ok=True)
+            with open(dest, "wb") as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    sha_hash.update(chunk)
+        return sha_hash.hexdigest()
+    
+    def _hash_file(self, path):
+        sha_hash = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                sha_hash.update(chunk)
+        return sha_hash.hexdigest()
@@ -0,0 +1,102 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    etag: str = None
+    last_modified: str = None
+    fetched_at: float = 0.0
+    data: dict = field(default_factory=dict)
+    
+    def is_fresh(self, ttl):
+        return ttl > 0 and time.time() - self.fetched_at < ttl
+    
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HTTPCache:
+    def __init__(self, directory, ttl=0, max_bytes=1024 * 1024):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+    
+    def _path(self, url):
+        return self.directory / f"{hashlib.sha256(url.encode()).hexdigest()}.json"
+    
+    def get(self, url):
+        path = self._path(url)
+        try:
+            with open(path) as f:
+                entry = CacheEntry(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, TypeError, OSError) as e:
+            logger.debug(f"Ignoring unreadable cache entry for {url}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        
+        # Bump mtime so eviction drops the least recently used entries first
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return entry
+    
+    def put(self, url, data, etag=None, last_modified=None):
+        entry = CacheEntry(
+            url=url,
+            etag=etag,
+            last_modified=last_modified,
+            fetched_at=time.time(),
+            data=data,
+        )
+        self._write(entry)
+        self._evict()
+        return entry
+    
+    def refresh(self, entry):
+        entry.fetched_at = time.time()
+        self._write(entry)
+    
+    def _write(self, entry):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(asdict(entry), f)
+            os.replace(tmp, self._path(entry.url))
+        except OSError as e:
+            logger.debug(f"Could not write cache entry for {entry.url}: {e}")
+            Path(tmp).unlink(missing_ok=True)
+    
+    def _evict(self):
+        entries = []
+        for path in self.directory.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,58 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def write_atomic(path, data):
+    write_text_atomic(path, json.dumps(data, indent=2))
+
+
+def write_text_atomic(path, text):
+    # A crash mid-write leaves the old file in place, never a torn one
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp")
+    with open(tmp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+# Write-ahead record of the app states a run has changed since the manifest
+# was last saved. Each step rewrites the whole journal atomically; a clean
+# save removes it, so one left behind means the previous run died part way.
+class RunJournal:
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries = self._load()
+    
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f).get("entries", [])
+        except FileNotFoundError:
+            return []
+        except (json.JSONDecodeError, AttributeError) as e:
+            logger.error(f"Ignoring unreadable journal {self.path}: {e}")
+            return []
+    
+    @property
+    def entries(self):
+        with self._lock:
+            return list(self._entries)
+    
+    def record(self, channel, app_key, state):
+        with self._lock:
+            self._entries.append({"channel": channel, "app": app_key, "state": state})
+            write_atomic(self.path, {"entries": self._entries})
+    
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self.path.unlink(missing_ok=True)
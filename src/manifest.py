@@ -1,12 +1,31 @@
+import copy
 import json
 import logging
+import os
 from dataclasses import asdict, dataclass, field
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
+from src.journal import RunJournal, write_atomic
+from src.telemetry import Telemetry
+
 logger = logging.getLogger(__name__)
 
 
+def delta_blob_name(blob_name):
+    stem, ext = os.path.splitext(blob_name)
+    return f"{stem}-delta{ext}"
+
+
+@dataclass
+class DeltaState:
+    from_version: str
+    sha256: str
+    download_url: str
+    blob_name: str
+    file_size: int = None
+
+
 @dataclass
 class PackageState:
     version: str
@@ -16,6 +35,10 @@ class PackageState:
     promoted_at: str = None
     file_size: int = None
     min_os: str = None
+    etag: str = None
+    last_modified: str = None
+    fingerprint: str = None
+    delta: DeltaState = None
 
 
 @dataclass
@@ -34,12 +57,43 @@ class Manifest:
     channel: str = "current"
     lag_days: int = 14
     apps: dict = field(default_factory=dict)
+    channels: dict = field(default_factory=dict)
 
 
 class ManifestManager:
-    def __init__(self, manifest_path):
+    def __init__(self, manifest_path, telemetry=None):
         self.manifest_path = Path(manifest_path)
+        self.telemetry = telemetry or Telemetry()
         self.manifest = self._load()
+        self.root = self
+        self.journal = RunJournal(self.manifest_path.with_name(f"{self.manifest_path.name}.journal"))
+        self.recovered = self._replay()
+    
+    def for_channel(self, channel):
+        # Extra channels keep their own app states in the same file; the view
+        # has the full ManifestManager API and saves through the root
+        if channel == self.root.manifest.channel:
+            return self.root
+        view = copy.copy(self.root)
+        view.manifest = self.root.manifest.channels.setdefault(
+            channel, Manifest(channel=channel, lag_days=self.root.manifest.lag_days)
+        )
+        return view
+    
+    def app_label(self, app_key):
+        # Same labels as Settings.app_label: extra channels prefix their keys
+        return app_key if self.root is self else f"{self.manifest.channel}/{app_key}"
+    
+    def _replay(self):
+        # Steps an interrupted run completed but never saved are applied again,
+        # so their uploads and promotions are not repeated
+        entries = self.journal.entries
+        for entry in entries:
+            target = self.for_channel(entry["channel"]) if entry["channel"] else self
+            target.manifest.apps.update(self._parse_apps({entry["app"]: entry["state"]}))
+        if entries:
+            logger.warning(f"Recovered {len(entries)} steps from an interrupted run")
+        return len(entries)
     
     def _load(self):
         if not self.manifest_path.exists():
@@ -60,7 +114,19 @@ class ManifestManager:
             lag_days=data.get("lag_days", 14),
         )
         
-        for key, app_data in data.get("apps", {}).items():
+        manifest.apps = self._parse_apps(data.get("apps", {}))
+        for channel, channel_data in data.get("channels", {}).items():
+            manifest.channels[channel] = Manifest(
+                channel=channel,
+                lag_days=manifest.lag_days,
+                apps=self._parse_apps(channel_data.get("apps", {})),
+            )
+        
+        return manifest
+    
+    def _parse_apps(self, data):
+        apps = {}
+        for key, app_data in data.items():
             app = AppState(
                 app_id=app_data.get("app_id", ""),
                 name=app_data.get("name", ""),
@@ -78,24 +144,58 @@ class ManifestManager:
                         promoted_at=tier_data.get("promoted_at"),
                         file_size=tier_data.get("file_size"),
                         min_os=tier_data.get("min_os"),
+                        etag=tier_data.get("etag"),
+                        last_modified=tier_data.get("last_modified"),
+                        fingerprint=tier_data.get("fingerprint"),
+                        delta=self._parse_delta(tier_data.get("delta")),
                     )
                     setattr(app, tier, pkg)
             
-            manifest.apps[key] = app
+            apps[key] = app
         
-        return manifest
+        return apps
+    
+    def _parse_delta(self, data):
+        if not data:
+            return None
+        return DeltaState(
+            from_version=data.get("from_version", ""),
+            sha256=data.get("sha256", ""),
+            download_url=data.get("download_url", ""),
+            blob_name=data.get("blob_name", ""),
+            file_size=data.get("file_size"),
+        )
     
     def save(self):
+        if self.root is not self:
+            return self.root.save()
+        
         self.manifest.last_updated = datetime.now(timezone.utc).isoformat()
         
         data = {
             "last_updated": self.manifest.last_updated,
             "channel": self.manifest.channel,
             "lag_days": self.manifest.lag_days,
-            "apps": {},
+            "apps": self._dump_apps(self.manifest.apps),
+        }
+        channels = {
+            channel: {"apps": self._dump_apps(manifest.apps)}
+            for channel, manifest in self.manifest.channels.items()
+            if manifest.apps
         }
+        if channels:
+            data["channels"] = channels
         
-        for key, app in self.manifest.apps.items():
+        with self.telemetry.span("manifest-save"):
+            write_atomic(self.manifest_path, data)
+        self.journal.clear()
+        self.recovered = 0
+        
+        logger.info("Saved manifest")
+    
+    def _dump_apps(self, apps):
+        data = {}
+        for key, app in apps.items():
             app_data = {
                 "app_id": app.app_id,
                 "name": app.name,
@@ -107,22 +207,21 @@ class ManifestManager:
                 if pkg:
                     app_data[tier] = asdict(pkg)
             
-            data["apps"][key] = app_data
-        
-        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.manifest_path, "w") as f:
-            json.dump(data, f, indent=2)
-        
-        logger.info("Saved manifest")
+            data[key] = app_data
+        return data
     
     def get_app_state(self, app_key):
         return self.manifest.apps.get(app_key)
     
     def set_app_state(self, app_key, state):
         self.manifest.apps[app_key] = state
+        channel = None if self.root is self else self.manifest.channel
+        with self.telemetry.span("journal"):
+            self.journal.record(channel, app_key, self._dump_apps({app_key: state})[app_key])
     
     def stage_update(self, app_key, app_id, name, blob_name, version, 
-                     sha256, download_url, file_size=None, min_os=None):
+                     sha256, download_url, file_size=None, min_os=None,
+                     etag=None, last_modified=None, fingerprint=None, delta=None):
         state = self.get_app_state(app_key)
         if not state:
             state = AppState(app_id=app_id, name=name, blob_name=blob_name)
@@ -134,6 +233,10 @@ class ManifestManager:
             staged_at=datetime.now(timezone.utc).isoformat(),
             file_size=file_size,
             min_os=min_os,
+            etag=etag,
+            last_modified=last_modified,
+            fingerprint=fingerprint,
+            delta=delta,
         )
         
         self.set_app_state(app_key, state)
@@ -167,16 +270,42 @@ class ManifestManager:
         
         return True
     
-    def is_ready_for_promotion(self, app_key, lag_days):
+    def find_unchanged_package(self, app_key, download_url, etag=None,
+                               last_modified=None, file_size=None, fingerprint=None):
+        state = self.get_app_state(app_key)
+        if not state:
+            return None
+        
+        for pkg in (state.staged, state.live):
+            if not pkg or pkg.download_url != download_url:
+                continue
+            if file_size and pkg.file_size and file_size != pkg.file_size:
+                continue
+            
+            # Same URL alone proves nothing: every validator known on both sides
+            # must agree, and there has to be at least one
+            pairs = [
+                (etag, pkg.etag),
+                (last_modified, pkg.last_modified),
+                (fingerprint, pkg.fingerprint),
+            ]
+            compared = [(new, old) for new, old in pairs if new and old]
+            if compared and all(new == old for new, old in compared):
+                return pkg
+        
+        return None
+    
+    def promotion_due(self, app_key, lag_days):
         state = self.get_app_state(app_key)
         if not state or not state.staged or not state.staged.staged_at:
-            return False
+            return None
         
         staged = datetime.fromisoformat(state.staged.staged_at.replace("Z", "+00:00"))
-        now = datetime.now(timezone.utc)
-        days_waiting = (now - staged).days
-        
-        return days_waiting >= lag_days
+        return staged + timedelta(days=lag_days)
+    
+    def is_ready_for_promotion(self, app_key, lag_days):
+        due = self.promotion_due(app_key, lag_days)
+        return due is not None and datetime.now(timezone.utc) >= due
     
     def get_apps_ready_for_promotion(self, lag_days):
         ready = []
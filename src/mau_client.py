@@ -1,20 +1,144 @@
 import hashlib
+import io
 import logging
 import re
+import tempfile
+import threading
+import weakref
 import xml.etree.ElementTree as ET
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from urllib.parse import urljoin
 
 import requests
 
+from src import xar
+from src.config import CDN_URLS
+from src.downloader import SegmentedDownloader, progress_path
+from src.http_cache import HTTPCache
+from src.package_cache import PackageCache, link_or_copy
+from src.telemetry import Telemetry
+
 logger = logging.getLogger(__name__)
 
 CHUNK_SIZE = 8192
+STREAM_CHUNK_SIZE = 1024 * 1024
 REQUEST_TIMEOUT = 30
 DOWNLOAD_TIMEOUT = 600
 
 
+def _remove_files(paths):
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+# Each UpdateInfo field maps to the manifest tags that can supply it, most
+# trusted first. Add a field here and _parse_manifest picks it up in the same pass.
+MANIFEST_FIELDS = {
+    "version": ("CFBundleVersion", "Version", "version"),
+    "download_url": ("FullUpdaterLocation", "Location", "PkgLocation"),
+    "sha256": ("FullUpdaterSHA256", "SHA256", "Hash"),
+    "file_size": ("FullUpdaterSize", "Size"),
+    "min_os": ("MinimumOSVersion", "MinOS"),
+}
+
+# Repeated container elements are parsed into one record each with their own
+# table. Their children never feed the top-level fields above.
+MANIFEST_GROUPS = {
+    "deltas": ("DeltaUpdater", {
+        "from_version": ("FromVersion", "BaseVersion"),
+        "download_url": ("DeltaUpdaterLocation", "Location"),
+        "sha256": ("DeltaUpdaterSHA256", "SHA256"),
+        "file_size": ("DeltaUpdaterSize", "Size"),
+    }),
+}
+
+FIELD_CONVERTERS = {
+    "file_size": int,
+}
+
+
+def _tag_table(fields):
+    return {
+        tag: (name, rank)
+        for name, tags in fields.items()
+        for rank, tag in enumerate(tags)
+    }
+
+
+def _offer(best, entry, position, text):
+    name, rank = entry
+    if name not in best or (rank, position) < best[name][:2]:
+        best[name] = (rank, position, text.strip())
+
+
+def _convert(best):
+    parsed = {}
+    for name, (_, _, value) in best.items():
+        convert = FIELD_CONVERTERS.get(name)
+        if convert:
+            try:
+                value = convert(value)
+            except ValueError:
+                value = None
+        parsed[name] = value
+    return parsed
+
+
+def parse_manifest_fields(source, fields=None, groups=None):
+    tag_table = _tag_table(fields or MANIFEST_FIELDS)
+    groups = MANIFEST_GROUPS if groups is None else groups
+    group_tags = {
+        container: (name, _tag_table(group_fields))
+        for name, (container, group_fields) in groups.items()
+    }
+    
+    best = {}
+    records = {name: [] for name in groups}
+    group = None
+    order = []
+    seq = 0
+    root = None
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            elif group is None and elem.tag in group_tags:
+                group = (elem, *group_tags[elem.tag], {})
+            order.append(seq)
+            seq += 1
+            continue
+        
+        position = order.pop()
+        if group and elem is group[0]:
+            records[group[1]].append(_convert(group[3]))
+            group = None
+        elif group:
+            entry = group[2].get(elem.tag)
+            if entry and elem.text:
+                _offer(group[3], entry, position, elem.text)
+        # The root itself is skipped, matching the old root.find(".//tag") lookups
+        elif elem is not root and elem.text and elem.tag in tag_table:
+            _offer(best, tag_table[elem.tag], position, elem.text)
+        
+        # Free parsed elements as we go so large manifests stay flat in memory
+        elem.clear()
+        if len(order) == 1:
+            root.clear()
+    
+    parsed = _convert(best)
+    parsed.update({name: found for name, found in records.items() if found})
+    return parsed
+
+
+@dataclass
+class DeltaInfo:
+    from_version: str
+    download_url: str
+    sha256: str = None
+    file_size: int = None
+
+
 @dataclass
 class UpdateInfo:
     app_id: str
@@ -23,82 +147,145 @@ class UpdateInfo:
     sha256: str = None
     file_size: int = None
     min_os: str = None
+    etag: str = None
+    last_modified: str = None
+    fingerprint: str = None
+    deltas: dict = field(default_factory=dict)
+    
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data["deltas"] = {
+            base: DeltaInfo(**delta) for base, delta in data.get("deltas", {}).items()
+        }
+        return cls(**data)
+    
+    def delta_from(self, version):
+        return self.deltas.get(version) if version else None
+
+
+@dataclass
+class Flight:
+    done: object
+    path: Path = None
+    sha256: str = None
 
 
 class MAUClient:
-    def __init__(self, settings):
+    def __init__(self, settings, telemetry=None):
         self.settings = settings
+        self.telemetry = telemetry or Telemetry()
         self.session = requests.Session()
         self.session.headers.update({"User-Agent": "M365UpdateManager/1.0"})
+        self.cache = None
+        if settings.cache_dir:
+            self.cache = HTTPCache(
+                Path(settings.cache_dir) / "manifests",
+                ttl=settings.manifest_cache_ttl,
+                max_bytes=settings.manifest_cache_max_bytes,
+            )
+        self.downloader = SegmentedDownloader(
+            self.session,
+            segments=settings.download_segments,
+            min_segment_size=settings.download_segment_min_bytes,
+            retries=settings.download_retries,
+            telemetry=self.telemetry,
+        )
+        self.packages = None
+        if settings.cache_dir and settings.package_cache_max_bytes:
+            self.packages = PackageCache(
+                Path(settings.cache_dir) / "packages",
+                settings.package_cache_max_bytes,
+            )
+        
+        # Transfers made this run, keyed by (url, sha256); the verified files
+        # are kept as hidden links until end_run, so repeats within the run
+        # (a delta shared by every channel and locale) link rather than fetch
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._flight_files = []
+        weakref.finalize(self, _remove_files, self._flight_files)
+    
+    def end_run(self):
+        # A client kept across runs (check_updates.py --watch) lets go of the
+        # last run's shared downloads rather than piling them up on disk
+        with self._flights_lock:
+            self._flights.clear()
+            paths = list(self._flight_files)
+            del self._flight_files[:]
+        _remove_files(paths)
     
     def get_update_info(self, app):
-        manifest_url = urljoin(self.settings.cdn_base_url, f"0409{app.app_id}.xml")
+        with self.telemetry.span("manifest"):
+            return self._fetch_update_info(app)
+    
+    def _fetch_update_info(self, app):
+        manifest_url = self._manifest_url(app)
         logger.info(f"Checking {app.name}")
         
+        cached = self._cached_manifest(manifest_url)
+        if cached and cached.is_fresh(self.cache.ttl):
+            logger.debug(f"Using cached manifest for {app.name}")
+            return self._cached_info(cached)
+        
         try:
-            response = self.session.get(manifest_url, timeout=REQUEST_TIMEOUT)
-            response.raise_for_status()
-            root = ET.fromstring(response.content)
-            info = self._parse_manifest(root, app.app_id)
-            if info:
-                return info
+            headers = cached.conditional_headers() if cached else {}
+            response = self.session.get(manifest_url, headers=headers, timeout=REQUEST_TIMEOUT)
+            if response.status_code == 304 and cached:
+                logger.debug(f"Manifest for {app.name} not modified")
+                self.cache.refresh(cached)
+                info = self._cached_info(cached)
+                if info:
+                    return info
+            else:
+                response.raise_for_status()
+                info = self._parse_manifest(response.content, app.app_id)
+                if info:
+                    self._remember_manifest(manifest_url, info, response.headers)
+                    return info
         except (requests.RequestException, ET.ParseError) as e:
             logger.debug(f"Manifest fetch failed: {e}")
         
         return self._get_from_fwlink(app)
     
-    def _parse_manifest(self, root, app_id):
-        version = None
-        url = None
-        sha = None
-        size = None
-        min_os = None
-        
-        for tag in ["CFBundleVersion", "Version", "version"]:
-            elem = root.find(f".//{tag}")
-            if elem is not None and elem.text:
-                version = elem.text.strip()
-                break
-        
-        for tag in ["FullUpdaterLocation", "Location", "PkgLocation"]:
-            elem = root.find(f".//{tag}")
-            if elem is not None and elem.text:
-                url = elem.text.strip()
-                break
-        
-        for tag in ["FullUpdaterSHA256", "SHA256", "Hash"]:
-            elem = root.find(f".//{tag}")
-            if elem is not None and elem.text:
-                sha = elem.text.strip()
-                break
-        
-        for tag in ["FullUpdaterSize", "Size"]:
-            elem = root.find(f".//{tag}")
-            if elem is not None and elem.text:
-                try:
-                    size = int(elem.text.strip())
-                except ValueError:
-                    pass
-                break
-        
-        for tag in ["MinimumOSVersion", "MinOS"]:
-            elem = root.find(f".//{tag}")
-            if elem is not None and elem.text:
-                min_os = elem.text.strip()
-                break
-        
-        if version and url:
-            return UpdateInfo(
-                app_id=app_id,
-                version=version,
-                download_url=url,
-                sha256=sha,
-                file_size=size,
-                min_os=min_os,
+    def _manifest_url(self, app):
+        base_url = CDN_URLS[app.channel] if app.channel else self.settings.cdn_base_url
+        return urljoin(base_url, f"{app.locale}{app.app_id}.xml")
+    
+    def _cached_manifest(self, manifest_url):
+        return self.cache.get(manifest_url) if self.cache else None
+    
+    def _remember_manifest(self, manifest_url, info, headers):
+        if self.cache:
+            self.cache.put(
+                manifest_url,
+                asdict(info),
+                etag=headers.get("ETag"),
+                last_modified=headers.get("Last-Modified"),
             )
-        return None
+    
+    def _cached_info(self, entry):
+        try:
+            return UpdateInfo.from_dict(entry.data)
+        except TypeError as e:
+            logger.debug(f"Discarding stale cache entry for {entry.url}: {e}")
+            return None
+    
+    def _parse_manifest(self, content, app_id):
+        fields = parse_manifest_fields(io.BytesIO(content))
+        if not fields.get("version") or not fields.get("download_url"):
+            return None
+        
+        fields["deltas"] = {
+            delta["from_version"]: DeltaInfo(**delta)
+            for delta in fields.get("deltas", [])
+            if delta.get("from_version") and delta.get("download_url")
+        }
+        return UpdateInfo(app_id=app_id, **fields)
     
     def _get_from_fwlink(self, app):
+        if not self._fwlink_serves(app):
+            return None
         try:
             response = self.session.head(
                 app.fwlink, 
@@ -107,21 +294,55 @@ class MAUClient:
             )
             response.raise_for_status()
             
-            url = response.url
-            content_length = response.headers.get("Content-Length")
-            version = self._extract_version(url) or "unknown"
-            size = int(content_length) if content_length else None
-            
-            return UpdateInfo(
-                app_id=app.app_id,
-                version=version,
-                download_url=url,
-                file_size=size,
-            )
+            # The package's own metadata beats guessing the version from its URL
+            inspection = self.inspect_package(response.url, app.bundle_id)
+            return self._fwlink_info(app, response.url, response.headers, inspection)
         except requests.RequestException as e:
             logger.error(f"FWLink failed for {app.name}: {e}")
             return None
     
+    def _fwlink_serves(self, app):
+        # fwlinks always resolve to the production build, never another channel's
+        if app.channel and app.channel != "current":
+            logger.warning(f"No manifest for {app.name} on {app.channel}; fwlinks only serve current")
+            return False
+        return True
+    
+    def _fwlink_info(self, app, url, headers, inspection):
+        content_length = headers.get("Content-Length")
+        
+        # Validators let the next run spot an unchanged package without downloading it
+        return UpdateInfo(
+            app_id=app.app_id,
+            version=inspection.version or self._extract_version(url) or "unknown",
+            download_url=url,
+            file_size=int(content_length) if content_length else None,
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+            fingerprint=inspection.fingerprint,
+        )
+    
+    def inspect_package(self, url, bundle_id):
+        # Reads the XAR header, table of contents and metadata members with
+        # Range requests: a few KB instead of the whole package
+        try:
+            header = xar.parse_header(self.fetch_range(url, 0, xar.HEADER_SIZE))
+            toc = self.fetch_range(url, header.header_size, header.toc_length_compressed)
+            files = xar.parse_toc(toc)
+            
+            documents = []
+            for member in xar.metadata_files(files):
+                data = self.fetch_range(url, header.heap_offset + member.offset, member.length)
+                documents.append(xar.decode_member(member, data))
+            
+            version = xar.find_version(documents, bundle_id)
+            digest, checksums = xar.fingerprint(files)
+            logger.debug(f"Inspected {url}: version {version}, {len(files)} members")
+            return xar.PackageInspection(version, digest, checksums)
+        except (requests.RequestException, xar.XarError, OSError, ValueError) as e:
+            logger.debug(f"Package inspection failed for {url}: {e}")
+            return xar.PackageInspection()
+    
     def _extract_version(self, url):
         patterns = [
             r"(\d+\.\d+\.\d{8,})",
@@ -134,33 +355,161 @@ class MAUClient:
                 return match.group(1)
         return None
     
-    def download_package(self, url, dest, expected_sha=None):
+    def download_path(self, name):
+        # A stable path under the cache lets an interrupted download resume next run
+        if self.settings.cache_dir:
+            directory = Path(self.settings.cache_dir) / "downloads"
+            directory.mkdir(parents=True, exist_ok=True)
+            return directory / f"{name}.pkg"
+        
+        with tempfile.NamedTemporaryFile(suffix=".pkg", delete=False) as tmp:
+            return Path(tmp.name)
+    
+    def discard_download(self, path):
+        # A partial download is worth keeping only under CACHE_DIR, where the
+        # next run asks for the same path; a temp name is never seen again
+        path = Path(path)
+        if self.settings.cache_dir and progress_path(path).exists():
+            return
+        path.unlink(missing_ok=True)
+        progress_path(path).unlink(missing_ok=True)
+    
+    def cached_package(self, sha256):
+        if not self.packages or not sha256:
+            return None
+        return self.packages.get(sha256)
+    
+    def download_package(self, url, dest, expected_sha=None, size=None):
+        # Single flight: callers asking for a package that is already coming
+        # down, or already came down this run, share that transfer's file
+        key = (url, expected_sha.lower() if expected_sha else None)
+        flight, leader = self._board(key, threading.Event())
+        if not leader:
+            flight.done.wait()
+            return self._join(flight, url, dest) or self.download_package(
+                url, dest, expected_sha, size
+            )
+        
+        sha256 = None
         try:
-            logger.info(f"Downloading {url}")
-            response = self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT)
-            response.raise_for_status()
-            
-            sha_hash = hashlib.sha256()
-            with open(dest, "wb") as f:
-                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
-                    f.write(chunk)
-                    sha_hash.update(chunk)
-            
-            computed = sha_hash.hexdigest()
-            logger.info(f"Downloaded, SHA256: {computed}")
-            
-            if expected_sha and computed.lower() != expected_sha.lower():
-                logger.error(f"Hash mismatch: expected {expected_sha}, got {computed}")
-                return False
+            with self.telemetry.span("download"):
+                sha256 = self._fetch(url, dest, expected_sha, size)
+        finally:
+            self._land(key, flight, url, dest, sha256)
+        return sha256 is not None
+    
+    def _fetch(self, url, dest, expected_sha, size):
+        try:
+            probe = self.downloader.probe(url, size)
+            known_sha = self._link_cached(url, dest, expected_sha, probe)
+            if known_sha:
+                return known_sha
             
-            return True
+            logger.info(f"Downloading {url}")
+            computed = self.downloader.download(url, dest, size, probe)
+            return self._accept_download(url, dest, computed, expected_sha, probe)
         except (requests.RequestException, IOError) as e:
             logger.error(f"Download failed: {e}")
+            return None
+    
+    def _board(self, key, done):
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            if flight:
+                return flight, False
+            flight = self._flights[key] = Flight(done)
+            return flight, True
+    
+    def _land(self, key, flight, url, dest, sha256):
+        path = None
+        if sha256:
+            # Callers delete their copy when done, so the flight keeps its own link
+            path = Path(dest).with_name(f".flight-{sha256.lower()}.pkg")
+            try:
+                link_or_copy(dest, path)
+                self._flight_files.append(path)
+            except OSError as e:
+                logger.debug(f"Could not keep {dest} for reuse: {e}")
+                path = None
+        
+        with self._flights_lock:
+            if path:
+                flight.path, flight.sha256 = path, sha256.lower()
+                self._flights.setdefault((url, flight.sha256), flight)
+                self._flights.setdefault((url, None), flight)
+            else:
+                self._flights.pop(key, None)
+        flight.done.set()
+    
+    def _join(self, flight, url, dest):
+        # A failed transfer leaves nothing to share; the caller then tries itself
+        if not flight.path or not flight.path.exists():
             return False
+        link_or_copy(flight.path, dest)
+        logger.info(f"Reusing this run's download of {url}")
+        return True
+    
+    def _link_cached(self, url, dest, expected_sha, probe):
+        known_sha = expected_sha
+        if not known_sha and self.packages:
+            known_sha = self.packages.lookup_url(url, probe.etag, probe.size)
+        
+        cached = self.cached_package(known_sha)
+        if cached:
+            link_or_copy(cached, dest)
+            return known_sha
+        return None
+    
+    def _accept_download(self, url, dest, computed, expected_sha, probe):
+        logger.info(f"Downloaded, SHA256: {computed}")
+        if expected_sha and computed.lower() != expected_sha.lower():
+            logger.error(f"Hash mismatch: expected {expected_sha}, got {computed}")
+            return None
+        
+        self.telemetry.add_bytes("download", Path(dest).stat().st_size)
+        if self.packages:
+            self.packages.add(dest, computed, url, probe.etag)
+        return computed
+    
+    def iter_package(self, url, chunk_size=STREAM_CHUNK_SIZE):
+        logger.info(f"Streaming {url}")
+        response = self.session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT)
+        try:
+            response.raise_for_status()
+            yield from response.iter_content(chunk_size=chunk_size)
+        finally:
+            response.close()
+    
+    def fetch_range(self, url, start, length):
+        headers = {"Range": f"bytes={start}-{start + length - 1}"}
+        response = self.session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT)
+        try:
+            response.raise_for_status()
+            data = bytearray()
+            skip = start if response.status_code == 200 else 0
+            
+            # A server that ignores Range sends the whole file, so only read what we need
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if skip:
+                    dropped = min(skip, len(chunk))
+                    chunk = chunk[dropped:]
+                    skip -= dropped
+                data.extend(chunk)
+                if len(data) >= length:
+                    break
+            return bytes(data[:length])
+        finally:
+            response.close()
+    
+    def compute_url_hash(self, url):
+        sha_hash = hashlib.sha256()
+        for chunk in self.iter_package(url):
+            sha_hash.update(chunk)
+        return sha_hash.hexdigest()
     
     def compute_file_hash(self, filepath):
         sha_hash = hashlib.sha256()
-        with open(filepath, "rb") as f:
+        with self.telemetry.span("hash"), open(filepath, "rb") as f:
             for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
                 sha_hash.update(chunk)
         return sha_hash.hexdigest()
@@ -0,0 +1,240 @@
+import logging
+import math
+import re
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from src.journal import write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "m365_update"
+HOUR = 3600
+DAY = 24 * HOUR
+
+# name: (type, help, histogram buckets)
+FAMILIES = {
+    "runs_total": ("counter", "Runs of check_updates.py or promote.py", None),
+    "last_run_timestamp_seconds": ("gauge", "When the command last finished", None),
+    "run_duration_seconds": (
+        "histogram", "Wall time of each run",
+        (10, 30, 60, 300, 900, 1800, HOUR),
+    ),
+    "staged_total": ("counter", "Packages staged", None),
+    "promoted_total": ("counter", "Packages promoted to live", None),
+    "failures_total": ("counter", "Runs in which an app logged an error", None),
+    "transferred_bytes_total": ("counter", "Bytes moved, by phase", None),
+    "time_to_stage_seconds": (
+        "histogram", "Time from Microsoft publishing a package to it being staged",
+        (HOUR, 6 * HOUR, 12 * HOUR, DAY, 2 * DAY, 4 * DAY, 7 * DAY),
+    ),
+    "staged_lag_seconds": (
+        "histogram", "Time a package spent staged before promotion",
+        (DAY, 3 * DAY, 7 * DAY, 14 * DAY, 21 * DAY, 30 * DAY),
+    ),
+    "package_age_seconds": ("gauge", "Time since the package entered its tier", None),
+    "package_info": ("gauge", "Version held in each tier", None),
+}
+
+# The timestamp each tier's age is measured from; previous only reports its version
+TIER_SINCE = {"staged": "staged_at", "live": "promoted_at", "previous": None}
+
+_SAMPLE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$")
+_LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _unescape(value):
+    return re.sub(r"\\(.)", lambda m: "\n" if m.group(1) == "n" else m.group(1), value)
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+# Prometheus textfile for node_exporter's textfile collector. Counters and
+# histograms carry on from the values already in the file, so they keep
+# rising across scheduled runs even though no process stays up between them.
+class MetricsFile:
+    def __init__(self, path):
+        self.path = path
+        self._samples = self._load()
+    
+    def _load(self):
+        samples = {}
+        try:
+            with open(self.path) as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return samples
+        except OSError as e:
+            logger.warning(f"Could not read {self.path}, starting metrics afresh: {e}")
+            return samples
+        
+        for line in lines:
+            match = _SAMPLE.match(line)
+            if not match or not match.group(1).startswith(f"{PREFIX}_"):
+                continue
+            name, labels, value = match.groups()
+            try:
+                value = float(value)
+            except ValueError:
+                continue
+            labels = tuple((key, _unescape(val)) for key, val in _LABEL.findall(labels or ""))
+            samples[(name[len(PREFIX) + 1:], labels)] = value
+        return samples
+    
+    def _family(self, sample_name):
+        if sample_name in FAMILIES:
+            return sample_name
+        for suffix in ("_bucket", "_sum", "_count"):
+            base = sample_name.removesuffix(suffix)
+            if base != sample_name and FAMILIES.get(base, ("",))[0] == "histogram":
+                return base
+        return None
+    
+    def _key(self, name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+    
+    def inc(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        self._samples[key] = self._samples.get(key, 0) + amount
+    
+    def set(self, name, value, **labels):
+        self._samples[self._key(name, labels)] = value
+    
+    def observe(self, name, value, **labels):
+        _, base = self._key(name, labels)
+        for bound in FAMILIES[name][2] + (math.inf,):
+            key = (f"{name}_bucket", base + (("le", _number(bound)),))
+            self._samples[key] = self._samples.get(key, 0) + (1 if value <= bound else 0)
+        self.inc(f"{name}_sum", value, **labels)
+        self.inc(f"{name}_count", 1, **labels)
+    
+    def clear(self, name):
+        # Gauges rebuilt from the manifest each run drop series that no longer exist
+        self._samples = {
+            key: value for key, value in self._samples.items() if self._family(key[0]) != name
+        }
+    
+    def render(self):
+        grouped = {}
+        for (name, labels), value in self._samples.items():
+            family = self._family(name)
+            if family:
+                grouped.setdefault(family, []).append((name, labels, value))
+        
+        lines = []
+        for family, (kind, description, _) in FAMILIES.items():
+            if family not in grouped:
+                continue
+            lines.append(f"# HELP {PREFIX}_{family} {description}")
+            lines.append(f"# TYPE {PREFIX}_{family} {kind}")
+            for name, labels, value in sorted(grouped[family], key=self._order):
+                rendered = ",".join(f'{key}="{_escape(val)}"' for key, val in labels)
+                lines.append(f"{PREFIX}_{name}{{{rendered}}} {_number(value)}")
+        return "\n".join(lines) + "\n"
+    
+    def _order(self, sample):
+        # Series together, then buckets in ascending order before _sum and _count
+        name, labels, _ = sample
+        series = tuple(item for item in labels if item[0] != "le")
+        bound = dict(labels).get("le")
+        rank = 0 if name.endswith("_bucket") else 1
+        return series, rank, name, float(bound.replace("+Inf", "inf")) if bound else 0
+    
+    def write(self):
+        try:
+            write_text_atomic(self.path, self.render())
+        except OSError as e:
+            logger.error(f"Could not write metrics to {self.path}: {e}")
+            return False
+        logger.info(f"Wrote metrics to {self.path}")
+        return True
+
+
+def record_run(path, command, settings, manifest_mgr, telemetry, changed):
+    # changed holds the app labels the run staged or promoted
+    metrics = MetricsFile(path)
+    report = telemetry.report()
+    now = datetime.now(timezone.utc)
+    
+    run = {"command": command, "channel": settings.channel}
+    metrics.inc("runs_total", **run)
+    metrics.set("last_run_timestamp_seconds", now.timestamp(), **run)
+    metrics.observe("run_duration_seconds", report["seconds"], **run)
+    
+    for label in changed:
+        channel, app_key = settings.parse_label(label)
+        state = manifest_mgr.for_channel(channel).get_app_state(app_key)
+        labels = {"app": app_key, "channel": channel}
+        if command == "check":
+            metrics.inc("staged_total", **labels)
+            if state and state.staged:
+                _observe_between(
+                    metrics, "time_to_stage_seconds",
+                    state.staged.last_modified, state.staged.staged_at, labels,
+                )
+        else:
+            metrics.inc("promoted_total", **labels)
+            if state and state.live:
+                _observe_between(
+                    metrics, "staged_lag_seconds",
+                    state.live.staged_at, state.live.promoted_at, labels,
+                )
+    
+    for label, phases in report["apps"].items():
+        channel, app_key = settings.parse_label(label)
+        for phase, stats in phases.items():
+            if stats["bytes"]:
+                metrics.inc(
+                    "transferred_bytes_total", stats["bytes"],
+                    app=app_key, channel=channel, phase=phase,
+                )
+    
+    for label in report["failures"]:
+        channel, app_key = settings.parse_label(label)
+        metrics.inc("failures_total", app=app_key, channel=channel, command=command)
+    
+    metrics.clear("package_age_seconds")
+    metrics.clear("package_info")
+    for channel in settings.channels:
+        for app_key, state in manifest_mgr.for_channel(channel).manifest.apps.items():
+            for tier, since in TIER_SINCE.items():
+                pkg = getattr(state, tier)
+                if not pkg:
+                    continue
+                labels = {"app": app_key, "channel": channel, "tier": tier}
+                metrics.set("package_info", 1, version=pkg.version, **labels)
+                entered = _parse_time(getattr(pkg, since)) if since else None
+                if entered:
+                    metrics.set("package_age_seconds", (now - entered).total_seconds(), **labels)
+    
+    return metrics.write()
+
+
+def _observe_between(metrics, name, start, end, labels):
+    # Packages whose start time was never recorded are left out rather than guessed
+    start, end = _parse_time(start), _parse_time(end)
+    if start and end:
+        metrics.observe(name, (end - start).total_seconds(), **labels)
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def link_or_copy(source, dest):
+    # Callers never write into a linked file in place (they unlink first), so
+    # sharing the inode with the cache is safe and costs no disk
+    dest = Path(dest)
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copyfile(source, dest)
+
+
+class PackageCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.objects = self.directory / "objects"
+        self.index_path = self.directory / "index.json"
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self._index = self._load_index()
+    
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            index = {}
+        index.setdefault("urls", {})
+        index.setdefault("access", {})
+        return index
+    
+    def _save_index(self):
+        tmp = self.index_path.with_name(f"{self.index_path.name}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self.index_path)
+    
+    def _object_path(self, sha256):
+        return self.objects / f"{sha256.lower()}.pkg"
+    
+    def get(self, sha256):
+        path = self._object_path(sha256)
+        if not path.exists():
+            return None
+        
+        # A corrupt entry would be uploaded as if it were verified, so re-hash on every hit
+        if self._hash_file(path) != sha256.lower():
+            logger.warning(f"Cached package {sha256} failed verification, discarding")
+            self._remove(sha256)
+            return None
+        
+        with self._lock:
+            self._index["access"][sha256.lower()] = time.time()
+            self._save_index()
+        logger.info(f"Package cache hit for {sha256}")
+        return path
+    
+    def lookup_url(self, url, etag=None, size=None):
+        with self._lock:
+            entry = self._index["urls"].get(url)
+        if not entry:
+            return None
+        
+        # A URL can be republished with new bytes; only trust it if the server
+        # still reports the same validator and size
+        if not etag or entry.get("etag") != etag:
+            return None
+        if size and entry.get("size") and entry["size"] != size:
+            return None
+        return entry["sha256"]
+    
+    def add(self, path, sha256, url=None, etag=None):
+        sha256 = sha256.lower()
+        target = self._object_path(sha256)
+        if not target.exists():
+            tmp = target.with_name(f"{target.name}.{threading.get_ident()}.tmp")
+            link_or_copy(path, tmp)
+            os.replace(tmp, target)
+        
+        with self._lock:
+            self._index["access"][sha256] = time.time()
+            if url:
+                self._index["urls"][url] = {
+                    "sha256": sha256,
+                    "etag": etag,
+                    "size": target.stat().st_size,
+                }
+            self._save_index()
+        self._evict()
+    
+    def _remove(self, sha256):
+        sha256 = sha256.lower()
+        self._object_path(sha256).unlink(missing_ok=True)
+        with self._lock:
+            self._index["access"].pop(sha256, None)
+            self._index["urls"] = {
+                url: entry for url, entry in self._index["urls"].items()
+                if entry["sha256"] != sha256
+            }
+            self._save_index()
+    
+    def _evict(self):
+        with self._lock:
+            access = dict(self._index["access"])
+        
+        entries = []
+        for path in self.objects.glob("*.pkg"):
+            sha256 = path.stem
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((access.get(sha256, stat.st_mtime), stat.st_size, sha256))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, sha256 in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            logger.info(f"Evicting cached package {sha256}")
+            self._remove(sha256)
+            total -= size
+    
+    def _hash_file(self, path):
+        sha_hash = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                sha_hash.update(chunk)
+        return sha_hash.hexdigest()
@@ -0,0 +1,61 @@
+import threading
+from collections import deque
+
+
+# Slots are reserved before a download starts and released only after the
+# upload finishes and the temp file is removed, so the limits bound disk use
+# for every package in flight, not just the ones waiting in the queue.
+class StagingQueue:
+    def __init__(self, max_items=2, max_bytes=None):
+        self.max_items = max(1, max_items)
+        self.max_bytes = max_bytes or None
+        self._cond = threading.Condition()
+        self._items = deque()
+        self._slots = 0
+        self._reserved_bytes = 0
+        self._closed = False
+    
+    def _fits(self, size):
+        if self._slots >= self.max_items:
+            return False
+        if self.max_bytes is None or not self._slots:
+            # A single oversized package is still allowed through on its own
+            return True
+        return self._reserved_bytes + size <= self.max_bytes
+    
+    def reserve(self, size=None):
+        size = size or 0
+        with self._cond:
+            while not self._fits(size):
+                self._cond.wait()
+            self._slots += 1
+            self._reserved_bytes += size
+    
+    def release(self, size=None):
+        with self._cond:
+            self._slots -= 1
+            self._reserved_bytes -= size or 0
+            self._cond.notify_all()
+    
+    def put(self, item):
+        with self._cond:
+            self._items.append(item)
+            self._cond.notify_all()
+    
+    def get(self):
+        with self._cond:
+            while not self._items and not self._closed:
+                self._cond.wait()
+            if self._items:
+                return self._items.popleft()
+            return None
+    
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+    
+    @property
+    def reserved_bytes(self):
+        with self._cond:
+            return self._reserved_bytes
@@ -0,0 +1,174 @@
+import contextvars
+import cProfile
+import logging
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+
+from src.journal import write_atomic
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENTRIES = 25
+
+# The app whose work is being timed. Clients never see app keys, so the
+# caller tags the context and every span underneath is charged to that app.
+_current_app = contextvars.ContextVar("telemetry_app", default=None)
+
+
+@contextmanager
+def for_app(label):
+    token = _current_app.set(label)
+    try:
+        yield
+    finally:
+        _current_app.reset(token)
+
+
+class _ErrorCounter(logging.Handler):
+    def __init__(self, telemetry):
+        super().__init__(logging.ERROR)
+        self.telemetry = telemetry
+    
+    def emit(self, record):
+        self.telemetry._fail(_current_app.get())
+
+
+@dataclass
+class PhaseStats:
+    calls: int = 0
+    seconds: float = 0.0
+    bytes: int = 0
+    retries: int = 0
+
+
+# Per-app, per-phase timers and counters for one run. Spans nest (a download
+# includes hashing what it fetched), and spans running in parallel each count
+# their own time, so a phase can add up to more than the run's wall time.
+class Telemetry:
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._errors = {}
+        self._profile = None
+    
+    def reset(self):
+        # Starts the next run on the same object, which long-lived clients hold
+        with self._lock:
+            self.started_at = datetime.now(timezone.utc).isoformat()
+            self._started = time.perf_counter()
+            self._stats = {}
+            self._errors = {}
+    
+    @contextmanager
+    def span(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(phase, calls=1, seconds=time.perf_counter() - start)
+    
+    def add_bytes(self, phase, count):
+        if count:
+            self._add(phase, bytes=count)
+    
+    def retry(self, phase):
+        self._add(phase, retries=1)
+    
+    @contextmanager
+    def watch_errors(self):
+        # Every failure path already logs an error, so counting those records
+        # per app catches failures without threading a flag through each one
+        handler = _ErrorCounter(self)
+        root = logging.getLogger()
+        root.addHandler(handler)
+        try:
+            yield
+        finally:
+            root.removeHandler(handler)
+    
+    def _fail(self, app):
+        with self._lock:
+            self._errors[app] = self._errors.get(app, 0) + 1
+    
+    def _add(self, phase, **amounts):
+        key = (_current_app.get(), phase)
+        with self._lock:
+            stats = self._stats.setdefault(key, PhaseStats())
+            for name, amount in amounts.items():
+                setattr(stats, name, getattr(stats, name) + amount)
+    
+    @contextmanager
+    def profile(self, path):
+        # cProfile only sees the thread that enables it; run with --jobs 1 or
+        # --async to have every app's hot path in the profile
+        if not path:
+            yield
+            return
+        
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+            self._profile = self._hot_paths(profiler)
+            logger.info(f"Wrote profile to {path}")
+    
+    def _hot_paths(self, profiler):
+        stats = pstats.Stats(profiler)
+        ranked = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [
+            {
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "own_seconds": round(own, 6),
+                "cumulative_seconds": round(cumulative, 6),
+            }
+            for (filename, line, name), (_, calls, own, cumulative, _) in ranked[:PROFILE_ENTRIES]
+        ]
+    
+    def report(self, **details):
+        with self._lock:
+            stats = dict(self._stats)
+            errors = dict(self._errors)
+        
+        phases = {}
+        apps = {}
+        ordered = sorted(stats.items(), key=lambda item: (item[0][0] or "", item[0][1]))
+        for (app, phase), entry in ordered:
+            total = phases.setdefault(phase, PhaseStats())
+            for name, amount in asdict(entry).items():
+                setattr(total, name, getattr(total, name) + amount)
+            if app:
+                apps.setdefault(app, {})[phase] = self._summary(entry)
+        
+        report = {
+            "started_at": self.started_at,
+            "seconds": round(time.perf_counter() - self._started, 3),
+            **details,
+            "phases": {phase: self._summary(total) for phase, total in phases.items()},
+            "apps": apps,
+            "errors": sum(errors.values()),
+            "failures": dict(sorted((app, count) for app, count in errors.items() if app)),
+        }
+        if self._profile:
+            report["profile"] = self._profile
+        return report
+    
+    def _summary(self, stats):
+        summary = asdict(stats)
+        summary["seconds"] = round(stats.seconds, 3)
+        if stats.bytes and stats.seconds:
+            summary["bytes_per_second"] = round(stats.bytes / stats.seconds)
+        return summary
+    
+    def write_report(self, path, **details):
+        write_atomic(path, self.report(**details))
+        logger.info(f"Wrote run report to {path}")
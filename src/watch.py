@@ -0,0 +1,158 @@
+import heapq
+import itertools
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+POLL = "poll"
+# How long a promotion that didn't go through waits before it is tried again
+PROMOTE_RETRY = timedelta(minutes=15)
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+# Polls every min_interval inside a release window. Outside one, each poll
+# that finds nothing new doubles the wait up to max_interval, but never past
+# the start of the next window; a change drops straight back to min_interval.
+class PollSchedule:
+    def __init__(self, min_interval, max_interval, windows=(), backoff=2):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.windows = list(windows)
+        self.backoff = backoff
+        self.interval = min_interval
+    
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            settings.watch_min_interval, settings.watch_max_interval, settings.release_windows
+        )
+    
+    def in_window(self, when):
+        return any(
+            when.weekday() in days and start <= when.hour < end
+            for days, start, end in self.windows
+        )
+    
+    def next_window(self, when):
+        # Windows start on the hour, so checking each hour of the coming week finds the next
+        hour = when.replace(minute=0, second=0, microsecond=0)
+        for offset in range(1, 7 * 24 + 1):
+            candidate = hour + timedelta(hours=offset)
+            if self.in_window(candidate):
+                return candidate
+        return None
+    
+    def next_poll(self, now, changed):
+        if changed or self.in_window(now):
+            self.interval = self.min_interval
+            return now + timedelta(seconds=self.interval)
+        
+        due = now + timedelta(seconds=self.interval)
+        self.interval = min(self.interval * self.backoff, self.max_interval)
+        window = self.next_window(now)
+        return min(due, window) if window else due
+
+
+# Keyed timers on a heap. Rescheduling a key leaves its old entry behind,
+# which is skipped when it surfaces, so nothing has to be removed mid-heap.
+class TimerQueue:
+    def __init__(self):
+        self._heap = []
+        self._due = {}
+        self._order = itertools.count()
+    
+    def keys(self):
+        return list(self._due)
+    
+    def schedule(self, key, due):
+        if self._due.get(key) == due:
+            return
+        self._due[key] = due
+        heapq.heappush(self._heap, (due, next(self._order), key))
+    
+    def cancel(self, key):
+        self._due.pop(key, None)
+    
+    def next_due(self):
+        while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+    
+    def pop_due(self, now):
+        fired = []
+        while self._heap and self._heap[0][0] <= now:
+            due, _, key = heapq.heappop(self._heap)
+            if self._due.get(key) == due:
+                del self._due[key]
+                fired.append(key)
+        return fired
+
+
+# One loop for both jobs: polling for new builds on the adaptive schedule, and
+# promoting each staged build when its lag runs out. check() returns whether
+# anything was staged, deadlines() maps app labels to when they are due, and
+# promote() promotes whatever is due.
+class Watcher:
+    def __init__(self, schedule, check, promote, deadlines, stop=None, clock=_utcnow):
+        self.schedule = schedule
+        self.check = check
+        self.promote = promote
+        self.deadlines = deadlines
+        self.stop = stop or threading.Event()
+        self.clock = clock
+        self.timers = TimerQueue()
+        self._held = {}
+    
+    def run(self):
+        self.timers.schedule(POLL, self.clock())
+        self._plan_promotions()
+        
+        while not self.stop.is_set():
+            wait = (self.timers.next_due() - self.clock()).total_seconds()
+            if self.stop.wait(max(0, wait)):
+                break
+            
+            now = self.clock()
+            fired = self.timers.pop_due(now)
+            if POLL in fired:
+                changed = self._run("Check", self.check)
+                next_poll = self.schedule.next_poll(self.clock(), changed)
+                self.timers.schedule(POLL, next_poll)
+                logger.info(f"Next check at {next_poll:%Y-%m-%d %H:%M:%S} UTC")
+            
+            promotions = [label for kind, label in filter(_is_promotion, fired)]
+            if promotions:
+                logger.info(f"Promotion due: {', '.join(promotions)}")
+                self._run("Promotion", self.promote)
+                # Anything still staged afterwards failed; it waits before the next try
+                for label in promotions:
+                    self._held[label] = self.clock() + PROMOTE_RETRY
+            
+            self._plan_promotions()
+    
+    def _run(self, name, job):
+        # One bad cycle is logged and retried on schedule rather than ending the watch
+        try:
+            return job()
+        except Exception as e:
+            logger.error(f"{name} failed: {e}")
+            return False
+    
+    def _plan_promotions(self):
+        deadlines = self.deadlines()
+        for key in filter(_is_promotion, self.timers.keys()):
+            if key[1] not in deadlines:
+                self.timers.cancel(key)
+        self._held = {label: held for label, held in self._held.items() if label in deadlines}
+        
+        for label, due in deadlines.items():
+            self.timers.schedule(("promote", label), max(due, self._held.get(label, due)))
+
+
+def _is_promotion(key):
+    return key != POLL
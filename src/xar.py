@@ -0,0 +1,173 @@
+import bz2
+import hashlib
+import struct
+import xml.etree.ElementTree as ET
+import zlib
+from dataclasses import dataclass, field
+
+XAR_MAGIC = b"xar!"
+HEADER_SIZE = 28
+HEADER_FORMAT = ">4sHHQQI"
+MAX_TOC_SIZE = 4 * 1024 * 1024
+MAX_MEMBER_SIZE = 1024 * 1024
+
+# Distribution and PackageInfo are the only members we need to read to find
+# the version, and they are a few KB even in the largest Office installers
+METADATA_NAMES = ("Distribution", "PackageInfo")
+
+
+class XarError(Exception):
+    pass
+
+
+@dataclass
+class XarHeader:
+    header_size: int
+    version: int
+    toc_length_compressed: int
+    toc_length_uncompressed: int
+    checksum_alg: int
+    
+    @property
+    def heap_offset(self):
+        return self.header_size + self.toc_length_compressed
+
+
+@dataclass
+class XarFile:
+    path: str
+    offset: int = None
+    length: int = None
+    size: int = None
+    encoding: str = None
+    checksum: str = None
+
+
+@dataclass
+class PackageInspection:
+    version: str = None
+    fingerprint: str = None
+    checksums: dict = field(default_factory=dict)
+
+
+def parse_header(data):
+    if len(data) < HEADER_SIZE:
+        raise XarError("Truncated XAR header")
+    
+    magic, header_size, version, toc_compressed, toc_uncompressed, alg = struct.unpack(
+        HEADER_FORMAT, data[:HEADER_SIZE]
+    )
+    if magic != XAR_MAGIC:
+        raise XarError("Not a XAR archive")
+    if toc_compressed > MAX_TOC_SIZE or toc_uncompressed > MAX_TOC_SIZE:
+        raise XarError("XAR table of contents is implausibly large")
+    
+    return XarHeader(header_size, version, toc_compressed, toc_uncompressed, alg)
+
+
+def parse_toc(compressed):
+    try:
+        root = ET.fromstring(zlib.decompress(compressed))
+    except (zlib.error, ET.ParseError) as e:
+        raise XarError(f"Unreadable XAR table of contents: {e}")
+    
+    toc = root.find("toc")
+    if toc is None:
+        raise XarError("XAR table of contents has no <toc>")
+    
+    files = []
+    _collect_files(toc, "", files)
+    return files
+
+
+def _collect_files(parent, prefix, files):
+    for elem in parent.findall("file"):
+        name = elem.findtext("name", default="")
+        path = f"{prefix}{name}"
+        data = elem.find("data")
+        if data is not None:
+            encoding = data.find("encoding")
+            checksum = data.find("extracted-checksum")
+            if checksum is None:
+                checksum = data.find("archived-checksum")
+            files.append(XarFile(
+                path=path,
+                offset=_int_text(data, "offset"),
+                length=_int_text(data, "length"),
+                size=_int_text(data, "size"),
+                encoding=encoding.get("style") if encoding is not None else None,
+                checksum=checksum.text.strip() if checksum is not None and checksum.text else None,
+            ))
+        _collect_files(elem, f"{path}/", files)
+
+
+def _int_text(elem, tag):
+    text = elem.findtext(tag)
+    try:
+        return int(text) if text else None
+    except ValueError:
+        return None
+
+
+def metadata_files(files):
+    return [
+        f for f in files
+        if f.path.rsplit("/", 1)[-1] in METADATA_NAMES
+        and f.offset is not None
+        and f.length
+        and f.length <= MAX_MEMBER_SIZE
+    ]
+
+
+def decode_member(xar_file, data):
+    encoding = xar_file.encoding or "application/octet-stream"
+    try:
+        if encoding == "application/x-gzip":
+            return zlib.decompress(data)
+        if encoding == "application/x-bzip2":
+            return bz2.decompress(data)
+    except (zlib.error, OSError, ValueError) as e:
+        raise XarError(f"Unreadable XAR member {xar_file.path}: {e}")
+    if encoding == "application/octet-stream":
+        return data
+    raise XarError(f"Unsupported XAR encoding {encoding} for {xar_file.path}")
+
+
+def find_version(documents, bundle_id):
+    # PackageInfo names the exact bundle; Distribution only knows product versions
+    fallback = None
+    for data in documents:
+        try:
+            root = ET.fromstring(data)
+        except ET.ParseError:
+            continue
+        
+        for bundle in root.iter("bundle"):
+            if bundle.get("id", "").lower() == bundle_id.lower():
+                version = bundle.get("CFBundleVersion") or bundle.get("CFBundleShortVersionString")
+                if version:
+                    return version
+        
+        if fallback:
+            continue
+        product = root.find("product")
+        if product is not None and product.get("version"):
+            fallback = product.get("version")
+            continue
+        for ref in root.iter("pkg-ref"):
+            if ref.get("version"):
+                fallback = ref.get("version")
+                break
+    
+    return fallback
+
+
+def fingerprint(files):
+    checksums = {f.path: f.checksum for f in files if f.checksum}
+    if not checksums:
+        return None, checksums
+    
+    digest = hashlib.sha256()
+    for path in sorted(checksums):
+        digest.update(f"{path}:{checksums[path]}\n".encode())
+    return digest.hexdigest(), checksums
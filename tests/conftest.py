@@ -1,15 +1,192 @@
+from types import SimpleNamespace
+
 import pytest
 
 
 @pytest.fixture
-def mock_env(monkeypatch):
+def mock_env(monkeypatch, tmp_path):
     monkeypatch.setenv("AZURE_STORAGE_CONNECTION_STRING", 
                       "DefaultEndpointsProtocol=https;AccountName=test;AccountKey=key;EndpointSuffix=core.windows.net")
     monkeypatch.setenv("AZURE_CONTAINER_NAME", "test-container")
     monkeypatch.setenv("UPDATE_CHANNEL", "current")
     monkeypatch.setenv("LAG_DAYS", "14")
+    # Keeps markers, manifests and downloads out of the working tree
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
 
 
 @pytest.fixture
 def temp_manifest(tmp_path):
     return tmp_path / "manifest.json"
+
+
+class FakeBlobClient:
+    def __init__(self, container, name):
+        self.container = container
+        self.name = name
+        self.url = f"https://test.blob.core.windows.net/test-container/{name}"
+    
+    def upload_blob(self, data, overwrite=True, content_settings=None, metadata=None, **kwargs):
+        self.container.calls.append(("upload_blob", self.name))
+        self.container.blobs[self.name] = data.read() if hasattr(data, "read") else bytes(data)
+        self.container.metadata[self.name] = metadata or {}
+    
+    def stage_block(self, block_id, data, **kwargs):
+        self.container.calls.append(("stage_block", self.name))
+        if block_id in self.container.failing_blocks:
+            raise ConnectionError(f"dropped block {block_id}")
+        self.container.uncommitted.setdefault(self.name, {})[block_id] = bytes(data)
+    
+    def commit_block_list(self, block_list, content_settings=None, metadata=None, **kwargs):
+        self.container.calls.append(("commit_block_list", self.name))
+        staged = self.container.uncommitted.pop(self.name, {})
+        self.container.blobs[self.name] = b"".join(staged[block_id] for block_id in block_list)
+        self.container.metadata[self.name] = metadata or {}
+    
+    def get_block_list(self, block_list_type="committed", **kwargs):
+        staged = self.container.uncommitted.get(self.name, {})
+        return [], [SimpleNamespace(id=block_id, size=len(data)) for block_id, data in staged.items()]
+    
+    def set_blob_metadata(self, metadata=None, **kwargs):
+        self.container.metadata[self.name] = metadata or {}
+    
+    def stage_block_from_url(self, block_id, source_url, source_offset=0, source_length=None, **kwargs):
+        data = self.container.remote[source_url][source_offset:source_offset + source_length]
+        self.container.uncommitted.setdefault(self.name, {})[block_id] = data
+    
+    def download_blob(self, offset=0, length=None, **kwargs):
+        data = self.container.blobs[self.name]
+        end = len(data) if length is None else offset + length
+        return FakeDownload(data[offset:end])
+    
+    def get_blob_properties(self):
+        from azure.core.exceptions import ResourceNotFoundError
+        
+        if self.name not in self.container.blobs:
+            raise ResourceNotFoundError("not found")
+        # Copies listed in copy_statuses report each status in turn, then stay on the last
+        statuses = self.container.copy_statuses.get(self.name) or ["success"]
+        status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        return SimpleNamespace(
+            size=len(self.container.blobs[self.name]),
+            metadata=self.container.metadata.get(self.name, {}),
+            copy=SimpleNamespace(status=status),
+        )
+    
+    def exists(self):
+        self.container.calls.append(("exists", self.name))
+        return self.name in self.container.blobs
+    
+    def delete_blob(self):
+        from azure.core.exceptions import ResourceNotFoundError
+        
+        self.container.calls.append(("delete_blob", self.name))
+        if self.name not in self.container.blobs:
+            raise ResourceNotFoundError("not found")
+        del self.container.blobs[self.name]
+    
+    def start_copy_from_url(self, source_url, **kwargs):
+        self.container.calls.append(("start_copy_from_url", self.name))
+        source = source_url.rsplit("/test-container/", 1)[1]
+        self.container.blobs[self.name] = self.container.blobs[source]
+        self.container.metadata[self.name] = dict(self.container.metadata.get(source, {}))
+        pending = self.name in self.container.copy_statuses
+        return {"copy_status": "pending" if pending else "success"}
+
+
+class FakeDownload:
+    def __init__(self, data):
+        self.data = data
+    
+    def chunks(self):
+        return iter([self.data])
+    
+    def readall(self):
+        return self.data
+
+
+class FakeContainer:
+    def __init__(self):
+        self.blobs = {}
+        self.uncommitted = {}
+        self.remote = {}
+        self.metadata = {}
+        self.copy_statuses = {}
+        self.failing_blocks = set()
+        self.calls = []
+    
+    def get_blob_client(self, name):
+        return FakeBlobClient(self, name)
+    
+    def delete_blobs(self, *names, raise_on_any_failure=True, **kwargs):
+        self.calls.append(("delete_blobs", names))
+        responses = []
+        for name in names:
+            found = self.blobs.pop(name, None) is not None
+            responses.append(SimpleNamespace(status_code=202 if found else 404))
+        return responses
+    
+    def list_blobs(self, name_starts_with=None, include=None, **kwargs):
+        self.calls.append(("list_blobs", name_starts_with))
+        return [
+            SimpleNamespace(name=name, size=len(data), metadata=self.metadata.get(name), etag=None)
+            for name, data in sorted(self.blobs.items())
+            if name.startswith(name_starts_with or "")
+        ]
+
+
+class AsyncFakeBlobClient:
+    # Same behaviour as FakeBlobClient, with the methods as coroutines like azure.storage.blob.aio
+    def __init__(self, blob):
+        self.blob = blob
+    
+    def __getattr__(self, name):
+        attr = getattr(self.blob, name)
+        if not callable(attr):
+            return attr
+        
+        async def call(*args, **kwargs):
+            return attr(*args, **kwargs)
+        return call
+
+
+class AsyncFakeContainer(FakeContainer):
+    def get_blob_client(self, name):
+        return AsyncFakeBlobClient(FakeBlobClient(self, name))
+    
+    async def exists(self):
+        return True
+    
+    async def create_container(self, **kwargs):
+        pass
+    
+    async def delete_blobs(self, *names, **kwargs):
+        responses = super().delete_blobs(*names, **kwargs)
+        
+        async def iterate():
+            for response in responses:
+                yield response
+        return iterate()
+    
+    async def _list(self, **kwargs):
+        for blob in super().list_blobs(**kwargs):
+            yield blob
+    
+    def list_blobs(self, **kwargs):
+        return self._list(**kwargs)
+
+
+@pytest.fixture
+def fake_async_storage(mock_env):
+    from src.async_azure_storage import AsyncAzureStorageClient
+    from src.config import Settings
+    
+    return AsyncAzureStorageClient(Settings(), container=AsyncFakeContainer())
+
+
+@pytest.fixture
+def fake_storage(mock_env, monkeypatch):
+    from src.azure_storage import AzureStorageClient
+    from src.config import Settings
+    
+    monkeypatch.setattr(AzureStorageClient, "_ensure_container_exists", lambda self: None)
+    return AzureStorageClient(Settings(), container=FakeContainer())
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+
+def test_upload_and_promote_match_sync_client(fake_storage, fake_async_storage, tmp_path):
+    package = tmp_path / "word.pkg"
+    package.write_bytes(b"word build 2" * 1000)
+    for storage in (fake_storage, fake_async_storage):
+        storage.container.blobs["live/Word.pkg"] = b"word build 1"
+        storage.container.metadata["live/Word.pkg"] = {"sha256": "old"}
+    
+    async def run():
+        uploaded = await fake_async_storage.upload_package(str(package), "staged", "Word.pkg")
+        promoted = await fake_async_storage.promote_packages(["Word.pkg"])
+        return uploaded, promoted
+    
+    assert asyncio.run(run()) == (True, {"Word.pkg": True})
+    assert fake_storage.upload_package(str(package), "staged", "Word.pkg")
+    assert fake_storage.promote_packages(["Word.pkg"]) == {"Word.pkg": True}
+    
+    assert fake_async_storage.container.blobs == fake_storage.container.blobs
+    assert fake_async_storage.container.metadata == fake_storage.container.metadata
+
+
+def test_identical_upload_is_skipped(fake_async_storage, tmp_path):
+    package = tmp_path / "word.pkg"
+    package.write_bytes(b"word build 2")
+    
+    async def run():
+        first = await fake_async_storage.upload_package(str(package), "staged", "Word.pkg")
+        second = await fake_async_storage.upload_package(str(package), "staged", "Word.pkg")
+        return first, second
+    
+    assert asyncio.run(run()) == (True, True)
+    commits = [call for call in fake_async_storage.container.calls if call[0] == "commit_block_list"]
+    assert len(commits) == 1
+
+
+def test_stale_container_marker_is_dropped_and_container_recreated(fake_async_storage):
+    from azure.core.exceptions import ResourceNotFoundError
+    
+    container = fake_async_storage.container
+    fake_async_storage._remember_container(container)
+    created = []
+    listing = container.list_blobs
+    
+    async def create_container(**kwargs):
+        created.append(True)
+    
+    async def exists():
+        return bool(created)
+    
+    def list_blobs(**kwargs):
+        if not created:
+            error = ResourceNotFoundError("The specified container does not exist.")
+            error.error_code = "ContainerNotFound"
+            raise error
+        return listing(**kwargs)
+    container.create_container, container.exists, container.list_blobs = (
+        create_container, exists, list_blobs
+    )
+    
+    assert not asyncio.run(fake_async_storage.blob_exists("staged", "word.pkg"))
+    assert created == [True]
+    assert fake_async_storage._container_known(container)
+    assert fake_async_storage.inventory.tracks("staged/word.pkg")
+
+
+def test_required_promotion_without_staged_keeps_previous(fake_async_storage):
+    container = fake_async_storage.container
+    container.blobs["live/word.pkg"] = b"v1"
+    container.blobs["previous/word.pkg"] = b"v0"
+    
+    assert not asyncio.run(fake_async_storage.promote_package("word.pkg"))
+    assert container.blobs["previous/word.pkg"] == b"v0"
+
+
+def test_unreferenced_objects_are_removed(fake_async_storage):
+    fake_async_storage.settings.storage_layout = "objects"
+    container = fake_async_storage.container
+    for sha in ("a" * 64, "b" * 64):
+        container.blobs[f"objects/{sha}.pkg"] = sha.encode()
+    container.blobs["live/word.json"] = b"{}"
+    container.metadata["live/word.json"] = {"sha256": "a" * 64}
+    
+    assert asyncio.run(fake_async_storage.remove_unreferenced_objects())
+    assert sorted(name for name in container.blobs if name.startswith("objects/")) == [
+        f"objects/{'a' * 64}.pkg"
+    ]
@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+from src.async_mau_client import AsyncMAUClient  # noqa: E402
+from src.config import APPS, Settings  # noqa: E402
+
+PAYLOAD = bytes(range(256)) * 64
+
+
+def manifest_xml(url):
+    return f"""<?xml version="1.0"?>
+<update>
+  <Version>16.80.123</Version>
+  <FullUpdaterLocation>{url}</FullUpdaterLocation>
+  <FullUpdaterSHA256>{hashlib.sha256(PAYLOAD).hexdigest()}</FullUpdaterSHA256>
+  <FullUpdaterSize>{len(PAYLOAD)}</FullUpdaterSize>
+</update>
+""".encode()
+
+
+async def serve(tmp_path, ranges):
+    package = tmp_path / "served.pkg"
+    package.write_bytes(PAYLOAD)
+    
+    async def manifest(request):
+        ranges.append(None)
+        return web.Response(body=manifest_xml(str(request.url.with_path("/word.pkg"))))
+    
+    async def download(request):
+        ranges.append(request.headers.get("Range"))
+        return web.FileResponse(package)
+    
+    app = web.Application()
+    app.router.add_get("/manifest.xml", manifest)
+    app.router.add_get("/word.pkg", download)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+@pytest.fixture
+def settings(mock_env, monkeypatch, tmp_path):
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("DOWNLOAD_SEGMENTS", "4")
+    settings = Settings()
+    # Small enough that the test payload splits into several segments
+    settings.download_segment_min_bytes = 2048
+    return settings
+
+
+def test_fetches_manifest_and_downloads_in_segments(settings, tmp_path):
+    ranges = []
+    
+    async def run():
+        server = await serve(tmp_path, ranges)
+        try:
+            async with AsyncMAUClient(settings) as mau:
+                mau._manifest_url = lambda app: str(server.make_url("/manifest.xml"))
+                info = await mau.get_update_info(APPS["word"])
+                dest = tmp_path / "word.pkg"
+                downloaded = await mau.download_package(
+                    info.download_url, dest, info.sha256, info.file_size
+                )
+                return info, downloaded, dest.read_bytes()
+        finally:
+            await server.close()
+    
+    info, downloaded, data = asyncio.run(run())
+    
+    assert info.version == "16.80.123"
+    assert downloaded
+    assert data == PAYLOAD
+    assert len([r for r in ranges if r]) == 4
+
+
+def test_hash_mismatch_fails_download(settings, tmp_path):
+    async def run():
+        server = await serve(tmp_path, [])
+        try:
+            async with AsyncMAUClient(settings) as mau:
+                return await mau.download_package(
+                    str(server.make_url("/word.pkg")), tmp_path / "word.pkg", "0" * 64
+                )
+        finally:
+            await server.close()
+    
+    assert asyncio.run(run()) is False
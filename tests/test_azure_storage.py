@@ -0,0 +1,326 @@
+import hashlib
+import json
+
+from azure.core.exceptions import ResourceNotFoundError
+
+from src import azure_storage
+from src.config import Settings
+from tests.conftest import FakeContainer
+
+
+def test_stage_stream_commits_on_hash_match(fake_storage, monkeypatch):
+    monkeypatch.setattr(azure_storage, "STREAM_BLOCK_SIZE", 4)
+    payload = b"0123456789"
+    
+    staged = fake_storage.stage_stream([payload[:3], payload[3:]], "staged", "word.pkg")
+    
+    assert staged.size == len(payload)
+    assert len(staged.block_ids) == 3
+    assert not fake_storage.blob_exists("staged", "word.pkg")
+    
+    assert fake_storage.commit_staged(staged, hashlib.sha256(payload).hexdigest())
+    assert fake_storage.container.blobs["staged/word.pkg"] == payload
+
+
+def test_stage_stream_mismatch_never_becomes_visible(fake_storage):
+    fake_storage.container.blobs["staged/word.pkg"] = b"old"
+    
+    staged = fake_storage.stage_stream([b"new bytes"], "staged", "word.pkg")
+    
+    assert not fake_storage.commit_staged(staged, "0" * 64)
+    assert fake_storage.container.blobs["staged/word.pkg"] == b"old"
+
+
+def test_stage_from_url_verifies_full_hash(fake_storage, monkeypatch):
+    monkeypatch.setattr(azure_storage, "COPY_BLOCK_SIZE", 4)
+    payload = b"server side bytes"
+    url = "https://cdn.example.com/word.pkg"
+    fake_storage.container.remote[url] = payload
+    
+    assert fake_storage.stage_from_url(
+        url, "staged", "word.pkg", hashlib.sha256(payload).hexdigest(), len(payload)
+    )
+    assert fake_storage.container.blobs["staged/word.pkg"] == payload
+    assert fake_storage.container.metadata["staged/word.pkg"]["sha256"] == hashlib.sha256(payload).hexdigest()
+    assert "staged/word.pkg.copying" not in fake_storage.container.blobs
+
+
+def test_stage_from_url_keeps_staged_blob_on_mismatch(fake_storage):
+    url = "https://cdn.example.com/word.pkg"
+    fake_storage.container.remote[url] = b"tampered"
+    fake_storage.container.blobs["staged/word.pkg"] = b"old"
+    
+    assert not fake_storage.stage_from_url(url, "staged", "word.pkg", "0" * 64, 8)
+    assert fake_storage.container.blobs["staged/word.pkg"] == b"old"
+    assert "staged/word.pkg.copying" not in fake_storage.container.blobs
+
+
+def test_stage_from_url_sampled_verification(fake_storage, monkeypatch):
+    monkeypatch.setattr(azure_storage, "SAMPLE_SIZE", 3)
+    fake_storage.settings.server_copy_verify = "sample"
+    payload = bytes(range(64))
+    url = "https://cdn.example.com/word.pkg"
+    fake_storage.container.remote[url] = payload
+    reads = []
+    
+    def read_source(offset, length):
+        reads.append(offset)
+        return payload[offset:offset + length]
+    
+    assert fake_storage.stage_from_url(url, "staged", "word.pkg", None, len(payload), read_source)
+    assert 0 in reads and len(payload) - 3 in reads
+    assert len(reads) == fake_storage.settings.server_copy_samples
+
+
+def test_required_promotion_without_staged_keeps_previous(fake_storage):
+    container = fake_storage.container
+    container.blobs["live/word.pkg"] = b"v1"
+    container.blobs["previous/word.pkg"] = b"v0"
+    
+    assert not fake_storage.promote_package("word.pkg")
+    assert container.blobs["previous/word.pkg"] == b"v0"
+    assert container.blobs["live/word.pkg"] == b"v1"
+
+
+def test_optional_promotion_archives_live_without_staged(fake_storage):
+    fake_storage.container.blobs["live/word-delta.pkg"] = b"old delta"
+    
+    assert fake_storage.promote_package("word-delta.pkg", required=False)
+    assert fake_storage.container.blobs["previous/word-delta.pkg"] == b"old delta"
+    assert "live/word-delta.pkg" not in fake_storage.container.blobs
+
+
+def test_batch_promotion_lists_once_and_deletes_in_one_batch(fake_storage):
+    container = fake_storage.container
+    apps = [f"app{i}.pkg" for i in range(12)]
+    for name in apps:
+        container.blobs[f"live/{name}"] = b"old"
+        container.blobs[f"staged/{name}"] = b"new"
+    
+    results = fake_storage.promote_packages(apps)
+    
+    ops = [op for op, _ in container.calls]
+    assert all(results.values())
+    assert ops.count("list_blobs") == 1
+    assert ops.count("delete_blobs") == 1
+    assert "exists" not in ops
+    assert len(ops) == 2 + 2 * len(apps)
+    assert container.blobs["previous/app0.pkg"] == b"old"
+    assert container.blobs["live/app0.pkg"] == b"new"
+    assert not any(name.startswith("staged/") for name in container.blobs)
+
+
+def test_batch_promotion_keeps_source_of_failed_copy(fake_storage, monkeypatch):
+    monkeypatch.setattr(azure_storage.time, "sleep", lambda seconds: None)
+    container = fake_storage.container
+    for name in ("word.pkg", "excel.pkg"):
+        container.blobs[f"staged/{name}"] = b"new"
+    container.copy_statuses["live/word.pkg"] = ["pending", "pending", "success"]
+    container.copy_statuses["live/excel.pkg"] = ["pending", "failed"]
+    
+    results = fake_storage.promote_packages(["word.pkg", "excel.pkg"])
+    
+    assert results == {"word.pkg": True, "excel.pkg": False}
+    assert "staged/word.pkg" not in container.blobs
+    assert container.blobs["staged/excel.pkg"] == b"new"
+
+
+def test_objects_layout_stores_identical_bytes_once(fake_storage, tmp_path):
+    fake_storage.settings.storage_layout = "objects"
+    container = fake_storage.container
+    package = tmp_path / "word.pkg"
+    package.write_bytes(b"same bytes")
+    sha = hashlib.sha256(b"same bytes").hexdigest()
+    
+    assert fake_storage.upload_package(str(package), "staged", "word.pkg", sha256=sha)
+    assert fake_storage.upload_package(str(package), "staged", "excel.pkg")
+    
+    uploads = [name for op, name in container.calls if op == "commit_block_list"]
+    assert uploads.count(f"objects/{sha}.pkg") == 1
+    assert json.loads(container.blobs["staged/excel.json"])["object"] == f"objects/{sha}.pkg"
+    
+    assert fake_storage.promote_package("word.pkg")
+    assert json.loads(container.blobs["live/word.json"])["sha256"] == sha
+    assert "staged/word.json" not in container.blobs
+    assert container.blobs[f"objects/{sha}.pkg"] == b"same bytes"
+
+
+def test_objects_layout_moves_unhashed_stream_to_its_object(fake_storage):
+    fake_storage.settings.storage_layout = "objects"
+    container = fake_storage.container
+    sha = hashlib.sha256(b"streamed").hexdigest()
+    
+    staged = fake_storage.stage_stream([b"streamed"], "staged", "word.pkg")
+    
+    assert fake_storage.commit_staged(staged, sha)
+    assert container.blobs[f"objects/{sha}.pkg"] == b"streamed"
+    assert "staged/word.pkg" not in container.blobs
+    assert json.loads(container.blobs["staged/word.json"])["size"] == len(b"streamed")
+
+
+def test_upload_skipped_when_destination_holds_same_bytes(fake_storage, tmp_path):
+    container = fake_storage.container
+    package = tmp_path / "word.pkg"
+    package.write_bytes(b"package")
+    sha = hashlib.sha256(b"package").hexdigest()
+    
+    assert fake_storage.upload_package(str(package), "staged", "word.pkg", sha256=sha)
+    assert container.metadata["staged/word.pkg"] == {"sha256": sha, "size": "7"}
+    assert fake_storage.upload_package(str(package), "staged", "word.pkg", sha256=sha)
+    
+    assert [op for op, _ in container.calls].count("commit_block_list") == 1
+
+
+def test_upload_copies_identical_blob_from_another_tier(fake_storage, tmp_path):
+    container = fake_storage.container
+    sha = hashlib.sha256(b"package").hexdigest()
+    container.blobs["live/word.pkg"] = b"package"
+    container.metadata["live/word.pkg"] = {"sha256": sha, "size": "7"}
+    package = tmp_path / "word.pkg"
+    package.write_bytes(b"package")
+    
+    assert fake_storage.upload_package(str(package), "staged", "word.pkg", sha256=sha)
+    
+    ops = [op for op, _ in container.calls]
+    assert "stage_block" not in ops
+    assert "start_copy_from_url" in ops
+    assert container.blobs["staged/word.pkg"] == b"package"
+
+
+def test_interrupted_upload_resumes_missing_blocks(fake_storage, tmp_path):
+    fake_storage.settings.upload_block_size = 4
+    container = fake_storage.container
+    payload = b"0123456789abcdef"
+    sha = hashlib.sha256(payload).hexdigest()
+    package = tmp_path / "word.pkg"
+    package.write_bytes(payload)
+    container.failing_blocks = {f"{sha[:24]}-{4:010d}-000002"}
+    
+    assert not fake_storage.upload_package(str(package), "staged", "word.pkg", sha256=sha)
+    assert "staged/word.pkg" not in container.blobs
+    
+    container.failing_blocks = set()
+    container.calls.clear()
+    assert fake_storage.upload_package(str(package), "staged", "word.pkg", sha256=sha)
+    
+    assert [op for op, _ in container.calls].count("stage_block") == 1
+    assert container.blobs["staged/word.pkg"] == payload
+
+
+def test_channel_tiers_share_one_listing_and_copy_identical_bytes(fake_storage):
+    container = fake_storage.container
+    sha = hashlib.sha256(b"package").hexdigest()
+    container.blobs["staged/word.pkg"] = b"package"
+    container.metadata["staged/word.pkg"] = {"sha256": sha, "size": "7"}
+    preview = fake_storage.for_channel("preview")
+    
+    assert fake_storage.for_channel("current") is fake_storage
+    assert preview.stage_identical("staged", "word.pkg", sha, 7)
+    assert preview.promote_packages(["word.pkg"]) == {"word.pkg": True}
+    
+    assert container.blobs["channels/preview/live/word.pkg"] == b"package"
+    assert "staged/word.pkg" in container.blobs
+    assert [op for op, _ in container.calls].count("list_blobs") == 1
+
+
+class ProbedContainer(FakeContainer):
+    def exists(self):
+        self.calls.append(("exists", None))
+        return False
+    
+    def create_container(self, **kwargs):
+        self.calls.append(("create_container", None))
+
+
+def test_container_probe_waits_for_first_use_and_is_cached(mock_env, monkeypatch, tmp_path):
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path))
+    first = ProbedContainer()
+    client = azure_storage.AzureStorageClient(Settings(), container=first)
+    assert first.calls == []
+    
+    client.delete_blob("staged", "word.pkg")
+    client.for_channel("preview").delete_blob("staged", "word.pkg")
+    assert [op for op, _ in first.calls].count("exists") == 1
+    assert ("create_container", None) in first.calls
+    
+    # A later run finds the marker and goes straight to work
+    second = ProbedContainer()
+    azure_storage.AzureStorageClient(Settings(), container=second).delete_blob("staged", "word.pkg")
+    assert not {"exists", "create_container"} & {op for op, _ in second.calls}
+
+
+class DeletedContainer(ProbedContainer):
+    # The container went away after an earlier run left its marker
+    def __init__(self):
+        super().__init__()
+        self.created = False
+    
+    def create_container(self, **kwargs):
+        super().create_container(**kwargs)
+        self.created = True
+    
+    def list_blobs(self, **kwargs):
+        if not self.created:
+            error = ResourceNotFoundError("The specified container does not exist.")
+            error.error_code = "ContainerNotFound"
+            raise error
+        return super().list_blobs(**kwargs)
+
+
+def test_stale_container_marker_is_dropped_and_container_recreated(mock_env, tmp_path):
+    azure_storage.AzureStorageClient(Settings(), container=ProbedContainer()).delete_blob("staged", "word.pkg")
+    container = DeletedContainer()
+    client = azure_storage.AzureStorageClient(Settings(), container=container)
+    
+    assert not client.blob_exists("staged", "word.pkg")
+    assert ("create_container", None) in container.calls
+    assert client.inventory.loaded and client.inventory.tracks("staged/word.pkg")
+
+
+def test_every_upload_path_uses_one_block_id_length(fake_storage, monkeypatch):
+    from tests.conftest import FakeBlobClient
+    
+    monkeypatch.setattr(azure_storage, "STREAM_BLOCK_SIZE", 4)
+    monkeypatch.setattr(azure_storage, "COPY_BLOCK_SIZE", 4)
+    payload = b"0123456789"
+    url = "https://cdn.example.com/word.pkg"
+    fake_storage.container.remote[url] = payload
+    copied = []
+    stage_from_url = FakeBlobClient.stage_block_from_url
+    
+    def record(self, block_id, *args, **kwargs):
+        copied.append(block_id)
+        return stage_from_url(self, block_id, *args, **kwargs)
+    monkeypatch.setattr(FakeBlobClient, "stage_block_from_url", record)
+    
+    planned = [block_id for block_id, _, _ in fake_storage._block_plan("a" * 64, 1 << 20)]
+    streamed = fake_storage.stage_stream([payload], "staged", "word.pkg").block_ids
+    assert fake_storage.stage_from_url(
+        url, "staged", "excel.pkg", hashlib.sha256(payload).hexdigest(), len(payload)
+    )
+    
+    assert {len(block_id) for block_id in planned + streamed + copied} == {len(planned[0])}
+
+
+def test_objects_no_pointer_names_are_removed_after_promotion(fake_storage):
+    fake_storage.settings.storage_layout = "objects"
+    container = fake_storage.container
+    
+    def place(pointer_path, sha, tagged=True):
+        container.blobs[f"objects/{sha}.pkg"] = sha.encode()
+        container.metadata[f"objects/{sha}.pkg"] = {"sha256": sha}
+        container.blobs[pointer_path] = json.dumps({"sha256": sha}).encode()
+        container.metadata[pointer_path] = {"sha256": sha} if tagged else {}
+    place("previous/word.json", "a" * 64)
+    place("live/word.json", "b" * 64)
+    place("staged/word.json", "c" * 64)
+    # Another channel still serves the oldest build, from an untagged pointer
+    place("channels/preview/live/excel.json", "d" * 64, tagged=False)
+    container.blobs["staged/excel.json.rollback"] = json.dumps({"sha256": "d" * 64}).encode()
+    container.blobs[f"objects/{'e' * 64}.pkg"] = b"orphan"
+    
+    assert fake_storage.promote_packages(["word.pkg"]) == {"word.pkg": True}
+    assert fake_storage.remove_unreferenced_objects()
+    
+    objects = sorted(name for name in container.blobs if name.startswith("objects/"))
+    assert objects == [f"objects/{c * 64}.pkg" for c in "bcd"]
@@ -0,0 +1,30 @@
+import json
+
+from benchmarks import run
+
+
+def test_offline_run_stages_and_promotes(tmp_path, capsys):
+    report_path = tmp_path / "report.json"
+    args = [
+        "--apps", "word,excel", "--size-mb", "0.25", "--failure-rate", "0.3",
+        "--workdir", str(tmp_path / "work"), "--output", str(report_path),
+    ]
+    assert run.main(args) == 0
+    
+    results = json.loads(report_path.read_text())["results"]
+    assert results["check"]["changed"] == 2
+    assert results["recheck"]["changed"] == 0
+    assert results["promote"]["changed"] == 2
+    assert all(phase["errors"] == 0 for phase in results.values())
+    assert results["check"]["peak_disk_bytes"] >= 2 * 256 * 1024
+    
+    # A run is never a regression against itself
+    capsys.readouterr()
+    assert run.main(args + ["--baseline", str(report_path)]) == 0
+
+
+def test_compare_flags_growth_beyond_tolerance():
+    baseline = {"results": {"check": {"seconds": 10, "peak_rss_bytes": 0, "peak_disk_bytes": 0}}}
+    report = {"results": {"check": {"seconds": 14, "peak_rss_bytes": 1, "peak_disk_bytes": 1}}}
+    assert run.compare(report, baseline, 0.5) == []
+    assert run.compare(report, baseline, 0.25) == ["check seconds: 14 vs baseline 10"]
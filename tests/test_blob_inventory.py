@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+from src.blob_inventory import BlobInventory
+
+
+class ListingContainer:
+    def __init__(self, blobs):
+        self.blobs = blobs
+        self.listings = 0
+    
+    def list_blobs(self, include=None, **kwargs):
+        self.listings += 1
+        return [
+            SimpleNamespace(name=name, size=size, metadata=metadata, etag='"e"')
+            for name, (size, metadata) in self.blobs.items()
+        ]
+
+
+class BrokenContainer:
+    def list_blobs(self, **kwargs):
+        raise RuntimeError("forbidden")
+
+
+def test_answers_from_a_single_listing():
+    container = ListingContainer({
+        "live/word.pkg": (10, {"sha256": "abc"}),
+        "other/notes.txt": (1, None),
+    })
+    inventory = BlobInventory(container)
+    
+    assert inventory.tracks("live/word.pkg")
+    assert inventory.size("live/word.pkg") == 10
+    assert inventory.sha256("live/word.pkg") == "abc"
+    assert not inventory.exists("staged/word.pkg")
+    assert not inventory.tracks("other/notes.txt")
+    assert container.listings == 1
+
+
+def test_updates_as_operations_complete():
+    inventory = BlobInventory(ListingContainer({"live/word.pkg": (10, {"sha256": "abc"})}))
+    inventory.tracks("live/word.pkg")
+    
+    inventory.copy("live/word.pkg", "previous/word.pkg")
+    inventory.remove("live/word.pkg")
+    inventory.record("staged/word.pkg", 12, "def")
+    
+    assert inventory.sha256("previous/word.pkg") == "abc"
+    assert not inventory.exists("live/word.pkg")
+    assert inventory.size("staged/word.pkg") == 12
+
+
+def test_listing_failure_falls_back_to_service():
+    inventory = BlobInventory(BrokenContainer())
+    
+    assert not inventory.tracks("live/word.pkg")
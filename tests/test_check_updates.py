@@ -0,0 +1,322 @@
+import asyncio
+import hashlib
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from check_updates import check_for_updates, check_for_updates_async
+from src.config import APPS, Settings
+from src.manifest import ManifestManager
+from src.mau_client import DeltaInfo, UpdateInfo
+
+
+class FakeMAU:
+    def get_update_info(self, app):
+        if app.app_id == "EDGE01":
+            return None
+        return UpdateInfo(
+            app_id=app.app_id,
+            version="1.0",
+            download_url=f"https://example.com/{app.app_id}.pkg",
+            sha256=f"{app.app_id}-sha",
+        )
+    
+    def cached_package(self, sha256):
+        return None
+    
+    def download_path(self, name):
+        with tempfile.NamedTemporaryFile(suffix=".pkg", delete=False) as tmp:
+            return Path(tmp.name)
+    
+    def download_package(self, url, dest, expected_sha=None, size=None):
+        with open(dest, "wb") as f:
+            f.write(url.encode())
+        return True
+    
+    def discard_download(self, path):
+        path.unlink(missing_ok=True)
+
+
+class FakeStorage:
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self.uploads = []
+        self.placed = []
+        self.held = set()
+    
+    def for_channel(self, channel):
+        if channel == "current":
+            return self
+        view = FakeStorage(f"{channel}/")
+        view.uploads, view.placed, view.held = self.uploads, self.placed, self.held
+        return view
+    
+    def upload_package(self, local_path, folder, filename, overwrite=True, sha256=None):
+        self.uploads.append(f"{self.prefix}{folder}/{filename}")
+        self.held.add(sha256)
+        return True
+    
+    def stage_identical(self, folder, filename, sha256, size=None):
+        if sha256 not in self.held:
+            return False
+        self.placed.append(f"{self.prefix}{folder}/{filename}")
+        return True
+    
+    def tier_blob_name(self, filename):
+        return filename
+
+
+def test_concurrent_matches_serial(mock_env, tmp_path):
+    settings = Settings()
+    serial_mgr = ManifestManager(tmp_path / "serial.json")
+    parallel_mgr = ManifestManager(tmp_path / "parallel.json")
+    serial_storage = FakeStorage()
+    parallel_storage = FakeStorage()
+    
+    serial = check_for_updates(settings, serial_mgr, FakeMAU(), serial_storage)
+    parallel = check_for_updates(
+        settings, parallel_mgr, FakeMAU(), parallel_storage, jobs=4
+    )
+    
+    assert serial == parallel
+    assert serial == [key for key, cfg in APPS.items() if cfg.app_id != "EDGE01"]
+    assert sorted(serial_storage.uploads) == sorted(parallel_storage.uploads)
+    assert serial_mgr.manifest.apps.keys() == parallel_mgr.manifest.apps.keys()
+
+
+def test_dry_run_does_not_upload(mock_env, tmp_path):
+    storage = FakeStorage()
+    mgr = ManifestManager(tmp_path / "manifest.json")
+    
+    updated = check_for_updates(Settings(), mgr, FakeMAU(), storage, dry_run=True, jobs=3)
+    
+    assert len(updated) == len(APPS) - 1
+    assert storage.uploads == []
+    assert mgr.manifest.apps == {}
+
+
+def test_pipeline_matches_serial(mock_env, monkeypatch, tmp_path):
+    monkeypatch.setenv("PIPELINE_DEPTH", "1")
+    settings = Settings()
+    serial_mgr = ManifestManager(tmp_path / "serial.json")
+    pipeline_mgr = ManifestManager(tmp_path / "pipeline.json")
+    storage = FakeStorage()
+    
+    serial = check_for_updates(settings, serial_mgr, FakeMAU(), FakeStorage())
+    piped = check_for_updates(
+        settings, pipeline_mgr, FakeMAU(), storage, jobs=3, pipeline=True
+    )
+    
+    assert piped == serial
+    assert len(storage.uploads) == len(serial)
+    assert serial_mgr.manifest.apps.keys() == pipeline_mgr.manifest.apps.keys()
+
+
+class UnhashedMAU(FakeMAU):
+    def get_update_info(self, app):
+        info = super().get_update_info(app)
+        if info:
+            info.sha256 = None
+        return info
+    
+    def iter_package(self, url):
+        yield url.encode()
+
+
+def test_stream_mode_stages_without_temp_files(mock_env, monkeypatch, tmp_path, fake_storage):
+    monkeypatch.setenv("STAGING_MODE", "stream")
+    mgr = ManifestManager(tmp_path / "manifest.json")
+    
+    updated = check_for_updates(Settings(), mgr, UnhashedMAU(), fake_storage, jobs=2)
+    
+    assert updated == [key for key, cfg in APPS.items() if cfg.app_id != "EDGE01"]
+    assert fake_storage.container.blobs["staged/word.pkg"] == b"https://example.com/MSWD2019.pkg"
+    assert mgr.get_app_state("word").staged.sha256 == hashlib.sha256(
+        b"https://example.com/MSWD2019.pkg"
+    ).hexdigest()
+    
+    # A second run sees identical bytes and commits nothing new
+    assert check_for_updates(Settings(), mgr, UnhashedMAU(), fake_storage) == []
+
+
+class FWLinkMAU(UnhashedMAU):
+    def __init__(self):
+        self.downloads = 0
+    
+    def get_update_info(self, app):
+        info = super().get_update_info(app)
+        if info:
+            info.etag = f'"{app.app_id}"'
+        return info
+    
+    def download_package(self, url, dest, expected_sha=None, size=None):
+        self.downloads += 1
+        return super().download_package(url, dest, expected_sha, size)
+    
+    def compute_file_hash(self, filepath):
+        return hashlib.sha256(open(filepath, "rb").read()).hexdigest()
+
+
+def test_unchanged_fwlink_package_is_not_downloaded_again(mock_env, tmp_path):
+    mgr = ManifestManager(tmp_path / "manifest.json")
+    mau = FWLinkMAU()
+    
+    assert check_for_updates(Settings(), mgr, mau, FakeStorage())
+    first_run = mau.downloads
+    
+    assert check_for_updates(Settings(), mgr, mau, FakeStorage(), dry_run=True) == []
+    assert mau.downloads == first_run
+
+
+class DeltaMAU(FakeMAU):
+    def get_update_info(self, app):
+        info = super().get_update_info(app)
+        if info:
+            info.version = "2.0"
+            info.sha256 = f"{app.app_id}-sha-2"
+            info.deltas = {
+                "1.0": DeltaInfo("1.0", f"https://example.com/{app.app_id}-delta.pkg", "d-sha"),
+            }
+        return info
+
+
+def test_delta_staged_from_live_version(mock_env, tmp_path):
+    mgr = ManifestManager(tmp_path / "manifest.json")
+    check_for_updates(Settings(), mgr, FakeMAU(), FakeStorage())
+    mgr.promote_update("word")
+    storage = FakeStorage()
+    
+    check_for_updates(Settings(), mgr, DeltaMAU(), storage)
+    mgr.save()
+    reloaded = ManifestManager(tmp_path / "manifest.json")
+    
+    assert "staged/word-delta.pkg" in storage.uploads
+    assert "staged/excel-delta.pkg" not in storage.uploads
+    assert reloaded.get_app_state("word").staged.delta.from_version == "1.0"
+    assert reloaded.get_app_state("excel").staged.delta is None
+
+
+class AsyncFakeMAU(FakeMAU):
+    async def get_update_info(self, app):
+        return FakeMAU.get_update_info(self, app)
+    
+    async def download_package(self, url, dest, expected_sha=None, size=None):
+        return FakeMAU.download_package(self, url, dest, expected_sha, size)
+
+
+class AsyncFakeStorage(FakeStorage):
+    def for_channel(self, channel):
+        return self
+    
+    async def upload_package(self, local_path, folder, filename, overwrite=True, sha256=None):
+        return FakeStorage.upload_package(self, local_path, folder, filename, overwrite, sha256)
+    
+    async def stage_identical(self, folder, filename, sha256, size=None):
+        return FakeStorage.stage_identical(self, folder, filename, sha256, size)
+
+
+def test_async_matches_serial(mock_env, tmp_path):
+    settings = Settings()
+    serial_mgr = ManifestManager(tmp_path / "serial.json")
+    async_mgr = ManifestManager(tmp_path / "async.json")
+    serial_storage = FakeStorage()
+    async_storage = AsyncFakeStorage()
+    
+    serial = check_for_updates(settings, serial_mgr, FakeMAU(), serial_storage)
+    concurrent = asyncio.run(
+        check_for_updates_async(settings, async_mgr, AsyncFakeMAU(), async_storage)
+    )
+    
+    assert concurrent == serial
+    assert sorted(async_storage.uploads) == sorted(serial_storage.uploads)
+    assert async_mgr.manifest.apps.keys() == serial_mgr.manifest.apps.keys()
+
+
+def test_matrix_fetches_each_package_once(mock_env, monkeypatch, tmp_path):
+    monkeypatch.setenv("UPDATE_CHANNELS", "current,preview")
+    monkeypatch.setenv("UPDATE_LOCALES", "0409,0407")
+    storage = FakeStorage()
+    mgr = ManifestManager(tmp_path / "manifest.json")
+    
+    updated = check_for_updates(Settings(), mgr, FakeMAU(), storage, jobs=4)
+    
+    apps = [key for key, cfg in APPS.items() if cfg.app_id != "EDGE01"]
+    assert sorted(storage.uploads) == sorted(f"staged/{APPS[key].blob_name}" for key in apps)
+    assert len(storage.placed) == 3 * len(apps)
+    assert "preview/staged/word-0407.pkg" in storage.placed
+    assert "preview/word-0407" in updated and "word" in updated
+    assert mgr.for_channel("preview").get_app_state("excel").staged.sha256 == "XCEL2019-sha"
+
+
+def test_interrupted_run_is_not_uploaded_again(mock_env, tmp_path):
+    storage = FakeStorage()
+    check_for_updates(Settings(), ManifestManager(tmp_path / "manifest.json"), FakeMAU(), storage)
+    uploads = len(storage.uploads)
+    
+    # No save: the process died before the end of main
+    updated = check_for_updates(
+        Settings(), ManifestManager(tmp_path / "manifest.json"), FakeMAU(), storage
+    )
+    
+    assert updated == []
+    assert len(storage.uploads) == uploads
+
+
+def test_dry_run_needs_no_storage(mock_env, monkeypatch, tmp_path):
+    monkeypatch.setenv("UPDATE_CHANNELS", "current,preview")
+    mgr = ManifestManager(tmp_path / "manifest.json")
+    
+    updated = check_for_updates(Settings(), mgr, FakeMAU(), None, dry_run=True, jobs=2)
+    
+    assert "word" in updated and "preview/word" in updated
+    assert mgr.manifest.apps == {}
+
+
+class MixedMAU(UnhashedMAU):
+    # Word publishes a hash and size for server-copy; every other app streams
+    def __init__(self, container):
+        self.container = container
+    
+    def get_update_info(self, app):
+        info = super().get_update_info(app)
+        if info and app.app_id == "MSWD2019":
+            payload = info.download_url.encode()
+            self.container.remote[info.download_url] = payload
+            info.sha256 = hashlib.sha256(payload).hexdigest()
+            info.file_size = len(payload)
+        return info
+    
+    def fetch_range(self, url, offset, length):
+        return self.container.remote[url][offset:offset + length]
+
+
+def test_server_copy_and_stream_share_slots_without_deadlock(
+    mock_env, monkeypatch, tmp_path, fake_storage
+):
+    monkeypatch.setenv("STAGING_MODE", "server-copy")
+    monkeypatch.setenv("CDN_CONCURRENCY", "1")
+    monkeypatch.setenv("AZURE_CONCURRENCY", "1")
+    mgr = ManifestManager(tmp_path / "manifest.json")
+    results = []
+    
+    fake_storage.settings.server_copy_verify = "sample"
+    # Word pauses holding its Azure slot, long enough for a streaming app to take the CDN one
+    verify = fake_storage.verify_blob_samples
+    
+    def slow_verify(*args):
+        time.sleep(0.3)
+        return verify(*args)
+    monkeypatch.setattr(fake_storage, "verify_blob_samples", slow_verify)
+    
+    worker = threading.Thread(
+        target=lambda: results.append(check_for_updates(
+            Settings(), mgr, MixedMAU(fake_storage.container), fake_storage, jobs=2
+        )),
+        daemon=True,
+    )
+    worker.start()
+    worker.join(timeout=10)
+    
+    assert not worker.is_alive()
+    assert "word" in results[0] and "excel" in results[0]
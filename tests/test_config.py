@@ -52,3 +52,54 @@ def test_all_apps_present():
         assert cfg.fwlink
         assert cfg.bundle_id
         assert cfg.blob_name
+
+
+def test_settings_concurrency_defaults(mock_env):
+    settings = Settings()
+    
+    assert settings.cdn_concurrency >= 1
+    assert settings.azure_concurrency >= 1
+
+
+def test_settings_rejects_zero_concurrency(mock_env, monkeypatch):
+    monkeypatch.setenv("AZURE_CONCURRENCY", "0")
+    
+    with pytest.raises(ValueError, match="AZURE_CONCURRENCY"):
+        Settings()
+
+
+def test_settings_rejects_unknown_storage_layout(mock_env, monkeypatch):
+    monkeypatch.setenv("STORAGE_LAYOUT", "flat")
+    
+    with pytest.raises(ValueError, match="STORAGE_LAYOUT"):
+        Settings()
+
+
+def test_settings_channel_and_locale_matrix(mock_env, monkeypatch):
+    monkeypatch.setenv("UPDATE_CHANNELS", "preview, current, beta")
+    monkeypatch.setenv("UPDATE_LOCALES", "0409,0407")
+    settings = Settings()
+    
+    assert settings.channels == ["current", "preview", "beta"]
+    assert settings.locales == ["0409", "0407"]
+    assert settings.app_label("preview", "word") == "preview/word"
+    assert settings.app_label("current", "word") == "word"
+
+
+def test_settings_rejects_bad_locale(mock_env, monkeypatch):
+    monkeypatch.setenv("UPDATE_LOCALES", "en-GB")
+    
+    with pytest.raises(ValueError, match="UPDATE_LOCALES"):
+        Settings()
+
+
+def test_release_windows_wrap_past_sunday(mock_env, monkeypatch):
+    monkeypatch.setenv("WATCH_RELEASE_WINDOWS", "sat-mon 1-3, wed 15-23")
+    assert Settings().release_windows == [
+        (frozenset({5, 6, 0}), 1, 3),
+        (frozenset({2}), 15, 23),
+    ]
+    
+    monkeypatch.setenv("WATCH_RELEASE_WINDOWS", "tue 23-15")
+    with pytest.raises(ValueError, match="WATCH_RELEASE_WINDOWS"):
+        Settings()
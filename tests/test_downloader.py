@@ -0,0 +1,128 @@
+import hashlib
+import json
+import re
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from src import downloader
+from src.downloader import SegmentedDownloader, progress_path
+from src.telemetry import Telemetry, for_app
+
+PAYLOAD = bytes(range(256)) * 64
+
+
+class RangeResponse:
+    def __init__(self, status, body, headers=None, fail_after=None):
+        self.status_code = status
+        self.body = body
+        self.headers = headers or {}
+        self.fail_after = fail_after
+    
+    def raise_for_status(self):
+        pass
+    
+    def iter_content(self, chunk_size=1):
+        sent = 0
+        for i in range(0, len(self.body), 1000):
+            if self.fail_after is not None and sent >= self.fail_after:
+                raise requests.ConnectionError("dropped")
+            chunk = self.body[i:i + 1000]
+            sent += len(chunk)
+            yield chunk
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+
+class RangeSession:
+    def __init__(self, ranged=True, fail_after=None):
+        self.ranged = ranged
+        self.fail_after = fail_after
+        self.ranges = []
+    
+    def head(self, url, **kwargs):
+        headers = {"Content-Length": str(len(PAYLOAD)), "ETag": '"v1"'}
+        if self.ranged:
+            headers["Accept-Ranges"] = "bytes"
+        return SimpleNamespace(headers=headers, raise_for_status=lambda: None)
+    
+    def get(self, url, headers=None, **kwargs):
+        match = re.match(r"bytes=(\d+)-(\d+)", (headers or {}).get("Range", ""))
+        if not match:
+            return RangeResponse(200, PAYLOAD)
+        start, end = int(match.group(1)), int(match.group(2))
+        self.ranges.append((start, end))
+        fail_after, self.fail_after = self.fail_after, None
+        return RangeResponse(206, PAYLOAD[start:end + 1], fail_after=fail_after)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(downloader.time, "sleep", lambda _: None)
+
+
+def test_segmented_download_matches_payload(tmp_path):
+    session = RangeSession()
+    engine = SegmentedDownloader(session, segments=4, min_segment_size=1024)
+    dest = tmp_path / "word.pkg"
+    
+    computed = engine.download("https://example.com/word.pkg", dest)
+    
+    assert computed == hashlib.sha256(PAYLOAD).hexdigest()
+    assert dest.read_bytes() == PAYLOAD
+    assert len(session.ranges) == 4
+    assert not progress_path(dest).exists()
+
+
+def test_dropped_segment_resumes_from_last_byte(tmp_path):
+    session = RangeSession(fail_after=2000)
+    engine = SegmentedDownloader(session, segments=2, min_segment_size=1024)
+    dest = tmp_path / "word.pkg"
+    
+    assert engine.download("https://example.com/word.pkg", dest) == hashlib.sha256(PAYLOAD).hexdigest()
+    retried = [start for start, _ in session.ranges if start not in (0, len(PAYLOAD) // 2)]
+    assert retried == [2000] or retried == [len(PAYLOAD) // 2 + 2000]
+
+
+def test_segment_retries_are_charged_to_the_calling_app(tmp_path):
+    telemetry = Telemetry()
+    session = RangeSession(fail_after=2000)
+    engine = SegmentedDownloader(session, segments=2, min_segment_size=1024, telemetry=telemetry)
+    
+    with for_app("word"):
+        engine.download("https://example.com/word.pkg", tmp_path / "word.pkg")
+    
+    assert telemetry.report()["apps"]["word"]["download"]["retries"] == 1
+
+
+def test_resumes_from_progress_record(tmp_path):
+    dest = tmp_path / "word.pkg"
+    half = len(PAYLOAD) // 2
+    dest.write_bytes(PAYLOAD[:half] + b"\x00" * (len(PAYLOAD) - half))
+    progress_path(dest).write_text(json.dumps({
+        "url": "https://example.com/word.pkg",
+        "size": len(PAYLOAD),
+        "etag": '"v1"',
+        "segments": [[0, half - 1, half], [half, len(PAYLOAD) - 1, half]],
+    }))
+    session = RangeSession()
+    
+    engine = SegmentedDownloader(session, segments=2, min_segment_size=1024)
+    engine.download("https://example.com/word.pkg", dest)
+    
+    assert session.ranges == [(half, len(PAYLOAD) - 1)]
+    assert dest.read_bytes() == PAYLOAD
+
+
+def test_falls_back_to_single_stream_without_ranges(tmp_path):
+    session = RangeSession(ranged=False)
+    engine = SegmentedDownloader(session, segments=4, min_segment_size=1024)
+    dest = tmp_path / "word.pkg"
+    
+    assert engine.download("https://example.com/word.pkg", dest) == hashlib.sha256(PAYLOAD).hexdigest()
+    assert session.ranges == []
@@ -0,0 +1,33 @@
+import os
+
+from src.http_cache import HTTPCache
+
+
+def test_round_trip(tmp_path):
+    cache = HTTPCache(tmp_path)
+    cache.put("https://example.com/a.xml", {"version": "1"}, etag='"x"')
+    
+    entry = cache.get("https://example.com/a.xml")
+    
+    assert entry.data == {"version": "1"}
+    assert entry.conditional_headers() == {"If-None-Match": '"x"'}
+    assert not entry.is_fresh(0)
+    assert entry.is_fresh(60)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = HTTPCache(tmp_path, max_bytes=400)
+    cache.put("https://example.com/old.xml", {"pad": "x" * 100})
+    os.utime(cache._path("https://example.com/old.xml"), (0, 0))
+    cache.put("https://example.com/mid.xml", {"pad": "x" * 100})
+    cache.put("https://example.com/new.xml", {"pad": "x" * 100})
+    
+    assert cache.get("https://example.com/old.xml") is None
+    assert cache.get("https://example.com/new.xml") is not None
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = HTTPCache(tmp_path)
+    cache._path("https://example.com/a.xml").write_text("not json")
+    
+    assert cache.get("https://example.com/a.xml") is None
@@ -129,3 +129,94 @@ def test_ready_after_lag_period(temp_manifest):
     mgr.set_app_state("word", state)
     
     assert mgr.is_ready_for_promotion("word", 0)
+
+
+def test_unchanged_package_matched_by_etag(temp_manifest):
+    mgr = ManifestManager(temp_manifest)
+    
+    mgr.stage_update(
+        app_key="teams",
+        app_id="TEAMS21",
+        name="Microsoft Teams",
+        blob_name="teams.pkg",
+        version="unknown",
+        sha256="abc123",
+        download_url="https://example.com/teams.pkg",
+        file_size=100,
+        etag='"v1"',
+    )
+    mgr.save()
+    mgr = ManifestManager(temp_manifest)
+    
+    found = mgr.find_unchanged_package("teams", "https://example.com/teams.pkg", '"v1"', None, 100)
+    assert found.sha256 == "abc123"
+    assert not mgr.find_unchanged_package("teams", "https://example.com/teams.pkg", '"v2"')
+    assert not mgr.find_unchanged_package("teams", "https://example.com/other.pkg", '"v1"')
+
+
+def test_unchanged_package_needs_a_validator(temp_manifest):
+    mgr = ManifestManager(temp_manifest)
+    
+    mgr.stage_update(
+        app_key="teams",
+        app_id="TEAMS21",
+        name="Microsoft Teams",
+        blob_name="teams.pkg",
+        version="unknown",
+        sha256="abc123",
+        download_url="https://example.com/teams.pkg",
+    )
+    
+    assert not mgr.find_unchanged_package("teams", "https://example.com/teams.pkg")
+
+
+def test_unchanged_package_rejects_conflicting_fingerprint(temp_manifest):
+    mgr = ManifestManager(temp_manifest)
+    
+    mgr.stage_update(
+        app_key="teams",
+        app_id="TEAMS21",
+        name="Microsoft Teams",
+        blob_name="teams.pkg",
+        version="24295.606",
+        sha256="abc123",
+        download_url="https://example.com/teams.pkg",
+        etag='"v1"',
+        fingerprint="aaa",
+    )
+    
+    url = "https://example.com/teams.pkg"
+    assert mgr.find_unchanged_package("teams", url, '"v1"', fingerprint="aaa")
+    assert not mgr.find_unchanged_package("teams", url, '"v1"', fingerprint="bbb")
+
+
+def test_channels_are_tracked_separately(temp_manifest):
+    mgr = ManifestManager(temp_manifest)
+    preview = mgr.for_channel("preview")
+    preview.stage_update("word", "MSWD2019", "Microsoft Word", "word.pkg", "16.81", "def456", "url")
+    preview.save()
+    
+    loaded = ManifestManager(temp_manifest)
+    
+    assert loaded.get_app_state("word") is None
+    assert loaded.for_channel("preview").get_app_state("word").staged.sha256 == "def456"
+    assert loaded.for_channel("current") is loaded
+
+
+def test_unsaved_steps_are_replayed_from_journal(temp_manifest):
+    mgr = ManifestManager(temp_manifest)
+    mgr.stage_update("word", "MSWD2019", "Microsoft Word", "word.pkg", "16.80", "abc123", "url")
+    mgr.for_channel("preview").stage_update(
+        "word", "MSWD2019", "Microsoft Word", "word.pkg", "16.81", "def456", "url"
+    )
+    
+    recovered = ManifestManager(temp_manifest)
+    
+    assert recovered.recovered == 2
+    assert recovered.get_app_state("word").staged.sha256 == "abc123"
+    assert recovered.for_channel("preview").get_app_state("word").staged.version == "16.81"
+    
+    recovered.save()
+    
+    assert ManifestManager(temp_manifest).recovered == 0
+    assert not recovered.journal.path.exists()
@@ -0,0 +1,245 @@
+import hashlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from src.config import APPS, Settings
+from src.downloader import Probe, SegmentedDownloader
+from src.mau_client import MAUClient, parse_manifest_fields
+
+MANIFEST_XML = b"""<?xml version="1.0"?>
+<update>
+  <Version>16.80.123</Version>
+  <FullUpdaterLocation>https://example.com/word.pkg</FullUpdaterLocation>
+  <FullUpdaterSHA256>abc123</FullUpdaterSHA256>
+  <FullUpdaterSize>1024</FullUpdaterSize>
+</update>
+"""
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.headers = {}
+    
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append((url, headers or {}))
+        return self.responses.pop(0)
+
+
+def response(status=200, content=b"", headers=None):
+    def raise_for_status():
+        if status >= 400:
+            raise AssertionError(f"HTTP {status}")
+    
+    return SimpleNamespace(
+        status_code=status,
+        content=content,
+        headers=headers or {},
+        raise_for_status=raise_for_status,
+    )
+
+
+@pytest.fixture
+def cached_client(mock_env, monkeypatch, tmp_path):
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    return MAUClient(Settings())
+
+
+def test_parses_manifest(mock_env, monkeypatch):
+    monkeypatch.setenv("CACHE_DIR", "")
+    client = MAUClient(Settings())
+    client.session = FakeSession([response(content=MANIFEST_XML)])
+    
+    info = client.get_update_info(APPS["word"])
+    
+    assert info.version == "16.80.123"
+    assert info.download_url == "https://example.com/word.pkg"
+    assert info.sha256 == "abc123"
+    assert info.file_size == 1024
+
+
+def test_not_modified_returns_cached_info(cached_client):
+    cached_client.session = FakeSession([
+        response(content=MANIFEST_XML, headers={"ETag": '"v1"'}),
+        response(status=304),
+    ])
+    
+    first = cached_client.get_update_info(APPS["word"])
+    second = cached_client.get_update_info(APPS["word"])
+    
+    assert second == first
+    assert cached_client.session.requests[1][1] == {"If-None-Match": '"v1"'}
+
+
+def test_fresh_cache_skips_request(cached_client):
+    cached_client.cache.ttl = 3600
+    cached_client.session = FakeSession([response(content=MANIFEST_XML)])
+    
+    cached_client.get_update_info(APPS["word"])
+    info = cached_client.get_update_info(APPS["word"])
+    
+    assert info.version == "16.80.123"
+    assert len(cached_client.session.requests) == 1
+
+
+def test_parser_honours_tag_priority():
+    xml = b"""<update>
+      <Location>https://example.com/fallback.pkg</Location>
+      <history><Version>16.70</Version></history>
+      <CFBundleVersion>16.80.123</CFBundleVersion>
+      <FullUpdaterLocation>https://example.com/word.pkg</FullUpdaterLocation>
+      <Size>not-a-number</Size>
+    </update>"""
+    
+    fields = parse_manifest_fields(io.BytesIO(xml))
+    
+    assert fields["version"] == "16.80.123"
+    assert fields["download_url"] == "https://example.com/word.pkg"
+    assert fields["file_size"] is None
+    assert "sha256" not in fields
+
+
+def test_parser_takes_first_match_in_document_order():
+    xml = b"<update><a><Version>1.0</Version></a><Version>2.0</Version></update>"
+    
+    assert parse_manifest_fields(io.BytesIO(xml))["version"] == "1.0"
+
+
+def test_parser_accepts_extra_fields():
+    xml = b"<update><DeltaUpdaterLocation>https://example.com/d.pkg</DeltaUpdaterLocation></update>"
+    
+    fields = parse_manifest_fields(io.BytesIO(xml), {"delta": ("DeltaUpdaterLocation",)})
+    
+    assert fields == {"delta": "https://example.com/d.pkg"}
+
+
+def test_parses_delta_updaters(cached_client):
+    xml = b"""<update>
+      <DeltaUpdater>
+        <FromVersion>16.79</FromVersion>
+        <Location>https://example.com/word-16.79-delta.pkg</Location>
+        <SHA256>d79</SHA256>
+        <Size>64</Size>
+      </DeltaUpdater>
+      <Version>16.80</Version>
+      <FullUpdaterLocation>https://example.com/word.pkg</FullUpdaterLocation>
+      <DeltaUpdater><FromVersion>16.78</FromVersion></DeltaUpdater>
+    </update>"""
+    cached_client.cache.ttl = 3600
+    cached_client.session = FakeSession([response(content=xml)])
+    
+    info = cached_client.get_update_info(APPS["word"])
+    cached = cached_client.get_update_info(APPS["word"])
+    
+    assert info.sha256 is None
+    assert info.file_size is None
+    assert list(info.deltas) == ["16.79"]
+    assert info.delta_from("16.79").file_size == 64
+    assert info.delta_from(None) is None
+    assert cached == info
+
+
+class SlowDownloader:
+    def __init__(self, payload):
+        self.payload = payload
+        self.downloads = 0
+    
+    def probe(self, url, size_hint=None):
+        return Probe()
+    
+    def download(self, url, dest, size_hint=None, probe=None):
+        self.downloads += 1
+        time.sleep(0.05)
+        dest.write_bytes(self.payload)
+        return hashlib.sha256(self.payload).hexdigest()
+
+
+def test_identical_downloads_share_one_transfer(mock_env, monkeypatch, tmp_path):
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    client = MAUClient(Settings())
+    client.downloader = SlowDownloader(b"package")
+    sha = hashlib.sha256(b"package").hexdigest()
+    dests = [client.download_path(f"app{i}") for i in range(4)]
+    
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(
+            lambda dest: client.download_package("https://example.com/p.pkg", dest, sha), dests
+        ))
+    for dest in dests:
+        dest.unlink()
+    later = client.download_path("later")
+    
+    assert results == [True] * 4
+    assert client.download_package("https://example.com/p.pkg", later)
+    assert later.read_bytes() == b"package"
+    assert client.downloader.downloads == 1
+    
+    # The run's shared copies go when it ends
+    client.end_run()
+    assert not list(later.parent.glob(".flight-*"))
+
+
+def test_failed_transfer_is_not_shared(mock_env, monkeypatch, tmp_path):
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    client = MAUClient(Settings())
+    client.downloader = SlowDownloader(b"package")
+    
+    assert not client.download_package("https://example.com/p.pkg", tmp_path / "a.pkg", "0" * 64)
+    assert not client.download_package("https://example.com/p.pkg", tmp_path / "b.pkg", "0" * 64)
+    assert client.downloader.downloads == 2
+
+
+class WholeFileResponse:
+    status_code = 200
+    
+    def raise_for_status(self):
+        pass
+    
+    def iter_content(self, chunk_size=1):
+        yield b"x" * 4096
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+
+class IgnoresRangeSession:
+    # Advertises ranges, then answers every ranged GET with the whole file
+    def head(self, url, **kwargs):
+        headers = {"Content-Length": "4096", "Accept-Ranges": "bytes", "ETag": '"v1"'}
+        return SimpleNamespace(headers=headers, raise_for_status=lambda: None)
+    
+    def get(self, url, **kwargs):
+        return WholeFileResponse()
+
+
+def test_range_answered_with_200_fails_the_download(mock_env, tmp_path):
+    client = MAUClient(Settings())
+    client.downloader = SegmentedDownloader(
+        IgnoresRangeSession(), segments=2, min_segment_size=1024, retries=0
+    )
+    
+    assert not client.download_package("https://example.com/p.pkg", tmp_path / "p.pkg")
+
+
+def test_partial_download_is_kept_only_under_the_cache(mock_env, monkeypatch, tmp_path):
+    from src.downloader import progress_path
+    
+    for cache_dir, kept in ((str(tmp_path / "cache"), True), ("", False)):
+        monkeypatch.setenv("CACHE_DIR", cache_dir)
+        client = MAUClient(Settings())
+        dest = client.download_path("word")
+        dest.write_bytes(b"partial")
+        progress_path(dest).write_text("{}")
+        
+        client.discard_download(dest)
+        
+        assert dest.exists() is kept
+        assert progress_path(dest).exists() is kept
@@ -0,0 +1,86 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from src.config import Settings
+from src.manifest import ManifestManager
+from src.metrics import MetricsFile, record_run
+from src.telemetry import Telemetry, for_app
+
+
+def samples(path):
+    return {
+        line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1])
+        for line in path.read_text().splitlines()
+        if not line.startswith("#")
+    }
+
+
+def stage_word(mgr, published):
+    mgr.stage_update(
+        app_key="word", app_id="MSWD2019", name="Microsoft Word", blob_name="word.pkg",
+        version="16.80", sha256="abc", download_url="https://example.com/word.pkg",
+        last_modified=format_datetime(published, usegmt=True),
+    )
+
+
+def test_counters_carry_over_between_runs(mock_env, tmp_path):
+    settings = Settings()
+    mgr = ManifestManager(tmp_path / "manifest.json")
+    path = tmp_path / "m365.prom"
+    stage_word(mgr, datetime.now(timezone.utc) - timedelta(hours=3))
+    telemetry = Telemetry()
+    with for_app("word"):
+        telemetry.add_bytes("download", 4096)
+    
+    assert record_run(path, "check", settings, mgr, telemetry, ["word"])
+    assert record_run(path, "check", settings, mgr, Telemetry(), [])
+    mgr.promote_update("word")
+    assert record_run(path, "promote", settings, mgr, Telemetry(), ["word"])
+    
+    found = samples(path)
+    assert found['m365_update_runs_total{channel="current",command="check"}'] == 2
+    assert found['m365_update_staged_total{app="word",channel="current"}'] == 1
+    assert found['m365_update_promoted_total{app="word",channel="current"}'] == 1
+    assert found[
+        'm365_update_transferred_bytes_total{app="word",channel="current",phase="download"}'
+    ] == 4096
+    assert found['m365_update_time_to_stage_seconds_bucket{app="word",channel="current",le="3600"}'] == 0
+    assert found['m365_update_time_to_stage_seconds_bucket{app="word",channel="current",le="21600"}'] == 1
+    assert found['m365_update_time_to_stage_seconds_count{app="word",channel="current"}'] == 1
+    assert found['m365_update_staged_lag_seconds_count{app="word",channel="current"}'] == 1
+    # The staged series went when the package was promoted
+    assert 'm365_update_package_info{app="word",channel="current",tier="live",version="16.80"}' in found
+    assert not [key for key in found if 'tier="staged"' in key]
+
+
+def test_failures_count_once_per_app_per_run(mock_env, tmp_path):
+    settings = Settings()
+    path = tmp_path / "m365.prom"
+    telemetry = Telemetry()
+    log = logging.getLogger("test")
+    
+    with telemetry.watch_errors():
+        with for_app("preview/excel"):
+            log.error("Download failed")
+            log.error("Error processing Microsoft Excel")
+        log.error("Not tied to an app")
+    record_run(path, "check", settings, ManifestManager(tmp_path / "manifest.json"), telemetry, [])
+    
+    found = samples(path)
+    assert found['m365_update_failures_total{app="excel",channel="preview",command="check"}'] == 1
+    assert telemetry.report()["errors"] == 3
+
+
+def test_label_values_are_escaped(tmp_path):
+    path = tmp_path / "m365.prom"
+    metrics = MetricsFile(path)
+    metrics.inc("staged_total", app='odd"app\\', channel="current")
+    metrics.write()
+    
+    reloaded = MetricsFile(path)
+    reloaded.inc("staged_total", app='odd"app\\', channel="current")
+    
+    assert 'app="odd\\"app\\\\"' in reloaded.render()
+    assert reloaded.render().count("m365_update_staged_total{") == 1
+    assert "} 2\n" in reloaded.render()
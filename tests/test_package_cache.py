@@ -0,0 +1,57 @@
+import hashlib
+import os
+
+from src.package_cache import PackageCache
+
+
+def write_package(path, content):
+    path.write_bytes(content)
+    return hashlib.sha256(content).hexdigest()
+
+
+def test_hit_after_add(tmp_path):
+    cache = PackageCache(tmp_path / "cache", max_bytes=1024)
+    sha = write_package(tmp_path / "word.pkg", b"word")
+    
+    cache.add(tmp_path / "word.pkg", sha, "https://example.com/word.pkg", '"v1"')
+    (tmp_path / "word.pkg").unlink()
+    
+    assert cache.get(sha).read_bytes() == b"word"
+    assert cache.lookup_url("https://example.com/word.pkg", '"v1"') == sha
+    assert cache.lookup_url("https://example.com/word.pkg", '"v2"') is None
+    assert cache.lookup_url("https://example.com/word.pkg") is None
+
+
+def test_corrupt_entry_is_discarded(tmp_path):
+    cache = PackageCache(tmp_path / "cache", max_bytes=1024)
+    sha = write_package(tmp_path / "word.pkg", b"word")
+    cache.add(tmp_path / "word.pkg", sha)
+    (tmp_path / "word.pkg").unlink()
+    
+    cache._object_path(sha).write_bytes(b"tampered")
+    
+    assert cache.get(sha) is None
+    assert not cache._object_path(sha).exists()
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = PackageCache(tmp_path / "cache", max_bytes=10)
+    old = write_package(tmp_path / "old.pkg", b"old-bytes")
+    cache.add(tmp_path / "old.pkg", old)
+    cache._index["access"][old] = 0
+    new = write_package(tmp_path / "new.pkg", b"new-bytes")
+    cache.add(tmp_path / "new.pkg", new)
+    
+    assert cache.get(old) is None
+    assert cache.get(new) is not None
+
+
+def test_index_survives_restart(tmp_path):
+    cache = PackageCache(tmp_path / "cache", max_bytes=1024)
+    sha = write_package(tmp_path / "word.pkg", b"word")
+    cache.add(tmp_path / "word.pkg", sha, "https://example.com/word.pkg", '"v1"')
+    
+    reloaded = PackageCache(tmp_path / "cache", max_bytes=1024)
+    
+    assert reloaded.lookup_url("https://example.com/word.pkg", '"v1"') == sha
+    assert os.path.samefile(reloaded.get(sha), cache._object_path(sha))
@@ -0,0 +1,39 @@
+import threading
+
+from src.pipeline import StagingQueue
+
+
+def test_get_returns_none_once_closed_and_drained():
+    queue = StagingQueue(max_items=2)
+    queue.put("a")
+    queue.close()
+    
+    assert queue.get() == "a"
+    assert queue.get() is None
+
+
+def test_reserve_blocks_until_bytes_released():
+    queue = StagingQueue(max_items=4, max_bytes=100)
+    queue.reserve(80)
+    
+    acquired = threading.Event()
+    
+    def reserve_more():
+        queue.reserve(50)
+        acquired.set()
+    
+    worker = threading.Thread(target=reserve_more)
+    worker.start()
+    
+    assert not acquired.wait(0.1)
+    queue.release(80)
+    assert acquired.wait(1)
+    worker.join()
+    assert queue.reserved_bytes == 50
+
+
+def test_oversized_item_allowed_when_queue_empty():
+    queue = StagingQueue(max_items=2, max_bytes=10)
+    queue.reserve(500)
+    
+    assert queue.reserved_bytes == 500
@@ -0,0 +1,85 @@
+from promote import promote_updates
+from src.config import Settings
+from src.manifest import DeltaState, ManifestManager
+
+
+def test_promotes_packages_and_deltas_in_one_batch(fake_storage, temp_manifest):
+    container = fake_storage.container
+    mgr = ManifestManager(temp_manifest)
+    for key in ("word", "excel"):
+        mgr.stage_update(key, key, key, f"{key}.pkg", "2.0", f"{key}-sha", "https://example.com")
+        container.blobs[f"staged/{key}.pkg"] = b"new"
+        container.blobs[f"live/{key}.pkg"] = b"old"
+    mgr.get_app_state("word").staged.delta = DeltaState("1.0", "d", "https://example.com", "word-delta.pkg")
+    container.blobs["staged/word-delta.pkg"] = b"delta"
+    
+    promoted = promote_updates(Settings(), mgr, fake_storage, force=True)
+    
+    assert promoted == ["word", "excel"]
+    assert [op for op, _ in container.calls].count("delete_blobs") == 1
+    assert container.blobs["live/word-delta.pkg"] == b"delta"
+    assert container.blobs["previous/excel.pkg"] == b"old"
+    assert mgr.get_app_state("word").live.delta.from_version == "1.0"
+
+
+def test_status_reads_only_the_manifest(mock_env, temp_manifest, capsys):
+    from promote import print_status
+    
+    mgr = ManifestManager(temp_manifest)
+    mgr.stage_update(
+        "word", "MSWD2019", "Microsoft Word", "word.pkg", "2.0", "sha", "https://example.com"
+    )
+    
+    print_status(Settings(), mgr)
+    
+    due = mgr.promotion_due("word", 14)
+    assert capsys.readouterr().out == (
+        f"word: live -, staged 2.0 (promotes {due.strftime('%Y-%m-%d %H:%M UTC')})\n"
+    )
+
+
+def test_rollback_dry_run_needs_no_storage(mock_env, temp_manifest, monkeypatch):
+    import promote
+    
+    mgr = ManifestManager(temp_manifest)
+    mgr.stage_update("word", "MSWD2019", "Microsoft Word", "word.pkg", "1.0", "a", "https://example.com")
+    mgr.promote_update("word")
+    mgr.stage_update("word", "MSWD2019", "Microsoft Word", "word.pkg", "2.0", "b", "https://example.com")
+    mgr.promote_update("word")
+    mgr.save()
+    monkeypatch.setattr(
+        "sys.argv", ["promote.py", "--rollback", "word", "--dry-run", "--manifest", str(temp_manifest)]
+    )
+    
+    assert promote.main() == 0
+    assert ManifestManager(temp_manifest).get_app_state("word").live.version == "2.0"
+
+
+def test_objects_layout_rollback_drops_the_live_delta_pointer(fake_storage, temp_manifest):
+    from promote import rollback_update
+    
+    fake_storage.settings.storage_layout = "objects"
+    container = fake_storage.container
+    mgr = ManifestManager(temp_manifest)
+    mgr.stage_update("word", "MSWD2019", "Microsoft Word", "word.pkg", "1.0", "a", "https://example.com")
+    mgr.promote_update("word")
+    mgr.stage_update(
+        "word", "MSWD2019", "Microsoft Word", "word.pkg", "2.0", "b", "https://example.com",
+        delta=DeltaState("1.0", "d", "https://example.com", "word-delta.pkg"),
+    )
+    mgr.promote_update("word")
+    container.blobs["previous/word.json"] = b'{"sha256": "a"}'
+    container.blobs["live/word.json"] = b'{"sha256": "b"}'
+    container.blobs["live/word-delta.json"] = b'{"sha256": "d"}'
+    for sha in "abd":
+        container.blobs[f"objects/{sha}.pkg"] = sha.encode()
+    
+    assert rollback_update(mgr, fake_storage, "word")
+    
+    assert container.blobs["live/word.json"] == b'{"sha256": "a"}'
+    assert "live/word-delta.json" not in container.blobs
+    # The delta's object went with its last pointer; the rolled-back build is kept for a retry
+    assert sorted(name for name in container.blobs if name.startswith("objects/")) == [
+        "objects/a.pkg", "objects/b.pkg",
+    ]
+    assert mgr.get_app_state("word").live.version == "1.0"
@@ -0,0 +1,41 @@
+import json
+
+from src.telemetry import Telemetry, for_app
+
+
+def test_spans_are_charged_to_the_tagged_app():
+    telemetry = Telemetry()
+    
+    with for_app("word"):
+        with telemetry.span("download"):
+            telemetry.add_bytes("download", 4096)
+        telemetry.retry("download")
+    with for_app("preview/excel"), telemetry.span("download"):
+        telemetry.add_bytes("download", 1024)
+    with telemetry.span("promote"):
+        pass
+    
+    report = telemetry.report(command="check")
+    
+    assert report["command"] == "check"
+    assert report["apps"]["word"]["download"]["bytes"] == 4096
+    assert report["apps"]["word"]["download"]["retries"] == 1
+    assert report["apps"]["preview/excel"]["download"]["calls"] == 1
+    assert report["phases"]["download"]["bytes"] == 5120
+    assert report["phases"]["download"]["calls"] == 2
+    assert report["phases"]["promote"]["calls"] == 1
+    assert "promote" not in report["apps"].get("word", {})
+
+
+def test_report_includes_profiled_hot_paths(tmp_path):
+    telemetry = Telemetry()
+    
+    with telemetry.profile(tmp_path / "run.prof"):
+        sorted(range(10000), key=lambda n: -n)
+    telemetry.write_report(tmp_path / "report.json", dry_run=True)
+    
+    report = json.loads((tmp_path / "report.json").read_text())
+    assert (tmp_path / "run.prof").exists()
+    assert report["dry_run"] is True
+    assert report["profile"]
+    assert {"function", "calls", "own_seconds", "cumulative_seconds"} <= set(report["profile"][0])
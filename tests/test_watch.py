@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+
+from src.config import parse_release_windows
+from src.watch import PROMOTE_RETRY, PollSchedule, Watcher
+
+# A Monday; the window below opens on Tuesday at 15:00
+MONDAY = datetime(2025, 1, 6, 9, 0, tzinfo=timezone.utc)
+WINDOWS = parse_release_windows("tue 15-17")
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+
+class FakeStop:
+    # Moves the clock on instead of sleeping, and ends the loop at a set time
+    def __init__(self, clock, until):
+        self.clock = clock
+        self.until = until
+    
+    def is_set(self):
+        return self.clock.now >= self.until
+    
+    def wait(self, seconds):
+        self.clock.now += timedelta(seconds=seconds)
+        return self.is_set()
+
+
+def test_polls_back_off_until_the_release_window():
+    schedule = PollSchedule(300, 4 * 3600, WINDOWS)
+    now, gaps = MONDAY, []
+    while now < MONDAY + timedelta(days=1, hours=7):
+        due = schedule.next_poll(now, changed=False)
+        gaps.append(due - now)
+        now = due
+    
+    assert gaps[:4] == [timedelta(minutes=m) for m in (5, 10, 20, 40)]
+    assert max(gaps) == timedelta(hours=4)
+    # Backed off overnight, yet the first poll lands as the window opens
+    assert datetime(2025, 1, 7, 15, tzinfo=timezone.utc) in {
+        MONDAY + sum(gaps[:i], timedelta()) for i in range(len(gaps) + 1)
+    }
+    assert gaps[-1] == timedelta(minutes=5)
+    
+    # A change resets the backoff straight away
+    schedule.next_poll(MONDAY, changed=False)
+    assert schedule.interval == 600
+    assert schedule.next_poll(MONDAY, changed=True) == MONDAY + timedelta(minutes=5)
+
+
+def test_promotes_when_lag_expires_and_retries_failures():
+    clock = FakeClock(MONDAY)
+    staged = {"word": MONDAY + timedelta(hours=1), "excel": MONDAY + timedelta(hours=2)}
+    checks, promotions = [], []
+    
+    def promote():
+        promotions.append(clock.now)
+        # excel fails its first attempt and stays staged
+        for label, due in list(staged.items()):
+            if due <= clock.now and (label != "excel" or len(promotions) > 2):
+                del staged[label]
+    
+    watcher = Watcher(
+        PollSchedule(3600, 3600),
+        check=lambda: checks.append(clock.now),
+        promote=promote,
+        deadlines=lambda: dict(staged),
+        stop=FakeStop(clock, MONDAY + timedelta(hours=3)),
+        clock=clock,
+    )
+    watcher.run()
+    
+    assert checks == [MONDAY, MONDAY + timedelta(hours=1), MONDAY + timedelta(hours=2)]
+    assert promotions == [
+        MONDAY + timedelta(hours=1),
+        MONDAY + timedelta(hours=2),
+        MONDAY + timedelta(hours=2) + PROMOTE_RETRY,
+    ]
+    assert staged == {}
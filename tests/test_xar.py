@@ -0,0 +1,89 @@
+import struct
+import zlib
+
+import pytest
+
+from src import xar
+from src.config import Settings
+from src.mau_client import MAUClient
+
+DISTRIBUTION = b'<installer-gui-script><product version="16.80"/></installer-gui-script>'
+PACKAGE_INFO = (
+    b'<pkg-info><bundle id="com.microsoft.Word" CFBundleShortVersionString="16.80" '
+    b'CFBundleVersion="16.80.23121017"/></pkg-info>'
+)
+
+
+def build_xar(members):
+    heap = b""
+    entries = []
+    for index, (path, content) in enumerate(members, start=1):
+        stored = zlib.compress(content)
+        entries.append(
+            f'<file id="{index}"><name>{path}</name><type>file</type><data>'
+            f"<length>{len(stored)}</length><offset>{len(heap)}</offset>"
+            f"<size>{len(content)}</size>"
+            f'<encoding style="application/x-gzip"/>'
+            f'<extracted-checksum style="sha1">sum{index}</extracted-checksum>'
+            f"</data></file>"
+        )
+        heap += stored
+    
+    toc = f"<xar><toc>{''.join(entries)}</toc></xar>".encode()
+    compressed = zlib.compress(toc)
+    header = struct.pack(xar.HEADER_FORMAT, b"xar!", 28, 1, len(compressed), len(toc), 1)
+    return header + compressed + heap
+
+
+def test_parse_header_rejects_non_xar():
+    with pytest.raises(xar.XarError):
+        xar.parse_header(b"PK\x03\x04" + b"\x00" * 24)
+
+
+def test_find_version_prefers_matching_bundle():
+    assert xar.find_version([DISTRIBUTION, PACKAGE_INFO], "com.microsoft.word") == "16.80.23121017"
+    assert xar.find_version([DISTRIBUTION], "com.microsoft.word") == "16.80"
+
+
+def test_inspect_package_reads_only_metadata(mock_env, monkeypatch):
+    monkeypatch.setenv("CACHE_DIR", "")
+    payload = b"\x00" * 4096
+    archive = build_xar([
+        ("Distribution", DISTRIBUTION),
+        ("Word.pkg/PackageInfo", PACKAGE_INFO),
+        ("Word.pkg/Payload", payload),
+    ])
+    client = MAUClient(Settings())
+    fetched = []
+    
+    def fetch_range(url, start, length):
+        fetched.append(length)
+        return archive[start:start + length]
+    
+    client.fetch_range = fetch_range
+    inspection = client.inspect_package("https://example.com/word.pkg", "com.microsoft.word")
+    
+    assert inspection.version == "16.80.23121017"
+    assert inspection.fingerprint
+    assert set(inspection.checksums) == {"Distribution", "Word.pkg/PackageInfo", "Word.pkg/Payload"}
+    assert sum(fetched) < len(archive)
+
+
+def test_truncated_member_is_a_xar_error(mock_env, monkeypatch):
+    monkeypatch.setenv("CACHE_DIR", "")
+    archive = build_xar([("Word.pkg/PackageInfo", PACKAGE_INFO)])
+    header = xar.parse_header(archive)
+    
+    # The connection drops part way through the member
+    def fetch_range(url, start, length):
+        if start >= header.heap_offset:
+            length //= 2
+        return archive[start:start + length]
+    
+    member = xar.metadata_files(xar.parse_toc(fetch_range(None, 28, header.toc_length_compressed)))[0]
+    with pytest.raises(xar.XarError):
+        xar.decode_member(member, fetch_range(None, header.heap_offset, member.length))
+    
+    client = MAUClient(Settings())
+    client.fetch_range = fetch_range
+    assert client.inspect_package("https://example.com/word.pkg", "com.microsoft.word").version is None